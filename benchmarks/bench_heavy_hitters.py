@@ -0,0 +1,165 @@
+"""
+Проверка точности и памяти приближенного подсчета (HeavyHitterCounter) в сравнении с точными счетчиками
+потокового режима на синтетическом DDoS с подменой адресов источника. Оба прогона используют одинаковую
+дедупликацию по умолчанию для режима приближенного подсчета (фильтр Блума фиксированного размера), поэтому
+сравниваются только счетчики. Проверяются гарантии приближенного подсчета:
+ - нет занижений оценки кол-ва запросов и alert-событий относительно точных счетчиков
+ - полнота (recall) по "тяжелым" IP (запросов больше N / top_k или alert-событий больше A / top_k) - 100%
+ - точность (precision) - 100%: ложно подозрительных IP нет
+ - память счетчиков и дедупликации не зависит от кол-ва IP
+При нарушении гарантий бенчмарк завершается с кодом 1. Запуск из корня проекта:
+
+    python -m benchmarks.bench_heavy_hitters --events 2000000 --spoofed-ips 1000000
+"""
+import os
+import sys
+import time
+import argparse
+import contextlib
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from classes.suricata_log_analyzer_stage import SuricataLogAnalyzerStage
+from classes.heavy_hitters import HeavyHitterCounter
+from classes.flow_deduplicator import BloomFlowDeduplicator
+
+def make_events(events: int, spoofed_ips: int, attackers: int, attack_share: float, alert_ratio: float, seed: int = 42):
+    """
+    Синтетический поток событий: attack_share событий приходится на attackers IP (распределение Ципфа),
+    остальные - на spoofed_ips случайных адресов с равномерным распределением
+    """
+    rng = np.random.default_rng(seed)
+
+    is_attack = rng.random(events) < attack_share
+    attacker_ids = np.minimum(rng.zipf(1.5, events), attackers) - 1
+    spoofed_ids = rng.integers(0, spoofed_ips, events) + attackers
+    ip_ids = np.where(is_attack, attacker_ids, spoofed_ids)
+    is_alert = is_attack & (rng.random(events) < alert_ratio)
+
+    for flow_id, (ip_id, alert) in enumerate(zip(ip_ids.tolist(), is_alert.tolist())):
+        yield {
+            'flow_id': flow_id,
+            'src_ip': f"{ip_id >> 24 & 255}.{ip_id >> 16 & 255}.{ip_id >> 8 & 255}.{ip_id & 255}",
+            'event_type': 'alert' if alert else 'http',
+        }
+
+def run(stage: SuricataLogAnalyzerStage, events):
+    """Подсчет событий и поиск подозрительных IP, возвращает результат и время"""
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        stage.reset_counters()
+        for event in events:
+            stage.count_event(event)
+        result = stage.get_suspicious_ips()
+    return result, time.perf_counter() - start
+
+def counters_bytes(stage: SuricataLogAnalyzerStage) -> int:
+    """Память точных счетчиков по IP: хэш-таблицы и строки адресов"""
+    return sum(sys.getsizeof(c) + sum(sys.getsizeof(ip) for ip in c) for c in (stage.ip_counts, stage.alert_counts))
+
+def evaluate(events, top_k: int = 1000, epsilon: float = 0.0001) -> dict:
+    """
+    Прогон точных и приближенных счетчиков на одинаковом потоке событий (events - функция, возвращающая
+    новый итератор событий). Возвращает показатели точности, памяти и времени
+    """
+    capacity = SuricataLogAnalyzerStage.BLOOM_DEDUP_CAPACITY
+    exact_stage = SuricataLogAnalyzerStage(mode="stream", dedup=BloomFlowDeduplicator(capacity))
+    exact, exact_time = run(exact_stage, events())
+    exact_memory = counters_bytes(exact_stage)
+    unique_ips = len(exact_stage.ip_counts)
+
+    counter = HeavyHitterCounter(top_k=top_k, epsilon=epsilon)
+    approx_stage = SuricataLogAnalyzerStage(mode="stream", counter=counter)
+    approx, approx_time = run(approx_stage, events())
+
+    found = set(exact) & set(approx)
+
+    # Space-Saving гарантированно отслеживает IP, у которых запросов (alert-событий) больше N / top_k
+    requests_bound = counter.total() / top_k
+    alerts_bound = counter.alerts.total / top_k
+    heavy = {ip for ip, info in exact.items()
+             if info['total_requests'] > requests_bound or info['alert_requests'] > alerts_bound}
+
+    # Относительная ошибка оценки кол-ва запросов для найденных подозрительных IP
+    errors = [(approx[ip]['total_requests'] - exact[ip]['total_requests']) / exact[ip]['total_requests'] for ip in found]
+    underestimated = [ip for ip in found if approx[ip]['total_requests'] < exact[ip]['total_requests']
+                      or approx[ip]['alert_requests'] < exact[ip]['alert_requests']]
+
+    return {
+        "unique_ips": unique_ips,
+        "unique_ips_estimate": counter.unique_ips(),
+        "exact": len(exact),
+        "approx": len(approx),
+        "precision": len(found) / len(approx) if approx else 1.0,
+        "recall": len(found) / len(exact) if exact else 1.0,
+        "requests_bound": requests_bound,
+        "alerts_bound": alerts_bound,
+        "heavy": len(heavy),
+        "heavy_recall": len(heavy & found) / len(heavy) if heavy else 1.0,
+        "error_mean": float(np.mean(errors or [0])),
+        "error_max": float(np.max(errors or [0])),
+        "error_bound": epsilon * counter.total(),
+        "underestimated": len(underestimated),
+        "exact_memory": exact_memory,
+        "approx_memory": counter.memory_bytes(),
+        "dedup_memory": approx_stage.dedup.memory_bytes(),
+        "dedup": type(approx_stage.dedup).__name__,
+        "exact_time": exact_time,
+        "approx_time": approx_time,
+    }
+
+def check(result: dict, dedup_limit: int) -> list:
+    """Нарушенные гарантии приближенного подсчета"""
+    failures = []
+    if result["underestimated"]:
+        failures.append(f"занижение оценки у {result['underestimated']} IP")
+    if result["heavy_recall"] < 1:
+        failures.append(f"полнота по тяжелым IP {result['heavy_recall']:.2%} < 100%")
+    if result["precision"] < 1:
+        failures.append(f"точность {result['precision']:.2%} < 100%")
+    if result["dedup_memory"] > dedup_limit:
+        failures.append(f"память дедупликации {result['dedup_memory'] / 2**20:.1f} МБ больше {dedup_limit / 2**20:.1f} МБ")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=2_000_000)
+    parser.add_argument('--spoofed-ips', type=int, default=1_000_000)
+    parser.add_argument('--attackers', type=int, default=200)
+    parser.add_argument('--attack-share', type=float, default=0.3)
+    parser.add_argument('--alert-ratio', type=float, default=0.2)
+    parser.add_argument('--top-k', type=int, default=1000)
+    parser.add_argument('--epsilon', type=float, default=0.0001)
+    args = parser.parse_args()
+
+    def events():
+        return make_events(args.events, args.spoofed_ips, args.attackers, args.attack_share, args.alert_ratio)
+
+    print(f"Генерация {args.events} событий: {args.attackers} атакующих IP, до {args.spoofed_ips} подмененных адресов")
+    result = evaluate(events, args.top_k, args.epsilon)
+
+    unique_ips = result["unique_ips"]
+    print(f"Уникальных IP: {unique_ips} (оценка HyperLogLog: {result['unique_ips_estimate']}, "
+          f"ошибка {abs(result['unique_ips_estimate'] - unique_ips) / unique_ips:.2%})")
+    print(f"Подозрительных IP: точно {result['exact']}, приближенно {result['approx']}")
+    print(f"Точность (precision): {result['precision']:.2%}")
+    print(f"Полнота (recall) по всем подозрительным IP: {result['recall']:.2%}")
+    print(f"Полнота (recall) по IP с запросами > {result['requests_bound']:.0f} или alert-событиями > "
+          f"{result['alerts_bound']:.0f} ({result['heavy']} IP): {result['heavy_recall']:.2%}")
+    print(f"Завышение кол-ва запросов: среднее {result['error_mean']:.4%}, максимальное {result['error_max']:.4%}, "
+          f"граница epsilon * N = {result['error_bound']:.0f} запросов")
+    print(f"Занижений оценки: {result['underestimated']}")
+    print(f"Память счетчиков: точно {result['exact_memory'] / 2**20:.1f} МБ, приближенно {result['approx_memory'] / 2**20:.1f} МБ")
+    print(f"Память дедупликации ({result['dedup']}): {result['dedup_memory'] / 2**20:.1f} МБ")
+    print(f"Время: точно {result['exact_time']:.2f} с, приближенно {result['approx_time']:.2f} с")
+
+    # Фильтр Блума занимает не больше двух поколений емкостью BLOOM_DEDUP_CAPACITY
+    dedup_limit = 2 * BloomFlowDeduplicator(SuricataLogAnalyzerStage.BLOOM_DEDUP_CAPACITY).memory_bytes()
+    failures = check(result, dedup_limit)
+    if failures:
+        print(f"ГАРАНТИИ НАРУШЕНЫ: {'; '.join(failures)}")
+        sys.exit(1)
+    print("Гарантии приближенного подсчета выполнены")
+
+if __name__ == "__main__":
+    main()
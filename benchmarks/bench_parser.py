@@ -0,0 +1,72 @@
+"""
+Бенчмарк загрузки логов Suricata с разными библиотеками разбора JSON (classes/event_parser.py): время загрузки
+в режимах memory (JSON-массив) и stream (NDJSON) и проверка совпадения результата со стандартной библиотекой.
+Для сравнения приводится прежняя загрузка через pd.read_json. Запуск из корня проекта:
+
+    python -m benchmarks.bench_parser --events 1000000
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.eve_generator import EveGenerator
+from classes.event_parser import PARSERS
+from classes.suricata_log_analyzer_stage import SuricataLogAnalyzerStage
+
+class ReadJsonStage(SuricataLogAnalyzerStage):
+    """Прежняя загрузка режима memory: весь файл со всеми вложенными объектами через pd.read_json"""
+
+    def load_data(self):
+        self.df = pd.read_json(self.filename)
+        return self.df
+
+def measure(stage: SuricataLogAnalyzerStage):
+    start = time.perf_counter()
+    result = stage.process({})["suspicious_ips"]
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=1_000_000)
+    parser.add_argument('--unique-ips', type=int, default=100_000)
+    parser.add_argument('--workdir', default=tempfile.gettempdir())
+    args = parser.parse_args()
+
+    logging.getLogger("classes").setLevel(logging.ERROR)
+    os.makedirs(args.workdir, exist_ok=True)
+    generator = EveGenerator(events=args.events, unique_ips=args.unique_ips, bursts=3)
+    files = {}
+    for mode, fmt in (("memory", "array"), ("stream", "ndjson")):
+        files[mode] = os.path.join(args.workdir, f"bench_parser_{args.events}.{fmt}.json")
+        if not os.path.exists(files[mode]):
+            print(f"Генерация {args.events} событий в {files[mode]}...")
+            generator.write(files[mode], fmt)
+
+    backends = []
+    for name in PARSERS:
+        try:
+            PARSERS[name]()
+            backends.append(name)
+        except ImportError:
+            print(f"Библиотека {name} не установлена - пропускается")
+
+    for mode, filename in files.items():
+        reference_time, reference = measure(SuricataLogAnalyzerStage(filename, mode=mode, parser="json"))
+        print(f"Режим {mode} ({os.path.getsize(filename) / 2**20:.0f} МБ, подозрительных IP: {len(reference)}):")
+        if mode == "memory":
+            elapsed, result = measure(ReadJsonStage(filename, mode=mode))
+            print(f"  {'pd.read_json':<14} {elapsed:>8.2f} с  {args.events / elapsed:>10.0f} событий/с  "
+                  f"{'совпадает' if result == reference else 'ОШИБКА: результат отличается'}")
+        for name in backends:
+            elapsed, result = (reference_time, reference) if name == "json" else measure(
+                SuricataLogAnalyzerStage(filename, mode=mode, parser=name))
+            print(f"  {name:<14} {elapsed:>8.2f} с  {args.events / elapsed:>10.0f} событий/с  "
+                  f"{'совпадает' if result == reference else 'ОШИБКА: результат отличается'}")
+
+if __name__ == "__main__":
+    main()
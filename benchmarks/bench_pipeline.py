@@ -0,0 +1,241 @@
+"""
+Бенчмарк этапов и pipeline на синтетических логах Suricata (benchmarks/eve_generator.py): пропускная способность,
+время выполнения и пиковая память для SuricataLogAnalyzerStage (режимы memory и stream), CheckBlockConditionStage
+и полного Pipeline с mock-этапами. Каждый замер выполняется в отдельном процессе, результаты дописываются в файл
+истории и сравниваются с предыдущим запуском с теми же параметрами. Запуск из корня проекта:
+
+    python -m benchmarks.bench_pipeline --events 10000 100000 1000000 --repeat 3
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from benchmarks.eve_generator import add_arguments, from_arguments
+from classes.stage_metrics import _peak_rss
+
+SCENARIOS = ["analyzer-memory", "analyzer-stream", "block-condition", "block-condition-subnets", "pipeline"]
+
+def run_scenario(scenario: str, filename: str, events: int, workdir: str) -> dict:
+    """
+    Один замер сценария (выполняется в отдельном процессе, чтобы пиковая память не зависела от других замеров).
+    Записи - события лога, для этапа проверки условий блокировки - подозрительные IP
+    """
+    from classes.pipeline import Pipeline
+    from classes.stage_metrics import PipelineMetrics
+    from classes.prefix_trie import PrefixTrie
+    from classes.suricata_log_analyzer_stage import SuricataLogAnalyzerStage
+    from classes.virus_total_stage import VirusTotalMockStage
+    from classes.check_block_condition_stage import CheckBlockConditionStage
+    from classes.firewall_ban_stage import FirewallBanMockStage
+    from classes.email_notifier_stage import EmailNotifierMockStage
+    from classes.ip_report_stage import IPReportStage
+    from classes.visualizer_stage import VisualizerStage
+
+    logging.getLogger("classes").setLevel(logging.ERROR)
+
+    if scenario.startswith("analyzer-"):
+        stage = SuricataLogAnalyzerStage(filename, mode=scenario.split("-", 1)[1])
+        run = lambda: stage.process({})
+        records = lambda result: events
+    elif scenario.startswith("block-condition"):
+        # Вход этапа - результат анализа лога и проверка VirusTotal (каждый второй IP подозрительный)
+        data = SuricataLogAnalyzerStage(filename, mode="stream").process({})
+        data["virustotal_ips"] = {ip: i % 2 == 0 for i, ip in enumerate(data["suspicious_ips"])}
+        if scenario == "block-condition-subnets":
+            stage = CheckBlockConditionStage(allow_list=PrefixTrie(["10.0.0.0/28", "192.168.0.0/16"]), subnet_threshold=8)
+        else:
+            stage = CheckBlockConditionStage()
+        run = lambda: stage.process(data)
+        records = lambda result: len(result["suspicious_ips"])
+    else:
+        virus_total = VirusTotalMockStage()
+        virus_total.sleep = 0
+        metrics = PipelineMetrics()
+        pipeline = Pipeline([
+            SuricataLogAnalyzerStage(filename, mode="stream"),
+            virus_total,
+            CheckBlockConditionStage(),
+            FirewallBanMockStage(),
+            EmailNotifierMockStage(),
+            IPReportStage(os.path.join(workdir, "ip_report.json")),
+            VisualizerStage(os.path.join(workdir, "ip_report.png")),
+        ], metrics=metrics)
+        run = pipeline.execute
+        records = lambda result: events
+
+    rss_before = _peak_rss()
+    cpu_before = time.process_time()
+    wall_before = time.perf_counter()
+    result = run()
+    wall = time.perf_counter() - wall_before
+    cpu = time.process_time() - cpu_before
+    rss_after = _peak_rss()
+
+    measurement = {
+        "wall_seconds": wall,
+        "cpu_seconds": cpu,
+        "records": records(result),
+        "peak_rss_bytes": rss_after,
+        "rss_delta_bytes": rss_after - rss_before if rss_before is not None else None,
+    }
+    if scenario == "pipeline":
+        measurement["stages"] = {m["stage"]: m["wall_seconds"] for m in metrics.last_run["stages"]}
+    return measurement
+
+def measure(scenario: str, filename: str, events: int, workdir: str, repeat: int) -> dict:
+    """Сводка repeat замеров сценария: медиана и минимум времени, максимум пиковой памяти"""
+    runs = []
+    for _ in range(repeat):
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            runs.append(executor.submit(run_scenario, scenario, filename, events, workdir).result())
+
+    wall = statistics.median(run["wall_seconds"] for run in runs)
+    summary = {
+        "wall_seconds": wall,
+        "wall_min_seconds": min(run["wall_seconds"] for run in runs),
+        "cpu_seconds": statistics.median(run["cpu_seconds"] for run in runs),
+        "records": runs[-1]["records"],
+        "throughput": runs[-1]["records"] / wall if wall > 0 else None,
+        "peak_rss_bytes": max((run["peak_rss_bytes"] or 0) for run in runs) or None,
+        "rss_delta_bytes": max((run["rss_delta_bytes"] or 0) for run in runs),
+    }
+    if "stages" in runs[-1]:
+        summary["stages"] = {stage: statistics.median(run["stages"][stage] for run in runs) for stage in runs[-1]["stages"]}
+    return summary
+
+def prepare_log(args: argparse.Namespace, events: int, fmt: str) -> str:
+    """Файл синтетического лога; файлы с теми же параметрами генератора переиспользуются между запусками"""
+    generator = from_arguments(args, events)
+    filename = os.path.join(args.workdir, f"eve_{events}_{generator_key(args)}.{fmt}.json")
+    if not os.path.exists(filename):
+        print(f"Генерация {events} событий в {filename}...")
+        tmp_name = filename + ".tmp"
+        generator.write(tmp_name, fmt)
+        os.replace(tmp_name, filename)
+    return filename
+
+def generator_params(args: argparse.Namespace) -> dict:
+    return {name: getattr(args, name) for name in
+            ("unique_ips", "attackers", "attack_share", "alert_ratio", "duplicate_ratio", "bursts", "burst_factor", "rate", "seed")}
+
+def generator_key(args: argparse.Namespace) -> str:
+    return hashlib.sha1(json.dumps(generator_params(args), sort_keys=True).encode()).hexdigest()[:10]
+
+def load_history(filename: str) -> list:
+    if not os.path.exists(filename):
+        return []
+    with open(filename, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def previous_result(history: list, params: dict, scenario: str, events: int):
+    """Результат последнего запуска с теми же параметрами генератора, сценарием и кол-вом событий"""
+    for record in reversed(history):
+        if record["generator"] != params:
+            continue
+        for result in record["results"]:
+            if result["scenario"] == scenario and result["events"] == events:
+                return record, result
+    return None, None
+
+def compare(current: dict, previous: dict, threshold: float) -> list:
+    """Регрессии времени и памяти относительно предыдущего запуска (с допуском на шум замеров)"""
+    regressions = []
+    if current["wall_seconds"] > previous["wall_seconds"] * (1 + threshold) and current["wall_seconds"] - previous["wall_seconds"] > 0.005:
+        regressions.append("время")
+    if (current["peak_rss_bytes"] and previous["peak_rss_bytes"]
+            and current["peak_rss_bytes"] > previous["peak_rss_bytes"] * (1 + threshold)
+            and current["peak_rss_bytes"] - previous["peak_rss_bytes"] > 5 * 2**20):
+        regressions.append("память")
+    return regressions
+
+def git_commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10)
+        return result.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def change(current: float, previous: float) -> str:
+    return f"{(current - previous) / previous:+.1%}" if previous else "-"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, nargs='+', default=[10_000, 100_000], help="размеры логов (10^4 - 10^8 событий)")
+    parser.add_argument('--scenarios', nargs='+', default=SCENARIOS, choices=SCENARIOS)
+    parser.add_argument('--repeat', type=int, default=3, help="кол-во замеров каждого сценария")
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), "suricata-bench"),
+                        help="каталог для синтетических логов и файлов отчетов")
+    parser.add_argument('--results', default=os.path.join(ROOT, "benchmarks", "results.jsonl"), help="файл истории результатов")
+    parser.add_argument('--threshold', type=float, default=0.1, help="допустимое ухудшение относительно предыдущего запуска")
+    parser.add_argument('--strict', action='store_true', help="код возврата 1 при регрессии (для CI)")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    params = generator_params(args)
+    history = load_history(args.results)
+    record = {
+        "time": datetime.now().isoformat(timespec='seconds'),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "generator": params,
+        "results": [],
+    }
+
+    # Логи генерируются заранее, чтобы генерация не попадала в вывод результатов
+    files = {(events, fmt): prepare_log(args, events, fmt) for events in args.events
+             for fmt in {"array" if scenario == "analyzer-memory" else "ndjson" for scenario in args.scenarios}}
+
+    regressions = []
+    print(f"{'Сценарий':<26} {'Событий':>10} {'Записей':>10} {'Время, с':>9} {'Мин, с':>8} {'Записей/с':>11} "
+          f"{'RSS, МБ':>8} {'Прирост':>8}  Изменение")
+    print("-" * 120)
+    for events in args.events:
+        for scenario in args.scenarios:
+            filename = files[events, "array" if scenario == "analyzer-memory" else "ndjson"]
+            result = {"scenario": scenario, "events": events, **measure(scenario, filename, events, args.workdir, args.repeat)}
+            record["results"].append(result)
+
+            previous_record, previous = previous_result(history, params, scenario, events)
+            note = "-"
+            if previous is not None:
+                found = compare(result, previous, args.threshold)
+                note = (f"время {change(result['wall_seconds'], previous['wall_seconds'])}, "
+                        f"память {change(result['peak_rss_bytes'] or 0, previous['peak_rss_bytes'] or 0)} "
+                        f"(к {previous_record['commit'] or previous_record['time']})")
+                if found:
+                    note += f"  РЕГРЕССИЯ: {', '.join(found)}"
+                    regressions.append((scenario, events, found))
+
+            rss = f"{result['peak_rss_bytes'] / 2**20:.0f}" if result['peak_rss_bytes'] else "-"
+            print(f"{scenario:<26} {events:>10} {result['records']:>10} {result['wall_seconds']:>9.3f} "
+                  f"{result['wall_min_seconds']:>8.3f} {result['throughput'] or 0:>11.0f} {rss:>8} "
+                  f"{result['rss_delta_bytes'] / 2**20:>8.1f}  {note}")
+            if "stages" in result:
+                for stage, seconds in result["stages"].items():
+                    print(f"    {stage:<30} {seconds:>9.3f} с")
+
+    with open(args.results, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    print(f"Результаты добавлены в {args.results}")
+
+    if regressions:
+        print(f"Регрессий относительно предыдущего запуска: {len(regressions)} (порог {args.threshold:.0%})")
+        if args.strict:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Бенчмарк поиска подозрительных IP: сравнение векторизованного get_suspicious_ips с прежней реализацией
+на цикле по всем IP. Запуск из корня проекта:
+
+    python -m benchmarks.bench_scoring --unique-ips 1000000 --events 3000000
+"""
+import os
+import sys
+import time
+import argparse
+import contextlib
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from classes.suricata_log_analyzer_stage import SuricataLogAnalyzerStage
+
+def make_events(events: int, unique_ips: int, alert_ratio: float, seed: int = 42) -> pd.DataFrame:
+    """Синтетический набор событий с заданным кол-вом уникальных IP"""
+    rng = np.random.default_rng(seed)
+
+    # Каждый IP встречается хотя бы раз, остальные события распределены по закону Ципфа (несколько "тяжелых" IP)
+    ip_ids = np.concatenate([
+        np.arange(unique_ips),
+        np.minimum(rng.zipf(1.3, events - unique_ips), unique_ips) - 1,
+    ])
+    rng.shuffle(ip_ids)
+
+    ips = np.array([f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(unique_ips)], dtype=object)
+    event_type = np.where(rng.random(events) < alert_ratio, 'alert', 'http')
+
+    return pd.DataFrame({'src_ip': ips[ip_ids], 'event_type': event_type})
+
+def legacy_suspicious_ips(df: pd.DataFrame, activity_multiplier=2) -> dict:
+    """Прежняя реализация: два value_counts, словарь алертов и цикл по всем IP"""
+    ip_stats = df['src_ip'].value_counts()
+    alert_ips = df[df['event_type'] == 'alert']['src_ip'].value_counts().to_dict()
+    threshold = ip_stats.mean() * activity_multiplier
+
+    suspicious_ips = {}
+    for ip, total_count in ip_stats.items():
+        alert_count = alert_ips.get(ip, 0)
+        if total_count > threshold or alert_count > 0:
+            suspicious_ips[ip] = {
+                'total_requests': total_count,
+                'alert_requests': alert_count,
+                'activity_threshold': total_count > threshold,
+                'has_alerts': alert_count > 0
+            }
+    return suspicious_ips
+
+def measure(func, repeat: int):
+    """Лучшее время из repeat запусков"""
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=3_000_000)
+    parser.add_argument('--unique-ips', type=int, default=1_000_000)
+    parser.add_argument('--alert-ratio', type=float, default=0.001)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"Генерация {args.events} событий, {args.unique_ips} уникальных IP...")
+    df = make_events(args.events, args.unique_ips, args.alert_ratio)
+
+    stage = SuricataLogAnalyzerStage()
+    stage.df = df
+
+    legacy_time, legacy = measure(lambda: legacy_suspicious_ips(df), args.repeat)
+    vector_time, vector = measure(stage.get_suspicious_ips, args.repeat)
+
+    if legacy != vector or list(legacy) != list(vector):
+        raise SystemExit("ОШИБКА: результаты реализаций не совпадают")
+
+    print(f"Подозрительных IP: {len(vector)}")
+    print(f"Цикл по IP:        {legacy_time:.3f} с")
+    print(f"Векторизованный:   {vector_time:.3f} с")
+    print(f"Ускорение:         {legacy_time / vector_time:.1f}x")
+
+if __name__ == "__main__":
+    main()
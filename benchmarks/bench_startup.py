@@ -0,0 +1,160 @@
+"""
+Бенчмарк времени запуска: импорт pipeline.py, вывод справки CLI и сборка pipeline в "холодном" процессе.
+Каждый замер выполняется в новом интерпретаторе с -X importtime: время процесса, суммарное время импорта,
+самые тяжелые импорты. Для каждого сценария задан перечень допустимых тяжелых зависимостей (pandas, numpy,
+matplotlib, requests, dotenv...) - их появление вне перечня считается регрессией, как и рост времени относительно
+предыдущего запуска. Результаты дописываются в файл истории. Запуск из корня проекта:
+
+    python -m benchmarks.bench_startup --repeat 5
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from benchmarks.bench_pipeline import load_history, git_commit, change
+
+# Тяжелые зависимости, импорт которых заметен на времени запуска
+HEAVY_MODULES = ("pandas", "numpy", "matplotlib", "requests", "dotenv")
+
+# Сценарий -> (код, выполняемый в новом процессе; допустимые тяжелые зависимости)
+SCENARIOS = {
+    "import-pipeline": ("import pipeline", ()),
+    "cli-help": ("import runpy\n"
+                 "sys.argv = ['pipeline.py', '--help']\n"
+                 "try:\n"
+                 "    runpy.run_path('pipeline.py', run_name='__main__')\n"
+                 "except SystemExit:\n"
+                 "    pass", ()),
+    "build-mock": ("from classes import stage_registry as stages\n"
+                   "from classes.pipeline import Pipeline\n"
+                   "Pipeline([stages.VirusTotalMockStage(), stages.CheckBlockConditionStage(), stages.FirewallBanMockStage(),\n"
+                   "          stages.EmailNotifierMockStage(), stages.IPReportStage(), stages.VisualizerStage()])", ()),
+    "build-pipeline": ("import pipeline\n"
+                       "pipeline.build_pipeline()", ("pandas", "numpy", "dotenv")),
+}
+
+# Вывод справки pipeline.py не должен попадать в вывод бенчмарка; загруженные тяжелые модули - последней строкой
+_EPILOGUE = "\nsys.stdout = sys.__stdout__\nprint(json.dumps([m for m in {modules!r} if m in sys.modules]))"
+
+def run_scenario(scenario: str) -> dict:
+    """Один замер сценария в новом процессе"""
+    code, _ = SCENARIOS[scenario]
+    script = ("import sys, io, json\nsys.stdout = io.StringIO()\n" + code
+              + _EPILOGUE.format(modules=HEAVY_MODULES))
+    # SMTP-параметры для сборки pipeline с EmailNotifierStage (соединение при сборке не устанавливается)
+    env = {"EMAIL_MAIL": "bench@example.local", "EMAIL_PASSWORD": "bench", "EMAIL_SMTP_SERVER": "127.0.0.1",
+           **os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", script], cwd=ROOT, env=env,
+                            capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"Сценарий {scenario} завершился с ошибкой:\n{result.stderr[-2000:]}")
+
+    imports = parse_importtime(result.stderr)
+    return {
+        "wall_seconds": wall,
+        "import_seconds": sum(imports.values()),
+        "imports": imports,
+        "heavy_modules": json.loads(result.stdout.strip().splitlines()[-1]),
+    }
+
+def parse_importtime(stderr: str) -> dict:
+    """Суммарное время импорта модулей верхнего уровня (с учетом вложенных импортов) по выводу -X importtime, с"""
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  ") and name.strip():
+            imports[name.strip()] = int(cumulative) / 1e6
+    return imports
+
+def measure(scenario: str, repeat: int) -> dict:
+    """Сводка repeat замеров сценария: медиана и минимум времени, самые тяжелые импорты"""
+    runs = [run_scenario(scenario) for _ in range(repeat)]
+    top = sorted(runs[-1]["imports"].items(), key=lambda item: item[1], reverse=True)[:5]
+    return {
+        "wall_seconds": statistics.median(run["wall_seconds"] for run in runs),
+        "wall_min_seconds": min(run["wall_seconds"] for run in runs),
+        "import_seconds": statistics.median(run["import_seconds"] for run in runs),
+        "heavy_modules": runs[-1]["heavy_modules"],
+        "top_imports": top,
+    }
+
+def previous_result(history: list, scenario: str):
+    for record in reversed(history):
+        for result in record["results"]:
+            if result["scenario"] == scenario:
+                return record, result
+    return None, None
+
+def compare(scenario: str, current: dict, previous: dict, threshold: float) -> list:
+    """Регрессии: недопустимые тяжелые зависимости и рост времени импорта (с допуском на шум замеров)"""
+    _, allowed = SCENARIOS[scenario]
+    regressions = [f"импорт {module}" for module in current["heavy_modules"] if module not in allowed]
+    if (previous is not None and current["import_seconds"] > previous["import_seconds"] * (1 + threshold)
+            and current["import_seconds"] - previous["import_seconds"] > 0.01):
+        regressions.append("время")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument('--repeat', type=int, default=5, help="кол-во замеров каждого сценария")
+    parser.add_argument('--results', default=os.path.join(ROOT, "benchmarks", "startup_results.jsonl"),
+                        help="файл истории результатов")
+    parser.add_argument('--threshold', type=float, default=0.2, help="допустимое ухудшение относительно предыдущего запуска")
+    parser.add_argument('--strict', action='store_true', help="код возврата 1 при регрессии (для CI)")
+    args = parser.parse_args()
+
+    history = load_history(args.results)
+    record = {
+        "time": datetime.now().isoformat(timespec='seconds'),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "results": [],
+    }
+
+    regressions = []
+    print(f"{'Сценарий':<18} {'Время, с':>9} {'Мин, с':>8} {'Импорт, с':>10}  {'Тяжелые зависимости':<28} Изменение")
+    print("-" * 100)
+    for scenario in args.scenarios:
+        result = {"scenario": scenario, **measure(scenario, args.repeat)}
+        record["results"].append(result)
+
+        previous_record, previous = previous_result(history, scenario)
+        found = compare(scenario, result, previous, args.threshold)
+        note = "-"
+        if previous is not None:
+            note = (f"импорт {change(result['import_seconds'], previous['import_seconds'])} "
+                    f"(к {previous_record['commit'] or previous_record['time']})")
+        if found:
+            note += f"  РЕГРЕССИЯ: {', '.join(found)}"
+            regressions.append((scenario, found))
+
+        print(f"{scenario:<18} {result['wall_seconds']:>9.3f} {result['wall_min_seconds']:>8.3f} "
+              f"{result['import_seconds']:>10.3f}  {', '.join(result['heavy_modules']) or '-':<28} {note}")
+        for module, seconds in result["top_imports"]:
+            print(f"    {module:<30} {seconds:>9.3f} с")
+
+    with open(args.results, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    print(f"Результаты добавлены в {args.results}")
+
+    if regressions:
+        print(f"Регрессий: {len(regressions)} (порог времени {args.threshold:.0%})")
+        if args.strict:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Генератор синтетических логов Suricata (EVE JSON) для бенчмарков: события http, dns, flow и alert
+с заданными масштабом, кол-вом уникальных IP источника, долей alert-событий, долей повторных событий
+с тем же flow_id и всплесками активности. Запуск из корня проекта:
+
+    python -m benchmarks.eve_generator eve_1m.json --events 1000000 --unique-ips 100000 --bursts 3
+"""
+import os
+import time
+import argparse
+import numpy as np
+from datetime import datetime
+from typing import Iterator
+
+# Сигнатуры alert-событий: (signature_id, rev, сигнатура, категория, severity)
+SIGNATURES = [
+    (2002664, 10, "ET SCAN Nessus User Agent", "Attempted Information Leak", 2),
+    (2008578, 6, "ET SCAN Sipvicious Scan", "Attempted Information Leak", 2),
+    (2001219, 20, "ET SCAN Potential SSH Scan", "Attempted Information Leak", 2),
+    (2010935, 3, "ET SCAN Suspicious inbound to MSSQL port 1433", "Potentially Bad Traffic", 2),
+    (2013028, 7, "ET POLICY curl User-Agent Outbound", "Attempted Information Leak", 2),
+    (2019401, 4, "ET WEB_SERVER SQL Injection Attempt", "Web Application Attack", 1),
+    (2022028, 2, "ET WEB_SERVER Possible CVE-2014-6271 Attempt", "Attempted Administrator Privilege Gain", 1),
+]
+
+URLS = ["/index.html", "/", "/login", "/api/v1/status", "/static/app.js", "/images/logo.png", "/admin/", "/wp-login.php"]
+QUERIES = ["our-legal-site.example.local", "mail.example.local", "update.example.com", "cdn.example.net"]
+
+# Типы событий без alert и их доли
+EVENT_TYPES = np.array(['http', 'dns', 'flow'])
+EVENT_TYPE_SHARES = [0.6, 0.25, 0.15]
+ALERT = len(EVENT_TYPES)
+
+class EveGenerator:
+    """
+    Поток событий Suricata в формате EVE JSON (одно событие на строку). Источники событий:
+     - attackers "тяжелых" IP, на которые приходится attack_share событий (распределение Ципфа с параметром zipf_a)
+     - unique_ips фоновых IP с равномерным распределением
+     - bursts всплесков по burst_events событий: частота событий возрастает в burst_factor раз,
+       90% событий всплеска приходятся на burst_sources IP, которые вне всплеска не встречаются
+    alert_ratio событий - alert, в первую очередь на атакующих IP. duplicate_ratio событий повторяют flow_id
+    и IP одного из duplicate_distance предыдущих событий (как alert и http одного потока).
+    Средняя частота событий - rate в секунду, генерация воспроизводима при одинаковом seed
+    """
+
+    def __init__(self, events: int = 100_000, unique_ips: int = 10_000, attackers: int = 50, attack_share: float = 0.2,
+                 zipf_a: float = 1.5, alert_ratio: float = 0.05, duplicate_ratio: float = 0.05,
+                 duplicate_distance: int = 1000, bursts: int = 0, burst_events: int = None, burst_sources: int = 5,
+                 burst_factor: float = 20, rate: float = 1000, start: str = "2025-02-23T10:00:00+03:00",
+                 seed: int = 42, chunk_size: int = 100_000):
+        if not 0 <= attack_share < 1 or not 0 <= alert_ratio <= 1 or not 0 <= duplicate_ratio < 1:
+            raise ValueError("attack_share, alert_ratio и duplicate_ratio должны быть в диапазоне [0, 1)")
+        if unique_ips <= 0 or (attack_share > 0 and attackers <= 0):
+            raise ValueError("unique_ips и attackers должны быть > 0")
+
+        self.events = events
+        self.unique_ips = unique_ips
+        self.attackers = attackers
+        self.attack_share = attack_share
+        self.zipf_a = zipf_a
+        self.alert_ratio = alert_ratio
+        self.duplicate_ratio = duplicate_ratio
+        self.duplicate_distance = duplicate_distance
+        self.bursts = bursts
+        self.burst_events = burst_events if burst_events is not None else max(1, events // 100)
+        self.burst_sources = burst_sources
+        self.burst_factor = burst_factor
+        self.rate = rate
+        self.start = datetime.fromisoformat(start)
+        self.seed = seed
+        self.chunk_size = chunk_size
+
+        # Вероятность alert для событий атакующих и фоновых IP, чтобы в сумме доля alert-событий была alert_ratio
+        self.attack_alert = min(1.0, alert_ratio / attack_share) if attack_share > 0 else 0.0
+        self.background_alert = max(0.0, alert_ratio - attack_share * self.attack_alert) / (1 - attack_share)
+
+        # Нумерация источников: атакующие, источники всплесков, фоновые IP
+        self.burst_offset = attackers
+        self.background_offset = attackers + bursts * burst_sources
+
+    def lines(self) -> Iterator[str]:
+        """События в формате NDJSON - по строке на событие"""
+        rng = np.random.default_rng(self.seed)
+
+        # Всплески - непересекающиеся диапазоны номеров событий
+        burst_count = min(self.bursts, self.events // self.burst_events)
+        slots = np.sort(rng.choice(self.events // self.burst_events, burst_count, replace=False)) if burst_count else []
+        self.burst_starts = np.asarray(slots, dtype=np.int64) * self.burst_events
+
+        self.clock = self.start.timestamp()
+        self._second = None
+        for lo in range(0, self.events, self.chunk_size):
+            yield from self._chunk(rng, lo, min(lo + self.chunk_size, self.events))
+
+    def write(self, filename: str, fmt: str = "ndjson") -> int:
+        """Запись событий в файл: ndjson (как eve.json) или array (JSON-массив, как events.json). Возвращает размер файла"""
+        if fmt not in ("ndjson", "array"):
+            raise ValueError(f"Неизвестный формат: {fmt}")
+
+        with open(filename, 'w', encoding='utf-8') as f:
+            if fmt == "ndjson":
+                for line in self.lines():
+                    f.write(line)
+                    f.write('\n')
+            else:
+                separator = "[\n"
+                for line in self.lines():
+                    f.write(separator)
+                    f.write(line)
+                    separator = ",\n"
+                f.write("[]\n" if separator == "[\n" else "\n]\n")
+        return os.path.getsize(filename)
+
+    def _chunk(self, rng: np.random.Generator, lo: int, hi: int) -> Iterator[str]:
+        n = hi - lo
+        index = np.arange(lo, hi)
+
+        # Номер всплеска, в который попадает событие (-1 - вне всплеска)
+        burst = np.searchsorted(self.burst_starts, index, side='right') - 1
+        in_burst = (burst >= 0) & (index < self.burst_starts[np.maximum(burst, 0)] + self.burst_events) if len(self.burst_starts) else np.zeros(n, bool)
+        burst[~in_burst] = -1
+
+        # Время событий - пуассоновский поток, во время всплесков интервалы сокращаются в burst_factor раз
+        gaps = rng.exponential(1 / self.rate, n)
+        gaps[in_burst] /= self.burst_factor
+        times = self.clock + np.cumsum(gaps)
+        self.clock = float(times[-1])
+
+        # Источники событий
+        is_attack = rng.random(n) < self.attack_share
+        sources = np.where(
+            is_attack,
+            (rng.zipf(self.zipf_a, n) - 1) % max(self.attackers, 1),
+            rng.integers(0, self.unique_ips, n) + self.background_offset,
+        )
+        from_burst = in_burst & (rng.random(n) < 0.9)
+        sources[from_burst] = self.burst_offset + burst[from_burst] * self.burst_sources + rng.integers(0, self.burst_sources, n)[from_burst]
+        is_attack |= from_burst
+
+        # Типы событий
+        types = rng.choice(len(EVENT_TYPES), n, p=EVENT_TYPE_SHARES)
+        types[rng.random(n) < np.where(is_attack, self.attack_alert, self.background_alert)] = ALERT
+
+        # Повторные события потока копируют flow_id, IP и тип одного из предыдущих событий блока
+        origin = index - lo
+        duplicate = rng.random(n) < self.duplicate_ratio
+        origin[duplicate] = np.maximum(origin[duplicate] - rng.integers(1, self.duplicate_distance + 1, n)[duplicate], 0)
+        while True:
+            resolved = origin[origin]
+            if np.array_equal(resolved, origin):
+                break
+            origin = resolved
+
+        flow_ids = (1829127292340101 + index)[origin]
+        sources = sources[origin]
+        types = types[origin]
+        src_ports = rng.integers(1024, 65536, n)[origin]
+        signatures = rng.integers(0, len(SIGNATURES), n)
+        details = rng.integers(0, 1 << 30, n)
+
+        for i in range(n):
+            yield self._event(times[i], int(flow_ids[i]), lo + i, int(types[i]), _address(int(sources[i])),
+                              int(src_ports[i]), int(signatures[i]), int(details[i]))
+
+    def _timestamp(self, moment: float) -> str:
+        """Время события в формате Suricata (2025-02-23T10:15:19.130726+0300); строка секунды кэшируется"""
+        second = int(moment)
+        if second != self._second:
+            self._second = second
+            self._prefix = datetime.fromtimestamp(second, self.start.tzinfo).strftime('%Y-%m-%dT%H:%M:%S')
+            self._suffix = datetime.fromtimestamp(second, self.start.tzinfo).strftime('%z')
+        return f"{self._prefix}.{int((moment - second) * 1e6):06d}{self._suffix}"
+
+    def _event(self, moment: float, flow_id: int, number: int, event_type: int, src_ip: str, src_port: int,
+               signature: int, detail: int) -> str:
+        timestamp = self._timestamp(moment)
+        head = (f'{{"timestamp": "{timestamp}", "flow_id": {flow_id}, "pcap_cnt": {number}, ')
+
+        if event_type == 1:     # dns
+            return (head + f'"event_type": "dns", "src_ip": "{src_ip}", "src_port": {src_port}, '
+                    f'"dest_ip": "192.168.0.53", "dest_port": 53, "proto": "UDP", '
+                    f'"dns": {{"type": "query", "id": {detail & 0xFFFF}, "rrname": "{QUERIES[detail % len(QUERIES)]}", '
+                    f'"rrtype": "A", "tx_id": 0}}}}')
+
+        if event_type == 2:     # flow
+            pkts = 2 + detail % 40
+            return (head + f'"event_type": "flow", "src_ip": "{src_ip}", "src_port": {src_port}, '
+                    f'"dest_ip": "192.168.0.2", "dest_port": 443, "proto": "TCP", "app_proto": "tls", '
+                    f'"flow": {{"pkts_toserver": {pkts}, "pkts_toclient": {pkts + 2}, "bytes_toserver": {pkts * 150}, '
+                    f'"bytes_toclient": {pkts * 1100}, "start": "{timestamp}", "end": "{timestamp}", '
+                    f'"age": {detail % 60}, "state": "closed", "reason": "timeout"}}}}')
+
+        url = URLS[detail % len(URLS)]
+        status = 200 if detail % 10 else 404
+        http = (f'"http": {{"hostname": "our-legal-site.example.local", "url": "{url}", '
+                f'"http_user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36", '
+                f'"http_content_type": "text/html", "http_method": "GET", "protocol": "HTTP/1.1", '
+                f'"status": {status}, "length": {detail % 20000}}}, "app_proto": "http"')
+
+        if event_type == ALERT:
+            sid, rev, name, category, severity = SIGNATURES[signature]
+            return (head + f'"event_type": "alert", "src_ip": "{src_ip}", "src_port": {src_port}, '
+                    f'"dest_ip": "192.168.0.2", "dest_port": 80, "proto": "TCP", "tx_id": 0, '
+                    f'"alert": {{"action": "allowed", "gid": 1, "signature_id": {sid}, "rev": {rev}, '
+                    f'"signature": "{name}", "category": "{category}", "severity": {severity}}}, {http}}}')
+
+        return (head + f'"event_type": "http", "src_ip": "{src_ip}", "src_port": {src_port}, '
+                f'"dest_ip": "192.168.0.2", "dest_port": 80, "proto": "TCP", "tx_id": 0, {http}}}')
+
+def _address(number: int) -> str:
+    """IPv4-адрес источника по его номеру: соседние номера - соседние адреса одной подсети /24"""
+    number += 10 << 24
+    return f"{number >> 24 & 255}.{number >> 16 & 255}.{number >> 8 & 255}.{number & 255}"
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Параметры генератора для командной строки (общие с бенчмарками)"""
+    parser.add_argument('--unique-ips', type=int, default=10_000, help="кол-во фоновых IP источника")
+    parser.add_argument('--attackers', type=int, default=50, help="кол-во атакующих IP")
+    parser.add_argument('--attack-share', type=float, default=0.2, help="доля событий атакующих IP")
+    parser.add_argument('--alert-ratio', type=float, default=0.05, help="доля alert-событий")
+    parser.add_argument('--duplicate-ratio', type=float, default=0.05, help="доля повторных событий с тем же flow_id")
+    parser.add_argument('--bursts', type=int, default=3, help="кол-во всплесков активности")
+    parser.add_argument('--burst-factor', type=float, default=20, help="рост частоты событий во время всплеска")
+    parser.add_argument('--rate', type=float, default=1000, help="средняя частота событий в секунду")
+    parser.add_argument('--seed', type=int, default=42)
+
+def from_arguments(args: argparse.Namespace, events: int) -> EveGenerator:
+    return EveGenerator(events=events, unique_ips=args.unique_ips, attackers=args.attackers,
+                        attack_share=args.attack_share, alert_ratio=args.alert_ratio,
+                        duplicate_ratio=args.duplicate_ratio, bursts=args.bursts, burst_factor=args.burst_factor,
+                        rate=args.rate, seed=args.seed)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('output', help="файл для записи событий")
+    parser.add_argument('--events', type=int, default=100_000, help="кол-во событий (10^4 - 10^8)")
+    parser.add_argument('--format', default="ndjson", choices=["ndjson", "array"],
+                        help="ndjson - по событию в строке (eve.json), array - JSON-массив (events.json, режим memory)")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    size = from_arguments(args, args.events).write(args.output, args.format)
+    elapsed = time.perf_counter() - started
+    print(f"Записано {args.events} событий ({size / 2**20:.1f} МБ) в {args.output} за {elapsed:.1f} с "
+          f"({args.events / elapsed:.0f} событий/с)")
+
+if __name__ == "__main__":
+    main()
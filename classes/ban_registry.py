@@ -0,0 +1,96 @@
+import os
+import json
+import time
+import tempfile
+import logging
+from typing import Iterable, List
+
+logger = logging.getLogger(__name__)
+
+class BanRegistry:
+    """
+    Персистентный реестр активных блокировок IP на firewall со сроком их действия.
+    Позволяет не отправлять повторно блокировку IP, который уже заблокирован и срок блокировки которого
+    истекает не ранее чем через renew_before секунд
+    """
+
+    def __init__(self, filename: str = "ban_registry.json", ban_ttl: float = 86400, renew_before: float = 3600):
+        self.filename = filename
+        self.ban_ttl = ban_ttl
+        self.renew_before = renew_before
+        self.bans = {}              # ip -> время окончания блокировки
+        self.last_reconcile = 0.0
+        self.load()
+
+    def load(self):
+        """Загрузка реестра из файла"""
+        if not os.path.exists(self.filename):
+            return
+
+        try:
+            with open(self.filename, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            self.bans = state.get("bans", {})
+            self.last_reconcile = state.get("last_reconcile", 0.0)
+        except Exception as e:
+            logger.error("ОШИБКА при чтении реестра блокировок %s: %s", self.filename, e)
+
+    def save(self):
+        """Атомарная запись реестра - через временный файл и переименование"""
+        self.prune()
+        state = {"bans": self.bans, "last_reconcile": self.last_reconcile}
+
+        dirname = os.path.dirname(os.path.abspath(self.filename))
+        fd, tmp_name = tempfile.mkstemp(dir=dirname, prefix=".ban_registry-")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp_name, self.filename)
+        except Exception as e:
+            logger.error("ОШИБКА при записи реестра блокировок %s: %s", self.filename, e)
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
+
+    def prune(self):
+        """Удаление истекших блокировок"""
+        now = time.time()
+        self.bans = {ip: expires for ip, expires in self.bans.items() if expires > now}
+
+    def needs_ban(self, ip: str) -> bool:
+        """IP нужно заблокировать, если он не заблокирован или его блокировка скоро истекает"""
+        expires = self.bans.get(ip)
+        return expires is None or expires - time.time() <= self.renew_before
+
+    def split(self, ip_list: Iterable[str]):
+        """Разделение списка IP на требующие блокировки и уже заблокированные"""
+        to_ban, active = [], []
+        for ip in ip_list:
+            (to_ban if self.needs_ban(ip) else active).append(ip)
+        return to_ban, active
+
+    def record(self, ip: str):
+        """Фиксация успешной блокировки IP"""
+        self.bans[ip] = time.time() + self.ban_ttl
+
+    def reconcile_due(self, interval: float) -> bool:
+        """Пора ли сверить реестр со списком блокировок на firewall"""
+        return interval is not None and time.time() - self.last_reconcile >= interval
+
+    def reconcile(self, blocked_ips: List[str]):
+        """
+        Сверка реестра со списком блокировок на firewall:
+        снятые на firewall блокировки удаляются из реестра, неизвестные реестру - добавляются
+        """
+        blocked = set(blocked_ips)
+        now = time.time()
+
+        removed = [ip for ip in self.bans if ip not in blocked]
+        added = [ip for ip in blocked if ip not in self.bans]
+
+        for ip in removed:
+            del self.bans[ip]
+        for ip in added:
+            self.bans[ip] = now + self.ban_ttl
+
+        self.last_reconcile = now
+        logger.info("Сверка реестра блокировок с firewall: удалено %s, добавлено %s", len(removed), len(added))
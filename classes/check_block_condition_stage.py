@@ -1,59 +1,170 @@
-import numpy as np
-from typing import Any
+import ipaddress
+import logging
+from collections import defaultdict
+from typing import Any, Union
 from classes.pipeline import Stage
+from classes.prefix_trie import PrefixTrie
+from classes.logging_utils import summarize, log_rows
+
+logger = logging.getLogger(__name__)
 
 class CheckBlockConditionStage(Stage):
     """
     Класс этапа (stage) для pipeline. Проверяет условия и принимает решение о блокировке подозрительных ip-адресов.
-    Решение принимается на основе данных из предыдущих этапов - высокая активность или отрицательная проверка из virustotal
+    Решение принимается на основе данных из предыдущих этапов - высокая активность или отрицательная проверка из virustotal.
+    В режиме fast_path решение принимается только по высокой активности, сразу после анализа логов и без ожидания
+    VirusTotal - список таких IP (ips_for_fast_block) передается на немедленную блокировку (FirewallBanStage(fast_path=True)).
+    IP из списка разрешенных адресов allow_list (PrefixTrie или файл с подсетями CIDR) не блокируются никогда.
+    При заданном subnet_threshold блокируемые IP одной подсети /24 (IPv4) или /64 (IPv6) в кол-ве не менее
+    subnet_threshold заменяются одной блокировкой подсети (block_by_subnet), если подсеть не пересекается с allow_list
     """
 
-    def __init__(self):
+    reads = ('suspicious_ips', 'virustotal_ips')
+    writes = ('ips_for_block',)
+
+    def __init__(self, fast_path: bool = False, allow_list: Union[PrefixTrie, str] = None, subnet_threshold: int = None,
+                 subnet_prefix_v4: int = 24, subnet_prefix_v6: int = 64):
         self.results={}
+        self.fast_path = fast_path
+        self.allow_list = PrefixTrie.from_file(allow_list) if isinstance(allow_list, str) else allow_list
+        self.subnet_threshold = subnet_threshold
+        self.subnet_prefix = {4: subnet_prefix_v4, 6: subnet_prefix_v6}
+        self.subnets = {}
+
+        if fast_path:
+            self.reads = ('suspicious_ips',)
+            self.writes = ('ips_for_fast_block',)
 
     def process(self, data:Any):
         """Операции по проверке условий блокировки, выполняемые в рамках этапа pipeline"""
-        print("\n" + "="*70)
-        print("НАЧАЛО ЭТАПА")
-        print("Проверка условий для блокировки IP")
-        print("="*70)
+        logger.info("НАЧАЛО ЭТАПА: Проверка условий для блокировки IP")
 
-        # Проверяем условия и формируем список ip для блокировки
-        data["ips_for_block"]=self.decide_blocking(data['suspicious_ips'],data['virustotal_ips'])
+        if self.fast_path:
+            # Формируем список ip для немедленной блокировки по высокой активности
+            data["ips_for_fast_block"]=self.decide_fast_blocking(data['suspicious_ips'])
+        else:
+            # Проверяем условия и формируем список ip для блокировки
+            data["ips_for_block"]=self.decide_blocking(data['suspicious_ips'],data['virustotal_ips'])
+
+        # Объединяем блокировки адресов одной подсети
+        key = "ips_for_fast_block" if self.fast_path else "ips_for_block"
+        data[key] = self.aggregate_subnets(data[key])
 
         # Выводим результат принятия решения
         self.print_results()
 
-        print("\n" + "="*70)
-        print("КОНЕЦ ЭТАПА")
-        print("Проверка условий для блокировки IP")
-        print(f"Данные на конец этапа: {data}")
-        print("="*70)
+        logger.info("КОНЕЦ ЭТАПА: Проверка условий для блокировки IP")
+        logger.debug("Данные на конец этапа: %s", summarize(data))
         return data
 
     def decide_blocking(self, suspicious_ips,virustotal_ips):
         """Принимаем решение о блокировке IP на основе входных данных"""
+        self.results = {}
         
-        for ip, info in suspicious_ips.items():
+        for ip, is_active, total_requests in self._activity(suspicious_ips):
             # Проверяем условия для блокировки:
             # - всех с большим кол-вом запросов
             # - с отрицательной проверкой в VirusTotal
             vt_check = virustotal_ips.get(ip, False)
             
-            if info.get('activity_threshold', False):
-                print(f"IP: {ip} будет заблокирован из-за высокой активности (запросов = {info.get('total_requests', False)})")
+            if self.is_allowed(ip):
+                continue
+            elif is_active:
+                logger.debug("IP: %s будет заблокирован из-за высокой активности (запросов = %s)", ip, total_requests)
                 self.results[ip]="block_by_score"
             elif vt_check:
-                print(f"IP: {ip} будет заблокирован из-за отрицательной проверки VirusTotal")
+                logger.debug("IP: %s будет заблокирован из-за отрицательной проверки VirusTotal", ip)
                 self.results[ip]="block_by_virustotal"
             else:
-                print(f"IP: {ip} не подходит для блокировки. Низкая активность = {info.get('total_requests', False)}, проверка VirusTotal = {vt_check}")
+                logger.debug("IP: %s не подходит для блокировки. Низкая активность = %s, проверка VirusTotal = %s", ip, total_requests, vt_check)
+
+        return self.results
+
+    def decide_fast_blocking(self, suspicious_ips):
+        """Принимаем решение о немедленной блокировке IP только по высокой активности"""
+        self.results = {}
+
+        for ip, is_active, total_requests in self._activity(suspicious_ips, active_only=True):
+            if is_active and not self.is_allowed(ip):
+                logger.debug("IP: %s будет заблокирован немедленно из-за высокой активности (запросов = %s)", ip, total_requests)
+                self.results[ip]="block_by_score"
 
         return self.results
 
+    @staticmethod
+    def _activity(suspicious_ips, active_only: bool = False):
+        """
+        (ip, высокая активность, кол-во запросов) по подозрительным IP. Из колоночной таблицы (IPTable) значения
+        читаются колонками, без записей по каждому IP; при active_only - только строки с высокой активностью.
+        ip_table и numpy импортируются при выполнении этапа, а не при сборке pipeline
+        """
+        import numpy as np
+        from classes.ip_table import IPTable
+
+        if isinstance(suspicious_ips, IPTable) and {'activity_threshold', 'total_requests'} <= suspicious_ips.columns.keys():
+            active = suspicious_ips.column('activity_threshold').astype(bool)
+            total = suspicious_ips.column('total_requests')
+            rows = np.flatnonzero(active) if active_only else np.arange(len(suspicious_ips))
+            return zip(suspicious_ips.ips(rows.tolist()), active[rows].tolist(), total[rows].tolist())
+        return ((ip, info.get('activity_threshold', False), info.get('total_requests', False))
+                for ip, info in suspicious_ips.items())
+
+    def is_allowed(self, ip: str) -> bool:
+        """Проверка IP по списку разрешенных адресов"""
+        if self.allow_list is None:
+            return False
+        try:
+            network = self.allow_list.lookup(ip)
+        except ValueError:
+            return False
+        if network is not None:
+            logger.info("IP: %s не блокируется - входит в список разрешенных адресов (%s)", ip, network)
+        return network is not None
+
+    def aggregate_subnets(self, ips_for_block: dict) -> dict:
+        """
+        Замена блокировок отдельных IP одной подсети на блокировку подсети, если в подсети не менее
+        subnet_threshold блокируемых IP. Подсети, пересекающиеся со списком разрешенных адресов, не объединяются
+        """
+        self.subnets = {}
+        if not self.subnet_threshold:
+            return ips_for_block
+
+        groups = defaultdict(list)
+        for ip in ips_for_block:
+            try:
+                address = ipaddress.ip_address(ip)
+            except ValueError:
+                continue
+            groups[ipaddress.ip_network((address, self.subnet_prefix[address.version]), strict=False)].append(ip)
+
+        for network, ips in groups.items():
+            if len(ips) < self.subnet_threshold:
+                continue
+            if self.allow_list is not None and self.allow_list.overlaps(network):
+                logger.warning("Подсеть %s не блокируется целиком - пересекается со списком разрешенных адресов", network)
+                continue
+            self.subnets[str(network)] = ips
+
+        if not self.subnets:
+            return ips_for_block
+
+        # Подсеть занимает место первого из входящих в нее IP, остальные IP исключаются
+        collapsed = {ip: str(network) for network, ips in groups.items() if str(network) in self.subnets for ip in ips}
+        result = {}
+        for ip, reason in ips_for_block.items():
+            network = collapsed.get(ip)
+            if network is None:
+                result[ip] = reason
+            elif network not in result:
+                logger.info("Подсеть %s будет заблокирована целиком: %s IP для блокировки", network, len(self.subnets[network]))
+                result[network] = "block_by_subnet"
+
+        self.results = result
+        return result
+
     def print_results(self):
         """Выводим результаты проверки о блокировке в читаемом виде"""
-        print("\nСПИСОК IP И ПРИЧИНА ДЛЯ ПОСЛЕДУЮЩЕЙ БЛОКИРОВКИ:")
-        
-        for ip,value in self.results.items():
-            print(f"{ip} {value}")
+        logger.info("IP для блокировки: %s", len(self.results))
+        log_rows(logger, "СПИСОК IP И ПРИЧИНА ДЛЯ ПОСЛЕДУЮЩЕЙ БЛОКИРОВКИ:",
+                 (f"{ip} {value}" for ip, value in self.results.items()), len(self.results))
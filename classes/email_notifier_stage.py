@@ -1,45 +1,53 @@
-import os
-import smtplib
+import time
+import logging
+import threading
 from typing import Any
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime
-from dotenv import load_dotenv
 from classes.pipeline import Stage
+from classes.settings import get_setting
+from classes.smtp_session import SMTPSession
+from classes.stage_metrics import CallStats
+from classes.logging_utils import summarize
+
+logger = logging.getLogger(__name__)
 
 class EmailNotifierStage(Stage):
     """
-    Класс этапа (stage) для pipeline. Производит отправку email уведомлений о заблокированных IP адресах
+    Класс этапа (stage) для pipeline. Производит отправку email уведомлений о заблокированных IP адресах.
+    SMTP-соединение (SMTPSession) сохраняется между письмами и запусками pipeline и закрывается методом close().
+    STARTTLS отключается параметром окружения EMAIL_SMTP_STARTTLS=0 (например, для локального отладочного сервера)
     """
+
+    reads = ('block_result',)
+    writes = ('email_send_result',)
     
     def __init__(self,email_to:str = "admin@example.com"):
-        # Загружаем .env файл
-        load_dotenv()
-        
-        # Получаем настройки из .env
-        self.email = os.getenv("EMAIL_MAIL")
-        self.password = os.getenv("EMAIL_PASSWORD")
-        self.smtp_server = os.getenv("EMAIL_SMTP_SERVER")
-        self.smtp_port = int(os.getenv("EMAIL_SMTP_PORT", "587"))
+        # Получаем настройки из параметров окружения (.env)
+        self.email = get_setting("EMAIL_MAIL")
+        self.password = get_setting("EMAIL_PASSWORD")
+        self.smtp_server = get_setting("EMAIL_SMTP_SERVER")
+        self.smtp_port = int(get_setting("EMAIL_SMTP_PORT", "587"))
+        self.smtp_starttls = get_setting("EMAIL_SMTP_STARTTLS", "1").lower() not in ("0", "false", "no")
 
         if not all([self.email, self.password, self.smtp_server]):
             raise ValueError("SMTP не настроен в env!")
         
         self.email_to = email_to
+        self.calls = CallStats()
+        self.session = SMTPSession(self.smtp_server, self.smtp_port, self.email, self.password,
+                                   starttls=self.smtp_starttls)
     
     def process(self, data:Any):
         """Операции по отправке уведомлений, выполняемые в рамках этапа pipeline"""
-        print("\n" + "="*70)
-        print("НАЧАЛО ЭТАПА")
-        print("Отправка почтовых оповещений о блокировке")
-        print("="*70)
+        logger.info("НАЧАЛО ЭТАПА: Отправка почтовых оповещений о блокировке")
 
         body=self._create_message_body(
                 data['block_result']
             )
 
-        print ("Тело отправляемого сообщения:")
-        print (body)
+        logger.debug("Тело отправляемого сообщения:\n%s", body)
 
         result = self.send_email(
             to=self.email_to,
@@ -49,11 +57,8 @@ class EmailNotifierStage(Stage):
 
         data['email_send_result']=result
 
-        print("\n" + "="*70)
-        print("КОНЕЦ ЭТАПА")
-        print("Отправка почтовых оповещений о блокировкеn")
-        print(f"Данные на конец этапа: {data}")
-        print("="*70)
+        logger.info("КОНЕЦ ЭТАПА: Отправка почтовых оповещений о блокировке")
+        logger.debug("Данные на конец этапа: %s", summarize(data))
         return data
 
     def send_email(self, to: str, subject: str, body: str) -> bool:
@@ -66,17 +71,20 @@ class EmailNotifierStage(Stage):
             msg['Subject'] = subject
             msg.attach(MIMEText(body, 'plain', 'utf-8'))
             
-            # Отправляем
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.email, self.password)
-                server.send_message(msg)
+            # Отправляем через постоянное соединение
+            with self.calls.track("smtp"):
+                self.session.send(msg)
             
             return True
             
         except Exception as e:
-            print(f"Ошибка отправки: {e}")
+            logger.error("Ошибка отправки: %s", e)
             return False
+
+    def close(self):
+        """Закрытие SMTP-соединения"""
+        if self.session is not None:
+            self.session.close()
     
     def _create_message_body(self, blocked_ips: list) -> str:
         """Создание текста письма"""
@@ -95,4 +103,125 @@ IP адресов для блокировки: {len(blocked_ips)}
 
 Результаты блокировки:
 {ip_list_str}
-        """
\ No newline at end of file
+        """
+class EmailNotifierMockStage(EmailNotifierStage):
+    """Класс mock отправки почтовых оповещений - письмо формируется, но не отправляется"""
+    def __init__(self, email_to: str = "admin@example.com"):
+        self.email = "pipeline@example.local"
+        self.email_to = email_to
+        self.calls = CallStats()
+        self.session = None
+
+    def send_email(self, to: str, subject: str, body: str) -> bool:
+        """Mock отправки email"""
+        self.calls.record("smtp", 0.0)
+        logger.debug("Письмо для %s сформировано (mock, без отправки): %s", to, subject)
+        return True
+
+class EmailDigestNotifierStage(EmailNotifierStage):
+    """
+    Отправка оповещений о блокировках сводками (digest) в фоновом потоке - pipeline не ждет почтовый сервер.
+    Результаты блокировки накапливаются и отправляются одним письмом через digest_interval секунд после первого
+    неотправленного результата или сразу при накоплении digest_size IP. Повторные результаты по IP в пределах
+    сводки заменяют прежние. Пустые результаты писем не порождают.
+    email_send_result - результаты приняты к отправке; неотправленная сводка возвращается в очередь
+    и отправляется в следующем окне. close() отправляет накопленное и закрывает SMTP-соединение
+    """
+
+    def __init__(self, email_to: str = "admin@example.com", digest_interval: float = 300, digest_size: int = 100):
+        super().__init__(email_to)
+        self.digest_interval = digest_interval
+        self.digest_size = digest_size
+
+        self.pending = {}               # ip -> результат блокировки, ожидающие отправки
+        self.pending_since = None       # время (monotonic) первого неотправленного результата
+        self.condition = threading.Condition()
+        self.worker = None
+        self.closed = False
+        self.digests = 0
+
+    def process(self, data: Any):
+        """Постановка результатов блокировки в очередь сводки без ожидания отправки"""
+        logger.info("НАЧАЛО ЭТАПА: Отправка почтовых оповещений о блокировке (сводка)")
+
+        data['email_send_result'] = self.enqueue(data['block_result'])
+
+        logger.info("КОНЕЦ ЭТАПА: Отправка почтовых оповещений о блокировке (сводка)")
+        logger.debug("Данные на конец этапа: %s", summarize(data))
+        return data
+
+    def enqueue(self, block_result: dict) -> bool:
+        """Добавление результатов в сводку; False - если этап уже закрыт"""
+        with self.condition:
+            if self.closed:
+                logger.error("Оповещение не поставлено в очередь: этап закрыт")
+                return False
+            if not block_result:
+                return True
+
+            if self.pending_since is None:
+                self.pending_since = time.monotonic()
+            self.pending.update(block_result)
+            logger.debug("В сводке ожидают отправки IP: %s", len(self.pending))
+
+            if self.worker is None:
+                self.worker = threading.Thread(target=self._run, name="email-digest", daemon=True)
+                self.worker.start()
+            self.condition.notify()
+        return True
+
+    def _run(self):
+        """Фоновая отправка сводок"""
+        while True:
+            with self.condition:
+                while not self._digest_ready():
+                    if self.closed and not self.pending:
+                        return
+                    timeout = None
+                    if self.pending_since is not None:
+                        timeout = max(0.0, self.pending_since + self.digest_interval - time.monotonic())
+                    self.condition.wait(timeout)
+                digest, self.pending, self.pending_since = self.pending, {}, None
+
+            if self._send_digest(digest):
+                continue
+
+            with self.condition:
+                if self.closed:
+                    logger.error("Сводка по %s IP не отправлена и отброшена при закрытии этапа", len(digest))
+                    continue
+                # Неотправленная сводка повторяется в следующем окне; более новые результаты по IP сохраняются
+                self.pending = {**digest, **self.pending}
+                self.pending_since = time.monotonic()
+
+    def _digest_ready(self) -> bool:
+        if not self.pending:
+            return False
+        return (self.closed or len(self.pending) >= self.digest_size
+                or time.monotonic() - self.pending_since >= self.digest_interval)
+
+    def _send_digest(self, digest: dict) -> bool:
+        body = self._create_message_body(digest)
+        logger.debug("Тело отправляемой сводки:\n%s", body)
+        result = self.send_email(
+            to=self.email_to,
+            subject=f"Блокировка IP (сводка, {len(digest)} IP) - {datetime.now().strftime('%d.%m.%Y %H:%M')}",
+            body=body
+        )
+        if result:
+            self.digests += 1
+            logger.info("Отправлена сводка оповещений о блокировке: %s IP", len(digest))
+        return result
+
+    def close(self):
+        """Отправка накопленных результатов, остановка фонового потока и закрытие SMTP-соединения"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+            worker = self.worker
+        if worker is not None:
+            worker.join()
+        super().close()
+
+class EmailDigestNotifierMockStage(EmailDigestNotifierStage, EmailNotifierMockStage):
+    """Класс mock отправки сводок - сводки формируются в фоновом потоке, но не отправляются"""
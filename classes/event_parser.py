@@ -0,0 +1,197 @@
+import json
+from typing import Any, Iterable, List
+
+# Поля событий Suricata, которые используются в анализе
+EVENT_FIELDS = ('timestamp', 'flow_id', 'src_ip', 'event_type')
+
+# Порядок выбора библиотеки разбора JSON в режиме auto. Построчный разбор NDJSON быстрее у orjson: обращение
+# к полям документа simdjson из Python дороже построения всего события в orjson
+BACKENDS = ('orjson', 'simdjson', 'json')
+
+_MISSING = object()
+
+class EventParser:
+    """
+    Разбор событий Suricata стандартной библиотекой json с извлечением только полей fields.
+    Результат разбора - словарь из полей fields, которые есть в событии (значения - как у json.loads),
+    None для пустых и поврежденных строк. Значение, не являющееся JSON-объектом, возвращается без изменений.
+    Наследники используют быстрые библиотеки и при любом расхождении в разборе с json (ошибка разбора,
+    большие числа, повторяющиеся ключи) разбирают строку стандартной библиотекой - результат всегда совпадает
+    """
+    name = "json"
+
+    def __init__(self, fields: Iterable[str] = EVENT_FIELDS):
+        self.fields = tuple(fields)
+
+    def parse(self, line) -> Any:
+        """Разбор одной строки NDJSON (str или bytes)"""
+        line = line.strip()
+        if not line:
+            return None
+        return self._parse_std(line)
+
+    def parse_array(self, data: bytes) -> List[Any]:
+        """Разбор JSON-массива событий целиком (events.json)"""
+        return self._project_array(json.loads(data))
+
+    def project(self, event: Any) -> Any:
+        """Извлечение полей fields из разобранного события"""
+        if not isinstance(event, dict):
+            return event
+        return {field: event[field] for field in self.fields if field in event}
+
+    def _parse_std(self, line) -> Any:
+        try:
+            return self.project(json.loads(line))
+        except ValueError:
+            return None
+
+    def _project_array(self, events: Any) -> List[Any]:
+        if not isinstance(events, list):
+            raise ValueError("Ожидается JSON-массив событий")
+        return [self.project(event) for event in events]
+
+class OrjsonEventParser(EventParser):
+    """
+    Разбор событий библиотекой orjson (в несколько раз быстрее json).
+    Целые числа больше 64 бит orjson возвращает как float - такие строки разбираются стандартной библиотекой
+    """
+    name = "orjson"
+
+    def __init__(self, fields: Iterable[str] = EVENT_FIELDS):
+        super().__init__(fields)
+        self.orjson = _require("orjson")
+
+    def parse(self, line) -> Any:
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            event = self.orjson.loads(line)
+        except ValueError:
+            # NaN, Infinity, одиночные суррогаты и т.п. json разбирает, а orjson - нет
+            return self._parse_std(line)
+
+        if not isinstance(event, dict):
+            return event
+        result = {field: event[field] for field in self.fields if field in event}
+        for value in result.values():
+            if isinstance(value, float):
+                return self._parse_std(line)
+        return result
+
+    def parse_array(self, data: bytes) -> List[Any]:
+        try:
+            events = self.orjson.loads(data)
+        except ValueError:
+            return super().parse_array(data)
+
+        result = self._project_array(events)
+        for event in result:
+            if isinstance(event, dict) and any(isinstance(value, float) for value in event.values()):
+                return super().parse_array(data)
+        return result
+
+class SimdjsonEventParser(EventParser):
+    """
+    Разбор событий библиотекой pysimdjson: документ разбирается без построения вложенных объектов
+    (http, flow, alert), в объекты Python преобразуются только поля fields. Быстрее всего разбирает JSON-массив
+    событий целиком (режим memory).
+    simdjson при повторяющихся ключах берет первое значение, а json - последнее, поэтому строки, в которых ключи
+    из fields встречаются больше раз, чем извлечено полей, или есть escape-последовательности \\uXXXX (ключ может быть
+    записан через них), разбираются стандартной библиотекой
+    """
+    name = "simdjson"
+
+    def __init__(self, fields: Iterable[str] = EVENT_FIELDS):
+        super().__init__(fields)
+        self.simdjson = _require("simdjson")
+        self.parser = self.simdjson.Parser()
+        self.keys = [f'"{field}"' for field in self.fields]
+        self.keys_bytes = [key.encode() for key in self.keys]
+
+    def parse(self, line) -> Any:
+        line = line.strip()
+        if not line:
+            return None
+
+        try:
+            event = self._convert(self.parser.parse(line))
+        except ValueError:
+            return self._parse_std(line)
+
+        if isinstance(line, bytes):
+            keys, escape = self.keys_bytes, b'\\u'
+        else:
+            keys, escape = self.keys, '\\u'
+        if isinstance(event, dict) and (sum(map(line.count, keys)) != len(event) or escape in line):
+            return self._parse_std(line)
+        return event
+
+    def parse_array(self, data: bytes) -> List[Any]:
+        try:
+            document = self.parser.parse(data)
+        except ValueError:
+            return super().parse_array(data)
+        try:
+            result = self._convert_array(document)
+        finally:
+            # Объекты документа ссылаются на буфер парсера и должны быть освобождены до следующего разбора
+            del document
+        return result if result is not None else super().parse_array(data)
+
+    def _convert_array(self, document: Any):
+        """Извлечение полей из элементов массива; None, если в каком-либо событии повторяются ключи"""
+        if not isinstance(document, self.simdjson.Array):
+            raise ValueError("Ожидается JSON-массив событий")
+        result = []
+        for event in document:
+            if isinstance(event, self.simdjson.Object):
+                keys = list(event.keys())
+                if len(keys) != len(set(keys)):
+                    return None
+            result.append(self._convert(event))
+        return result
+
+    def _convert(self, value: Any) -> Any:
+        """Преобразование разобранного значения в объекты Python с извлечением полей fields из объекта события"""
+        if type(value) is not self.simdjson.Object:
+            return self._value(value)
+        event = {}
+        for field in self.fields:
+            item = value.get(field, _MISSING)
+            if item is not _MISSING:
+                event[field] = self._value(item) if isinstance(item, (self.simdjson.Object, self.simdjson.Array)) else item
+        return event
+
+    def _value(self, value: Any) -> Any:
+        if isinstance(value, self.simdjson.Object):
+            return value.as_dict()
+        if isinstance(value, self.simdjson.Array):
+            return value.as_list()
+        return value
+
+PARSERS = {parser.name: parser for parser in (SimdjsonEventParser, OrjsonEventParser, EventParser)}
+
+def get_parser(backend: str = "auto", fields: Iterable[str] = EVENT_FIELDS) -> EventParser:
+    """
+    Парсер событий по имени библиотеки: simdjson, orjson, json или auto - самая быстрая из установленных.
+    При явном указании неустановленной библиотеки - ImportError
+    """
+    if backend == "auto":
+        for name in BACKENDS:
+            try:
+                return PARSERS[name](fields)
+            except ImportError:
+                continue
+    if backend not in PARSERS:
+        raise ValueError(f"Неизвестная библиотека разбора JSON: {backend}")
+    return PARSERS[backend](fields)
+
+def _require(module: str):
+    """Импорт необязательной библиотеки разбора JSON"""
+    try:
+        return __import__(module)
+    except ImportError:
+        package = "pysimdjson" if module == "simdjson" else module
+        raise ImportError(f"Для разбора событий библиотекой {module} требуется {package}: pip install {package}")
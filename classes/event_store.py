@@ -0,0 +1,94 @@
+import os
+import time
+import argparse
+import pandas as pd
+from classes.suricata_event_reader import iter_events
+from classes.event_parser import get_parser
+
+# Поля событий, которые нужны для анализа и сохраняются в колоночном хранилище
+EVENT_COLUMNS = ['timestamp', 'flow_id', 'src_ip', 'event_type']
+
+# Колонки секционирования хранилища (по часу события)
+PARTITION_COLUMNS = ['date', 'hour']
+
+def ingest_events(json_file: str, store_dir: str, chunk_events: int = 500_000, chunk_size: int = 1 << 20,
+                  parser: str = "auto") -> int:
+    """
+    Конвертация лога Suricata (NDJSON или JSON-массив) в колоночное хранилище Parquet, секционированное по часам
+    (store_dir/date=YYYY-MM-DD/hour=HH/*.parquet). Сохраняются только поля EVENT_COLUMNS.
+    Файл читается потоково, в память одновременно попадает не более chunk_events событий.
+    Повторный вызов для новых логов дописывает файлы в существующее хранилище. parser - библиотека разбора JSON
+    (см. get_parser). Возвращает кол-во записанных событий
+    """
+    _require_pyarrow()
+
+    # Имена файлов с отметкой времени загрузки и номером блока - при чтении сохраняется порядок загрузки
+    ingest_id = time.strftime('%Y%m%d%H%M%S') + f"{time.time_ns() % 10**9:09d}"
+    rows = {column: [] for column in EVENT_COLUMNS}
+    written = 0
+    chunk = 0
+
+    for event in iter_events(json_file, chunk_size, get_parser(parser, EVENT_COLUMNS)):
+        for column in EVENT_COLUMNS:
+            rows[column].append(event.get(column))
+
+        if len(rows['src_ip']) >= chunk_events:
+            written += _write_chunk(rows, store_dir, ingest_id, chunk)
+            rows = {column: [] for column in EVENT_COLUMNS}
+            chunk += 1
+
+    if rows['src_ip']:
+        written += _write_chunk(rows, store_dir, ingest_id, chunk)
+
+    return written
+
+def _write_chunk(rows: dict, store_dir: str, ingest_id: str, chunk: int) -> int:
+    """Запись блока событий в хранилище"""
+    df = pd.DataFrame({
+        'timestamp': pd.array(rows['timestamp'], dtype='string'),
+        'flow_id': pd.array(rows['flow_id'], dtype='Int64'),
+        'src_ip': pd.array(rows['src_ip'], dtype='string'),
+        'event_type': pd.array(rows['event_type'], dtype='string'),
+    })
+
+    # Секция по часу события из времени Suricata (2025-02-23T10:15:19.130726+0300)
+    timestamp = df['timestamp'].fillna('')
+    df['date'] = timestamp.str.slice(0, 10).replace('', 'unknown')
+    df['hour'] = timestamp.str.slice(11, 13).replace('', 'unknown')
+
+    df.to_parquet(store_dir, engine='pyarrow', partition_cols=PARTITION_COLUMNS, index=False,
+                  basename_template=f"part-{ingest_id}-{chunk:06d}-{{i}}.parquet")
+    return len(df)
+
+def read_events(store_dir: str, columns: list = None, filters: list = None) -> pd.DataFrame:
+    """
+    Чтение событий из колоночного хранилища с загрузкой только нужных колонок.
+    filters - условия отбора секций в формате pyarrow, например [('date', '=', '2025-02-23'), ('hour', '>=', '10')]
+    """
+    _require_pyarrow()
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    # Значения секций всегда строковые, чтобы условия filters не зависели от автоопределения типа
+    partitioning = ds.partitioning(pa.schema([(column, pa.string()) for column in PARTITION_COLUMNS]), flavor='hive')
+    return pd.read_parquet(store_dir, engine='pyarrow', columns=columns, filters=filters, partitioning=partitioning)
+
+def _require_pyarrow():
+    """Проверка наличия необязательной зависимости pyarrow"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError("Для колоночного хранилища событий требуется pyarrow: pip install pyarrow")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Конвертация лога Suricata в колоночное хранилище Parquet")
+    parser.add_argument('json_file', help="лог Suricata (eve.json)")
+    parser.add_argument('store_dir', help="каталог хранилища")
+    parser.add_argument('--chunk-events', type=int, default=500_000, help="размер блока записи (событий)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.json_file):
+        raise SystemExit(f"Файл {args.json_file} не найден!")
+
+    count = ingest_events(args.json_file, args.store_dir, args.chunk_events)
+    print(f"Записано {count} событий в хранилище {args.store_dir}")
@@ -1,89 +1,246 @@
-import requests
-import os
-from dotenv import load_dotenv
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any,List
 from classes.pipeline import Stage
+from classes.settings import get_setting
+from classes.ban_registry import BanRegistry
+from classes.stage_metrics import CallStats
+from classes.logging_utils import summarize, log_rows
+
+logger = logging.getLogger(__name__)
 
 class FirewallBanStage(Stage):
     """
     Класс этапа (stage) для pipeline, производящий блокировку ip-адресов. 
-    Реализован абстрактный вызов API Firewall для блокировки списка подозрительных ip с предыдущего этапа
+    Реализован абстрактный вызов API Firewall для блокировки списка подозрительных ip с предыдущего этапа.
+    Запросы выполняются через одну HTTP-сессию с пулом keep-alive соединений. Режимы блокировки:
+     - batch_size задан - IP отправляются пакетами на пакетный endpoint /block/batch
+     - workers > 1 - одиночные запросы /block выполняются параллельно не более чем в workers потоков
+     - иначе - одиночные запросы последовательно
+    При передаче реестра registry уже заблокированные IP повторно не отправляются, а при заданном
+    reconcile_interval (в секундах) реестр периодически сверяется со списком блокировок на firewall.
+    В режиме fast_path блокируются IP из ips_for_fast_block (высокая активность, без ожидания VirusTotal), результат
+    записывается в fast_block_result. Основной этап не отправляет повторно успешно заблокированные на быстром пути IP
+    и включает их результат в block_result
     """
 
-    def __init__(self):
+    reads = ('ips_for_block', 'fast_block_result')
+    writes = ('block_result',)
+    source_key = 'ips_for_block'
+    result_key = 'block_result'
+
+    def __init__(self, batch_size: int = None, workers: int = 1, base_url: str = None, timeout: float = 5,
+                 registry: BanRegistry = None, reconcile_interval: float = None, fast_path: bool = False):
         self.results = {}
+        self.set_fast_path(fast_path)
+        self.registry = registry
+        self.reconcile_interval = reconcile_interval
+        self.calls = CallStats()
+        self.calls_before = 0
         
-        # Загружаем .env файл
-        load_dotenv()
-
-        # Получаем из него ключ для virustotal
-        api_key = os.getenv("API_KEY_FIREWALL")
+        # Получаем ключ API Firewall из параметров окружения (.env)
+        api_key = get_setting("API_KEY_FIREWALL")
 
         if not api_key:
             raise ValueError("API_KEY не установлен в env!")
 
         self.api_key = api_key
-        self.base_url = "https://your-firewall-url.local/v2/"
+        self.base_url = base_url or "https://your-firewall-url.local/v2/"
+        self.batch_size = batch_size
+        self.workers = workers
+        self.timeout = timeout
+
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        # Одна сессия на все запросы - соединения переиспользуются из пула
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, workers))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"API-Key": api_key})
+
+    def set_fast_path(self, fast_path: bool):
+        """Настройка ключей данных этапа для быстрого или основного пути блокировки"""
+        self.fast_path = fast_path
+        if fast_path:
+            self.source_key, self.result_key = 'ips_for_fast_block', 'fast_block_result'
+            self.reads, self.writes = ('ips_for_fast_block',), ('fast_block_result',)
 
     def process(self, data:Any):
         """Операции по блокировке ip, выполняемые в рамках этапа pipeline"""
-        print("\n" + "="*70)
-        print("НАЧАЛО ЭТАПА")
-        print("Блокировка подозрительных ip с помощью API Firewall")
-        print("="*70)
+        logger.info("НАЧАЛО ЭТАПА: Блокировка подозрительных ip с помощью API Firewall%s", " (быстрый путь)" if self.fast_path else "")
 
-        data["block_result"]=self.ban(list(data['ips_for_block']))
+        ip_list = list(data[self.source_key])
+
+        # IP, успешно заблокированные на быстром пути, повторно не отправляем
+        already_blocked = {} if self.fast_path else \
+            {ip: True for ip, result in data.get('fast_block_result', {}).items() if result}
+
+        results = self.ban([ip for ip in ip_list if ip not in already_blocked])
+        self.results = {ip: already_blocked.get(ip, results.get(ip)) for ip in ip_list}
+        data[self.result_key] = self.results
         self.print_results()
 
-        print("\n" + "="*70)
-        print("КОНЕЦ ЭТАПА")
-        print("Блокировка подозрительных ip с помощью API Firewall")
-        print(f"Данные на конец этапа: {data}")
-        print("="*70)
+        logger.info("КОНЕЦ ЭТАПА: Блокировка подозрительных ip с помощью API Firewall")
+        logger.debug("Данные на конец этапа: %s", summarize(data))
         return data
 
+    @property
+    def api_calls(self) -> int:
+        """Кол-во обращений к API Firewall с начала текущей блокировки"""
+        return self.calls.count("firewall") - self.calls_before
+
     def ban(self, ip_list: List[str]) -> dict:
-        """Блокировка списка IP через API"""
+        """Блокировка списка IP через API с пропуском уже заблокированных IP"""
         self.results = {}
-        
-        for ip in ip_list:
-            print(f"Блокировка {ip}...", end=" ")
-            
-            try:
-                response = requests.post(
+        self.calls_before = self.calls.count("firewall")
+
+        if self.registry is None:
+            return self.send_bans(ip_list)
+
+        # Периодическая сверка реестра с firewall исправляет расхождения (ручное снятие блокировок и т.п.)
+        if self.registry.reconcile_due(self.reconcile_interval):
+            blocked_ips = self.fetch_blocked()
+            if blocked_ips is not None:
+                self.registry.reconcile(blocked_ips)
+
+        to_ban, active = self.registry.split(ip_list)
+        logger.info("Новых или истекающих блокировок: %s, уже заблокировано: %s", len(to_ban), len(active))
+
+        results = self.send_bans(to_ban)
+        for ip, result in results.items():
+            if result:
+                self.registry.record(ip)
+        self.registry.save()
+
+        # Сохраняем порядок входного списка, уже заблокированные IP считаем успешно заблокированными
+        self.results = {ip: results[ip] if ip in results else True for ip in ip_list}
+        return self.results
+
+    def send_bans(self, ip_list: List[str]) -> dict:
+        """Отправка блокировок списка IP в API в выбранном режиме"""
+        self.results = {}
+
+        if self.batch_size:
+            # Пакетная блокировка, пакеты отправляются параллельно не более чем в workers потоков
+            batches = [ip_list[i:i + self.batch_size] for i in range(0, len(ip_list), self.batch_size)]
+            with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+                for batch_result in executor.map(self.ban_batch, batches):
+                    self.results.update(batch_result)
+
+        elif self.workers > 1:
+            # Параллельные одиночные запросы
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for ip, result in zip(ip_list, executor.map(self.ban_ip, ip_list)):
+                    self.results[ip] = result
+
+        else:
+            for ip in ip_list:
+                self.results[ip] = self.ban_ip(ip)
+
+        logger.info("Запросов к API Firewall: %s", self.api_calls)
+        return self.results
+
+    def fetch_blocked(self):
+        """Получение списка заблокированных IP с firewall. Возвращает None, если список получить не удалось"""
+        try:
+            with self.calls.track("firewall"):
+                response = self.session.get(f"{self.base_url}/blocked", timeout=self.timeout)
+            response.raise_for_status()
+            payload = response.json()
+            return payload.get("ips", []) if isinstance(payload, dict) else payload
+        except Exception as e:
+            logger.error("ОШИБКА при получении списка блокировок с firewall: %s", e)
+            return None
+
+    def ban_ip(self, ip: str) -> bool:
+        """Блокировка одного IP через API"""
+        try:
+            with self.calls.track("firewall"):
+                response = self.session.post(
                     f"{self.base_url}/block",
-                    headers={"API-Key": self.api_key},
                     json={"ip": ip, "action": "block"},
-                    timeout=5
+                    timeout=self.timeout
                 )
-                
-                self.results[ip] = response.status_code == 200
-                print("Заблокирован" if self.results[ip] else "Не заблокирован")
-                
-            except Exception as e:
-                self.results[ip] = False
-                print(f"Не заблокирован ({e})")
-                    
-        return self.results
+
+            result = response.status_code == 200
+            logger.debug("Блокировка %s... %s", ip, 'Заблокирован' if result else 'Не заблокирован')
+            return result
+
+        except Exception as e:
+            logger.warning("Блокировка %s... Не заблокирован (%s)", ip, e)
+            return False
+
+    def ban_batch(self, ips: List[str]) -> dict:
+        """
+        Блокировка пакета IP одним запросом к API.
+        Ответ может содержать поле results с результатом по каждому IP, иначе результат определяется кодом ответа
+        """
+        try:
+            with self.calls.track("firewall"):
+                response = self.session.post(
+                    f"{self.base_url}/block/batch",
+                    json={"ips": ips, "action": "block"},
+                    timeout=self.timeout
+                )
+
+            if response.status_code != 200:
+                logger.warning("Блокировка пакета из %s IP... Не заблокирован (HTTP %s)", len(ips), response.status_code)
+                return {ip: False for ip in ips}
+
+            try:
+                payload = response.json()
+            except ValueError:
+                payload = None
+
+            if isinstance(payload, dict) and isinstance(payload.get("results"), dict):
+                result = {ip: bool(payload["results"].get(ip, False)) for ip in ips}
+            else:
+                result = {ip: True for ip in ips}
+            logger.debug("Блокировка пакета из %s IP... Заблокировано %s", len(ips), sum(result.values()))
+            return result
+
+        except Exception as e:
+            logger.warning("Блокировка пакета из %s IP... Не заблокирован (%s)", len(ips), e)
+            return {ip: False for ip in ips}
         
+    def close(self):
+        """Закрытие пула соединений с API Firewall"""
+        self.session.close()
+
     def print_results(self):
         """Выводит результаты блокировки в читаемом виде"""
-        print("\nСПИСОК IP И РЕЗУЛЬТАТ ИХ БЛОКИРОВКИ:")
-        
-        for ip,result in self.results.items():
-            print(f"{ip} {'заблокирован' if result else 'Не заблокирован'} ")
+        logger.info("Заблокировано IP: %s из %s", sum(1 for result in self.results.values() if result), len(self.results))
+        log_rows(logger, "СПИСОК IP И РЕЗУЛЬТАТ ИХ БЛОКИРОВКИ:",
+                 (f"{ip} {'заблокирован' if result else 'Не заблокирован'}" for ip, result in self.results.items()),
+                 len(self.results))
 
 class FirewallBanMockStage(FirewallBanStage):
     """Класс mock обращения к API Firewall на блокировку ip"""
-    def __init__(self, suspicious_probability=0.6):
+    def __init__(self, suspicious_probability=0.6, registry: BanRegistry = None, reconcile_interval: float = None,
+                 fast_path: bool = False):
         self.results = {}
+        self.registry = registry
+        self.reconcile_interval = reconcile_interval
+        self.calls = CallStats()
+        self.calls_before = 0
+        self.set_fast_path(fast_path)
 
-    def ban(self, ip_list: List[str]) -> dict:
+    def send_bans(self, ip_list: List[str]) -> dict:
         """Блокировка списка IP через API"""
         self.results = {}
         
         for ip in ip_list:
-            print(f"Блокировка {ip}...", end=" ")
+            self.calls.record("firewall", 0.0)
             self.results[ip] = True
-            print("Заблокирован")
-        return self.results
\ No newline at end of file
+            logger.debug("Блокировка %s... Заблокирован", ip)
+        return self.results
+
+    def close(self):
+        """У mock нет соединений с API"""
+        pass
+
+    def fetch_blocked(self):
+        """Mock списка блокировок на firewall - совпадает с реестром"""
+        return list(self.registry.bans)
\ No newline at end of file
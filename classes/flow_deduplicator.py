@@ -0,0 +1,236 @@
+import sys
+import math
+import base64
+import hashlib
+import logging
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any
+from classes.suricata_event_reader import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+class FlowDeduplicator(ABC):
+    """
+    Абстрактный класс дедупликации событий по flow_id для потокового и инкрементального режимов анализа.
+    Метод is_duplicate() возвращает True, если поток уже встречался, иначе запоминает его
+    """
+
+    @abstractmethod
+    def is_duplicate(self, flow_id: Any, timestamp: Any = None) -> bool:
+        """Проверка, встречался ли поток; новый поток запоминается"""
+        pass
+
+    @abstractmethod
+    def clear(self):
+        """Сброс множества просмотренных потоков"""
+        pass
+
+    @abstractmethod
+    def memory_bytes(self) -> int:
+        """Оценка занимаемой памяти в байтах"""
+        pass
+
+    @abstractmethod
+    def state(self) -> dict:
+        """Состояние для сохранения в контрольной точке"""
+        pass
+
+    @abstractmethod
+    def restore(self, state: dict):
+        """Восстановление состояния из контрольной точки"""
+        pass
+
+class ExactFlowDeduplicator(FlowDeduplicator):
+    """
+    Точная дедупликация - хранит все просмотренные flow_id.
+    Результат совпадает с drop_duplicates(subset=['flow_id']), но память растет с кол-вом потоков
+    """
+
+    def __init__(self):
+        self.seen = set()
+
+    def is_duplicate(self, flow_id, timestamp=None):
+        if flow_id in self.seen:
+            return True
+        self.seen.add(flow_id)
+        return False
+
+    def clear(self):
+        self.seen = set()
+
+    def memory_bytes(self):
+        # Размер хэш-таблицы множества и самих целочисленных flow_id
+        return sys.getsizeof(self.seen) + len(self.seen) * sys.getsizeof(2 ** 62)
+
+    def state(self):
+        return {"seen": list(self.seen)}
+
+    def restore(self, state):
+        self.seen = set(state["seen"])
+
+class WindowedFlowDeduplicator(FlowDeduplicator):
+    """
+    Точная дедупликация в скользящем окне по времени события (timestamp).
+    Хранятся только flow_id, встречавшиеся за последние window_seconds секунд, поэтому память
+    ограничена кол-вом потоков в окне, а не за весь день.
+    Время события разбирается с точностью до секунды: события одной секунды разбираются один раз
+    """
+
+    def __init__(self, window_seconds: float = 3600):
+        self.window_seconds = window_seconds
+        self.seen = {}              # flow_id -> время последнего события потока
+        self.order = deque()        # (время, flow_id) в порядке поступления для вытеснения старых потоков
+        self.latest = None
+        self.last_second = None     # (секунда, часовой пояс) последнего разобранного времени события и его значение
+        self.last_ts = None
+
+    def event_time(self, timestamp):
+        """Время события в секундах Unix; строки той же секунды, что и предыдущая, повторно не разбираются"""
+        if not isinstance(timestamp, str):
+            return parse_timestamp(timestamp)
+        # Секунда и часовой пояс без дробной части: 2025-02-23T10:15:19.130726+0300 -> (2025-02-23T10:15:19, +0300)
+        second = (timestamp[:19], timestamp[19:].lstrip('.0123456789'))
+        if second != self.last_second:
+            self.last_second, self.last_ts = second, parse_timestamp(timestamp)
+        return self.last_ts
+
+    def is_duplicate(self, flow_id, timestamp=None):
+        ts = self.event_time(timestamp)
+        if ts is None:
+            ts = self.latest if self.latest is not None else 0.0
+
+        if self.latest is None or ts > self.latest:
+            self.latest = ts
+            self._evict()
+
+        duplicate = flow_id in self.seen
+
+        # Продлеваем время жизни потока, чтобы его поздние события тоже отбрасывались
+        if not duplicate or self.seen[flow_id] < ts:
+            self.seen[flow_id] = ts
+            self.order.append((ts, flow_id))
+        return duplicate
+
+    def _evict(self):
+        """Вытеснение потоков, вышедших за пределы окна"""
+        border = self.latest - self.window_seconds
+        while self.order and self.order[0][0] < border:
+            ts, flow_id = self.order.popleft()
+            if self.seen.get(flow_id) == ts:
+                del self.seen[flow_id]
+
+    def clear(self):
+        self.seen = {}
+        self.order = deque()
+        self.latest = None
+
+    def memory_bytes(self):
+        # Словарь flow_id -> время, очередь кортежей и хранимые в них числа
+        per_item = sys.getsizeof((0.0, 0)) + sys.getsizeof(2 ** 62) + sys.getsizeof(0.0)
+        return sys.getsizeof(self.seen) + sys.getsizeof(self.order) + len(self.order) * per_item
+
+    def state(self):
+        # Только потоки окна, без устаревших записей очереди - размер не зависит от истории
+        order = sorted(((ts, flow_id) for flow_id, ts in self.seen.items()), key=lambda item: item[0])
+        return {"window_seconds": self.window_seconds, "latest": self.latest, "order": order}
+
+    def restore(self, state):
+        self.clear()
+        self.latest = state["latest"]
+        for ts, flow_id in state["order"]:
+            self.seen[flow_id] = ts
+            self.order.append((ts, flow_id))
+
+class BloomFlowDeduplicator(FlowDeduplicator):
+    """
+    Приближенная дедупликация на фильтре Блума с фиксированным объемом памяти.
+    Параметры фильтра рассчитываются по ожидаемому кол-ву потоков capacity и допустимой доле ложных срабатываний error_rate.
+    Ложное срабатывание означает, что новый поток ошибочно считается дубликатом.
+    При заполнении фильтра он сменяется новым, а предыдущий хранится еще одно поколение -
+    поэтому память не превышает двух фильтров, а доля ложных срабатываний - 2 * error_rate.
+    Из-за смены поколений дубликаты распознаются не за весь лог: поток помнится, пока после него встретилось
+    от capacity до 2 * capacity новых потоков (в зависимости от заполнения поколения). Повторное событие более
+    давнего потока будет учтено как новый поток
+    """
+
+    def __init__(self, capacity: int = 10_000_000, error_rate: float = 0.001):
+        if capacity <= 0 or not 0 < error_rate < 1:
+            raise ValueError("capacity должно быть > 0, error_rate - в диапазоне (0, 1)")
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.clear()
+
+    def is_duplicate(self, flow_id, timestamp=None):
+        positions = self._positions(flow_id)
+
+        if self._contains(self.current, positions) or \
+                (self.previous is not None and self._contains(self.previous, positions)):
+            return True
+
+        if self.count >= self.capacity:
+            # Фильтр заполнен - начинаем новое поколение
+            self.previous = self.current
+            self.current = bytearray(self._num_bytes())
+            self.count = 0
+
+        for pos in positions:
+            self.current[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+        return False
+
+    def _positions(self, flow_id):
+        """Позиции битов для flow_id (двойное хэширование)"""
+        if isinstance(flow_id, int):
+            h = _mix64(flow_id & 0xFFFFFFFFFFFFFFFF)
+        else:
+            h = int.from_bytes(hashlib.blake2b(repr(flow_id).encode(), digest_size=8).digest(), 'little')
+        h1 = h & 0xFFFFFFFF
+        h2 = (h >> 32) | 1
+        m = self.num_bits
+        return [(h1 + i * h2) % m for i in range(self.num_hashes)]
+
+    @staticmethod
+    def _contains(bits, positions):
+        for pos in positions:
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def _num_bytes(self):
+        return (self.num_bits + 7) // 8
+
+    def clear(self):
+        self.current = bytearray(self._num_bytes())
+        self.previous = None
+        self.count = 0
+
+    def memory_bytes(self):
+        return len(self.current) + (len(self.previous) if self.previous is not None else 0)
+
+    def state(self):
+        return {
+            "capacity": self.capacity,
+            "error_rate": self.error_rate,
+            "count": self.count,
+            "current": base64.b64encode(self.current).decode('ascii'),
+            "previous": base64.b64encode(self.previous).decode('ascii') if self.previous is not None else None,
+        }
+
+    def restore(self, state):
+        if (state["capacity"], state["error_rate"]) != (self.capacity, self.error_rate):
+            logger.warning("Параметры фильтра Блума в контрольной точке отличаются от текущих - фильтр будет создан заново")
+            self.clear()
+            return
+        self.count = state["count"]
+        self.current = bytearray(base64.b64decode(state["current"]))
+        self.previous = bytearray(base64.b64decode(state["previous"])) if state["previous"] is not None else None
+
+def _mix64(x: int) -> int:
+    """Перемешивание битов 64-битного числа (финализатор splitmix64)"""
+    x = (x ^ (x >> 30)) * 0xBF58476D1CE4E5B9 & 0xFFFFFFFFFFFFFFFF
+    x = (x ^ (x >> 27)) * 0x94D049BB133111EB & 0xFFFFFFFFFFFFFFFF
+    return x ^ (x >> 31)
@@ -0,0 +1,315 @@
+import sys
+import math
+import heapq
+import base64
+import hashlib
+import logging
+from array import array
+from classes.flow_deduplicator import _mix64
+
+logger = logging.getLogger(__name__)
+
+class CountMinSketch:
+    """
+    Count-Min Sketch - приближенные счетчики в фиксированной памяти (depth строк по width счетчиков).
+    Оценка никогда не занижает истинное значение, а с вероятностью 1 - delta завышает его не более чем на epsilon * N,
+    где N - сумма всех добавленных значений. Используется консервативное обновление (увеличиваются только
+    минимальные счетчики), которое уменьшает завышение при той же памяти
+    """
+
+    def __init__(self, epsilon: float = 0.0001, delta: float = 0.01):
+        if not 0 < epsilon < 1 or not 0 < delta < 1:
+            raise ValueError("epsilon и delta должны быть в диапазоне (0, 1)")
+
+        self.epsilon = epsilon
+        self.delta = delta
+        self.width = int(math.ceil(math.e / epsilon))
+        self.depth = int(math.ceil(math.log(1 / delta)))
+        self.clear()
+
+    def add(self, key: str, count: int = 1) -> int:
+        """Увеличение счетчика key, возвращает новую оценку"""
+        return self._add(_hash64(key), count)
+
+    def estimate(self, key: str) -> int:
+        """Оценка счетчика key сверху"""
+        return self._estimate(_hash64(key))
+
+    def _positions(self, h: int):
+        """Позиции счетчиков в строках (двойное хэширование)"""
+        h1 = h & 0xFFFFFFFF
+        h2 = (h >> 32) | 1
+        w = self.width
+        return [row * w + (h1 + row * h2) % w for row in range(self.depth)]
+
+    def _add(self, h: int, count: int, positions: list = None) -> int:
+        positions = positions or self._positions(h)
+        table = self.table
+        value = min([table[pos] for pos in positions]) + count
+        for pos in positions:
+            if table[pos] < value:
+                table[pos] = value
+        self.total += count
+        return value
+
+    def _estimate(self, h: int) -> int:
+        table = self.table
+        return min([table[pos] for pos in self._positions(h)])
+
+    def clear(self):
+        self.table = array('q', bytes(8 * self.width * self.depth))
+        self.total = 0
+
+    def memory_bytes(self) -> int:
+        return self.table.itemsize * len(self.table)
+
+    def state(self) -> dict:
+        return {
+            "epsilon": self.epsilon,
+            "delta": self.delta,
+            "total": self.total,
+            "table": base64.b64encode(self.table.tobytes()).decode('ascii'),
+        }
+
+    def restore(self, state: dict):
+        if (state["epsilon"], state["delta"]) != (self.epsilon, self.delta):
+            logger.warning("Параметры Count-Min Sketch в контрольной точке отличаются от текущих - счетчики будут созданы заново")
+            self.clear()
+            return
+        self.table = array('q')
+        self.table.frombytes(base64.b64decode(state["table"]))
+        self.total = state["total"]
+
+class SpaceSaving:
+    """
+    Алгоритм Space-Saving - top-K самых частых ключей в памяти на capacity ключей.
+    Новый ключ при заполнении вытесняет ключ с минимальным счетчиком и наследует его значение (как ошибку).
+    Счетчик отслеживаемого ключа завышает истинное значение не более чем на N / capacity, а истинное значение
+    неотслеживаемого ключа не превышает минимального счетчика (min_count)
+    """
+
+    def __init__(self, capacity: int = 1000):
+        if capacity <= 0:
+            raise ValueError("capacity должно быть > 0")
+        self.capacity = capacity
+        self.clear()
+
+    def add(self, key: str, count: int = 1):
+        item = self.counts.get(key)
+        if item is not None:
+            item[0] += count
+            return
+
+        if len(self.counts) < self.capacity:
+            self.counts[key] = [count, 0]
+            heapq.heappush(self.heap, (count, key))
+            return
+
+        # Куча обновляется лениво: устаревшие значения счетчиков актуализируются только при поиске минимума
+        while True:
+            heap_count, heap_key = self.heap[0]
+            current = self.counts[heap_key][0]
+            if current == heap_count:
+                break
+            heapq.heapreplace(self.heap, (current, heap_key))
+
+        del self.counts[heap_key]
+        self.counts[key] = [heap_count + count, heap_count]
+        heapq.heapreplace(self.heap, (heap_count + count, key))
+
+    def min_count(self) -> int:
+        """Верхняя граница истинного значения для неотслеживаемых ключей"""
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(item[0] for item in self.counts.values())
+
+    def top(self, k: int = None):
+        """Список (ключ, оценка, ошибка) по убыванию оценки"""
+        items = sorted(self.counts.items(), key=lambda item: item[1][0], reverse=True)
+        return [(key, count, error) for key, (count, error) in items[:k]]
+
+    def clear(self):
+        self.counts = {}            # ключ -> [счетчик, ошибка]
+        self.heap = []              # (счетчик на момент добавления в кучу, ключ)
+
+    def memory_bytes(self) -> int:
+        # Словарь, списки [счетчик, ошибка], элементы кучи и строки ключей
+        per_item = sys.getsizeof([0, 0]) + sys.getsizeof((0, '')) + sys.getsizeof('255.255.255.255') + 2 * sys.getsizeof(2 ** 40)
+        return sys.getsizeof(self.counts) + sys.getsizeof(self.heap) + len(self.counts) * per_item
+
+    def state(self) -> dict:
+        return {"capacity": self.capacity, "items": [[key, count, error] for key, (count, error) in self.counts.items()]}
+
+    def restore(self, state: dict):
+        self.clear()
+        if state["capacity"] != self.capacity:
+            logger.warning("Размер Space-Saving в контрольной точке отличается от текущего - счетчики будут созданы заново")
+            return
+        for key, count, error in state["items"]:
+            self.counts[key] = [count, error]
+        self.heap = [(item[0], key) for key, item in self.counts.items()]
+        heapq.heapify(self.heap)
+
+class HyperLogLog:
+    """
+    HyperLogLog - оценка кол-ва уникальных ключей в 2 ** precision байтах.
+    Относительная ошибка около 1.04 / sqrt(2 ** precision) (0.8% при precision = 14)
+    """
+
+    def __init__(self, precision: int = 14):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision должно быть в диапазоне [4, 18]")
+        self.precision = precision
+        self.clear()
+
+    def add(self, key: str):
+        self._add(_hash64(key))
+
+    def _add(self, h: int):
+        # Отдельное перемешивание, чтобы регистры не коррелировали с позициями Count-Min Sketch
+        h = _mix64(h)
+        p = self.precision
+        index = h >> (64 - p)
+        rest = h & ((1 << (64 - p)) - 1)
+        rank = (64 - p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self) -> int:
+        m = len(self.registers)
+        estimate = self._alpha(m) * m * m / sum(2.0 ** -r for r in self.registers)
+
+        # Поправка для малых кардинальностей - линейный подсчет по пустым регистрам
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    @staticmethod
+    def _alpha(m: int) -> float:
+        if m == 16:
+            return 0.673
+        if m == 32:
+            return 0.697
+        if m == 64:
+            return 0.709
+        return 0.7213 / (1 + 1.079 / m)
+
+    def clear(self):
+        self.registers = bytearray(1 << self.precision)
+
+    def memory_bytes(self) -> int:
+        return len(self.registers)
+
+    def state(self) -> dict:
+        return {"precision": self.precision, "registers": base64.b64encode(self.registers).decode('ascii')}
+
+    def restore(self, state: dict):
+        if state["precision"] != self.precision:
+            logger.warning("Точность HyperLogLog в контрольной точке отличается от текущей - оценка будет создана заново")
+            self.clear()
+            return
+        self.registers = bytearray(base64.b64decode(state["registers"]))
+
+class HeavyHitterCounter:
+    """
+    Приближенный подсчет запросов и alert-событий по IP в фиксированной памяти для потокового и
+    инкрементального режимов анализа (например, при DDoS с подменой адресов источника).
+    Кол-во запросов и alert-событий оценивается Count-Min Sketch (завышение не более epsilon * N с вероятностью
+    1 - delta), самые активные IP отслеживаются Space-Saving (top_k IP по запросам и top_k IP по alert-событиям),
+    кол-во уникальных IP оценивается HyperLogLog. Память не зависит от кол-ва IP-адресов источника
+    """
+
+    def __init__(self, top_k: int = 1000, epsilon: float = 0.0001, delta: float = 0.01, precision: int = 14):
+        self.requests = CountMinSketch(epsilon, delta)
+        self.alerts = CountMinSketch(epsilon, delta)
+        self.top_requests = SpaceSaving(top_k)
+        self.top_alerts = SpaceSaving(top_k)
+        self.distinct = HyperLogLog(precision)
+
+    def add(self, src_ip: str, is_alert: bool = False):
+        """Учет одного события IP"""
+        h = _hash64(src_ip)
+        # Размеры обоих Count-Min Sketch совпадают - позиции счетчиков вычисляются один раз
+        positions = self.requests._positions(h)
+        self.requests._add(h, 1, positions)
+        self.top_requests.add(src_ip)
+        self.distinct._add(h)
+        if is_alert:
+            self.alerts._add(h, 1, positions)
+            self.top_alerts.add(src_ip)
+
+    def total(self) -> int:
+        """Кол-во учтенных событий"""
+        return self.requests.total
+
+    def unique_ips(self) -> int:
+        """Оценка кол-ва уникальных IP"""
+        return self.distinct.count()
+
+    def estimate(self, src_ip: str):
+        """Оценка сверху кол-ва запросов и alert-событий IP: минимум из оценок Count-Min Sketch и Space-Saving"""
+        return self._estimate(src_ip, self.top_requests.min_count(), self.top_alerts.min_count())
+
+    def _estimate(self, src_ip: str, requests_floor: int, alerts_floor: int):
+        h = _hash64(src_ip)
+        requests = self.top_requests.counts.get(src_ip)
+        alerts = self.top_alerts.counts.get(src_ip)
+        return (
+            min(self.requests._estimate(h), requests[0] if requests is not None else requests_floor),
+            min(self.alerts._estimate(h), alerts[0] if alerts is not None else alerts_floor),
+        )
+
+    @staticmethod
+    def _lower_bound(summary: SpaceSaving, key: str) -> int:
+        """Гарантированная нижняя граница истинного значения по Space-Saving (0 для неотслеживаемых ключей)"""
+        item = summary.counts.get(key)
+        return item[0] - item[1] if item is not None else 0
+
+    def heavy_hitters(self):
+        """
+        Список (ip, оценка запросов, оценка alert-событий, нижняя граница запросов, нижняя граница alert-событий)
+        для отслеживаемых IP в порядке убывания оценки запросов
+        """
+        ips = dict.fromkeys(ip for ip, _, _ in self.top_requests.top())
+        ips.update(dict.fromkeys(ip for ip, _, _ in self.top_alerts.top()))
+
+        requests_floor = self.top_requests.min_count()
+        alerts_floor = self.top_alerts.min_count()
+        result = [
+            (ip, *self._estimate(ip, requests_floor, alerts_floor),
+             self._lower_bound(self.top_requests, ip), self._lower_bound(self.top_alerts, ip))
+            for ip in ips
+        ]
+        result.sort(key=lambda item: item[1], reverse=True)
+        return result
+
+    def components(self):
+        return (self.requests, self.alerts, self.top_requests, self.top_alerts, self.distinct)
+
+    def clear(self):
+        for component in self.components():
+            component.clear()
+
+    def memory_bytes(self) -> int:
+        return sum(component.memory_bytes() for component in self.components())
+
+    def state(self) -> dict:
+        return {
+            "requests": self.requests.state(),
+            "alerts": self.alerts.state(),
+            "top_requests": self.top_requests.state(),
+            "top_alerts": self.top_alerts.state(),
+            "distinct": self.distinct.state(),
+        }
+
+    def restore(self, state: dict):
+        self.requests.restore(state["requests"])
+        self.alerts.restore(state["alerts"])
+        self.top_requests.restore(state["top_requests"])
+        self.top_alerts.restore(state["top_alerts"])
+        self.distinct.restore(state["distinct"])
+
+def _hash64(key: str) -> int:
+    """Стабильный между запусками 64-битный хэш ключа (hash() для строк рандомизирован)"""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little')
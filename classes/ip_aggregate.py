@@ -0,0 +1,101 @@
+from collections import Counter
+from classes.suricata_event_reader import iter_events
+from classes.event_parser import get_parser
+from classes.flow_deduplicator import WindowedFlowDeduplicator
+
+class IPAggregate:
+    """
+    Частичный агрегат событий Suricata по одному файлу лога: кол-во запросов и alert-событий по IP
+    и распределение типов событий. Повторные события потока (flow_id) отбрасываются дедупликацией
+    в окне window секунд (WindowedFlowDeduplicator), поэтому память ограничена потоками в окне.
+    Для дедупликации между файлами агрегат хранит только потоки на границах файла: начатые в первые window секунд
+    (head) и активные в последние window секунд (tail). Агрегаты объединяются методом merge() в порядке файлов:
+    поток из начала файла, встречавшийся в окне в конце предыдущих файлов, считается дубликатом
+    """
+
+    def __init__(self, window: float = 3600):
+        self.ip_counts = Counter()
+        self.alert_counts = Counter()
+        self.event_types = Counter()
+        self.records_loaded = 0
+        self.window = window
+        self.dedup = WindowedFlowDeduplicator(window)
+        self.first_ts = None
+        self.head = {}              # flow_id -> (src_ip, event_type, время) потоков, начатых в первые window секунд
+        self.tail = {}              # flow_id -> время последнего события потоков последних window секунд (после finish())
+        self.recent = {}            # flow_id -> время: потоки в окне на конце объединенных файлов (для merge())
+        self.latest = None
+
+    def add(self, event: dict):
+        """Учет одного события. Повторные события потока (по flow_id) отбрасываются"""
+        self.records_loaded += 1
+
+        flow_id = event.get('flow_id')
+        timestamp = event.get('timestamp')
+        if self.dedup.is_duplicate(flow_id, timestamp):
+            return
+
+        src_ip = event.get('src_ip')
+        event_type = event.get('event_type')
+        self._count(src_ip, event_type, 1)
+
+        ts = self.dedup.event_time(timestamp)
+        if self.first_ts is None:
+            self.first_ts = ts
+        if ts is None or self.first_ts is None or ts < self.first_ts + self.window:
+            self.head[flow_id] = (src_ip, event_type, ts)
+
+    def finish(self) -> "IPAggregate":
+        """Завершение чтения файла: сохраняем потоки окна на конце файла, дедупликатор больше не нужен"""
+        self.tail = dict(self.dedup.seen)
+        self.dedup = None
+        return self
+
+    def _count(self, src_ip, event_type, delta: int):
+        self.event_types[event_type] += delta
+        if src_ip is None:
+            return
+        self.ip_counts[src_ip] += delta
+        if event_type == 'alert':
+            self.alert_counts[src_ip] += delta
+
+    def merge(self, other: "IPAggregate") -> "IPAggregate":
+        """Объединение с агрегатом следующего файла"""
+        self.records_loaded += other.records_loaded
+        self.ip_counts.update(other.ip_counts)
+        self.alert_counts.update(other.alert_counts)
+        self.event_types.update(other.event_types)
+
+        for flow_id, (src_ip, event_type, ts) in other.head.items():
+            seen = self.recent.get(flow_id)
+            if seen is not None and (ts is None or abs(ts - seen) <= self.window):
+                # Поток уже учтен по более раннему файлу - событие из текущего файла является дубликатом
+                self._count(src_ip, event_type, -1)
+
+        for flow_id, ts in other.tail.items():
+            if ts >= self.recent.get(flow_id, ts):
+                self.recent[flow_id] = ts
+            if self.latest is None or ts > self.latest:
+                self.latest = ts
+
+        # Потоки, вышедшие за окно, больше не могут совпасть с началом следующих файлов
+        if self.latest is not None:
+            border = self.latest - self.window
+            self.recent = {flow_id: ts for flow_id, ts in self.recent.items() if ts >= border}
+
+        # Удаляем обнулившиеся счетчики
+        self.ip_counts = +self.ip_counts
+        self.alert_counts = +self.alert_counts
+        self.event_types = +self.event_types
+        return self
+
+def aggregate_file(filename: str, chunk_size: int = 1 << 20, parser: str = "auto", window: float = 3600) -> IPAggregate:
+    """
+    Построение частичного агрегата по одному файлу (выполняется в отдельном процессе).
+    parser - библиотека разбора JSON (см. get_parser), парсер создается в процессе;
+    window - окно дедупликации потоков в секундах
+    """
+    aggregate = IPAggregate(window)
+    for event in iter_events(filename, chunk_size, get_parser(parser, ('flow_id', 'src_ip', 'event_type', 'timestamp'))):
+        aggregate.add(event)
+    return aggregate.finish()
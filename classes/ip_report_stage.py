@@ -1,90 +1,129 @@
-import json
+import os
+import logging
 from classes.pipeline import Stage
-from typing import Any
+from typing import Any, Iterator, Tuple
+from classes.report_writer import ReportWriter, read_report, parse_line
+from classes.logging_utils import summarize, log_rows
+
+logger = logging.getLogger(__name__)
 
 class IPReportStage(Stage):
     """
-    Класс этапа (stage) для pipeline, формирующий итоговый отчет. 
-    Соединяет данные из разных этапов по ip-адресу клиента, формирует итоговый json и сохраняет в файл
+    Класс этапа (stage) для pipeline, формирующий итоговый отчет.
+    Соединяет данные из разных этапов по ip-адресу клиента, формирует итоговый json и сохраняет в файл.
+    Отчет записывается потоково, по IP по мере соединения данных, во временный файл с атомарной заменой
+    (см. ReportWriter): fmt="json" - JSON-объект {ip: запись} по строке на IP, fmt="jsonl" - по записи в строке.
+    В режиме merge существующий отчет обновляется: записи IP из новых данных объединяются с прежними
+    (значения этапов заменяются новыми), строки остальных IP копируются без разбора, новые IP дописываются в конец
     """
-    
-    def __init__(self,filename: str = 'report.json'):
+
+    reads = ('suspicious_ips', 'virustotal_ips', 'ips_for_block', 'block_result')
+    writes = ('report_file_save',)
+
+    def __init__(self,filename: str = 'report.json', fmt: str = "json", merge: bool = False):
+        if fmt not in ReportWriter.FORMATS:
+            raise ValueError(f"Неизвестный формат отчета: {fmt}")
+
         self.named_dicts_for_report = {}
         self.filename = filename
+        self.fmt = fmt
+        self.merge = merge
         self.results = {}
+        self.report_size = 0
+
+        # Перечень этапов, по которым формируется отчет
+        self.dicts_for_report = list(self.reads)
 
     def process(self, data:Any):
         """Операции для формирования отчета и сохранению его в файл, выполняемые в рамках этапа pipeline"""
-        print("\n" + "="*70)
-        print("НАЧАЛО ЭТАПА")
-        print("Формирование отчета")
-        print("="*70)
-
-        # Указываем перечень этапов, по которым будет сформирован отчет
-        self.dicts_for_report=[
-            "suspicious_ips",
-            "virustotal_ips",
-            "ips_for_block",
-            "block_result"
-        ]
-
-        # Формируем отчет
-        self.get_report(data)
+        logger.info("НАЧАЛО ЭТАПА: Формирование отчета")
 
-        # Выводим отчет в консоль
-        self.print_results()
+        # Формируем отчет и сохраняем его в файл
+        data['report_file_save']=self.to_json(data)
 
-        # Сохраняем отчет в файл
-        data['report_file_save']=self.to_json()
+        # Выводим отчет в консоль
+        self.print_results(data)
 
-        print("\n" + "="*70)
-        print("КОНЕЦ ЭТАПА")
-        print("Формирование отчета")
-        print(f"Данные на конец этапа: {data}")
-        print("="*70)
+        logger.info("КОНЕЦ ЭТАПА: Формирование отчета")
+        logger.debug("Данные на конец этапа: %s", summarize(data))
         return data
 
+    def report_dicts(self, data) -> list:
+        """Данные этапов, по которым формируется отчет, в порядке их появления в данных pipeline"""
+        return [(dict_name, ip_dict) for dict_name, ip_dict in data.items() if dict_name in self.dicts_for_report]
+
+    def iter_report(self, data) -> Iterator[Tuple[str, dict]]:
+        """
+        Соединение данных с разных этапов по ключу (ip) без построения всего отчета в памяти.
+        Записи выдаются в порядке первого появления IP в данных этапов
+        """
+        dicts = self.report_dicts(data)
+        for index, (dict_name, ip_dict) in enumerate(dicts):
+            for ip in ip_dict:
+                # IP из данных предыдущих этапов уже выдан
+                if any(ip in earlier for _, earlier in dicts[:index]):
+                    continue
+                yield ip, {name: other[ip] for name, other in dicts[index:] if ip in other}
 
     def get_report(self, data):
         """Формируем отчет - соединяем данные с разных этапов по ключу (ip)"""
-        self.results = {}
-
-        # Обходим все этапы в данных для отчета
-        for dict_name, ip_dict in data.items():
-            # Проверяем, входит этап в перечень этапов, по которым нужно сформировать отчет
-            if dict_name not in self.dicts_for_report:
-                continue
-            # Если входит - соединяем данные этапа с общим отчетом по ip
-            for ip, data in ip_dict.items():
-                if ip not in self.results:
-                    self.results[ip] = {}
-                self.results[ip][dict_name] = data
-        
+        self.results = dict(self.iter_report(data))
         return self.results
-    
-    def to_json(self):
-        """Сохраняем отчет в JSON"""
-        if not self.results:
-            self.get_report()
-        
-        json_str = json.dumps(self.results, indent=2, ensure_ascii=False, default=bool)
-        
+
+    def to_json(self, data=None):
+        """Сохраняем отчет в файл (по умолчанию - отчет, сформированный get_report)"""
+        merge = self.merge and os.path.exists(self.filename)
         try:
-            with open(self.filename, 'w', encoding='utf-8') as f:
-                f.write(json_str)
-            print(f"Отчет успешно сохранен в файл {self.filename}")
+            try:
+                self.report_size = self._write(data, merge)
+            except ValueError as e:
+                if not merge:
+                    raise
+                logger.warning("Не удалось прочитать прежний отчет %s (%s) - отчет будет записан заново", self.filename, e)
+                self.report_size = self._write(data, False)
+            logger.info("Отчет успешно сохранен в файл %s (IP в отчете: %s)", self.filename, self.report_size)
 
         except Exception as e:
-            print(f"ОШИБКА при записи отчета в файл: {e}")
+            logger.error("ОШИБКА при записи отчета в файл: %s", e)
             return False
-        
+
         return True
 
+    def _write(self, data, merge: bool) -> int:
+        """Запись отчета через временный файл, возвращает кол-во IP в отчете"""
+        if data is None:
+            records, lookup = self.results.items, self.results.get
+        else:
+            dicts = self.report_dicts(data)
+            records = lambda: self.iter_report(data)
+            lookup = lambda ip: {name: ip_dict[ip] for name, ip_dict in dicts if ip in ip_dict}
+
+        with ReportWriter(self.filename, self.fmt) as writer:
+            updated = set()
+            if merge:
+                for ip, line, record in read_report(self.filename, self.fmt):
+                    new_record = lookup(ip)
+                    if not new_record:
+                        # Данные IP не изменились - строка копируется без разбора
+                        if line is not None:
+                            writer.copy(line)
+                        else:
+                            writer.write(ip, record)
+                        continue
+                    old_record = record if line is None else parse_line(line, self.fmt)
+                    writer.write(ip, {**old_record, **new_record})
+                    updated.add(ip)
+
+            for ip, record in records():
+                if ip not in updated:
+                    writer.write(ip, record)
+
+        return writer.count
 
-    def print_results(self):
+    def print_results(self, data=None):
         """Вывод отчета в консоль в человекочитаемом виде"""
-        print("Результат отчета:")
-        for ip, data in self.results.items():
-            print(f"\n{ip}:")
-            for dict_name, dict_data in data.items():
-                print(f"  {dict_name}: {dict_data}")
\ No newline at end of file
+        records = self.iter_report(data) if data is not None else self.results.items()
+        log_rows(logger, "Результат отчета:",
+                 (f"{ip}:\n" + "\n".join(f"  {dict_name}: {dict_data}" for dict_name, dict_data in record.items())
+                  for ip, record in records),
+                 self.report_size if data is not None else len(self.results))
@@ -0,0 +1,181 @@
+import socket
+import numpy as np
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# IPv4 хранится как IPv4-mapped IPv6 (::ffff:a.b.c.d) - у всех адресов один 128-битный формат
+_IPV4_MAPPED = 0xFFFF << 32
+_LOW_MASK = (1 << 64) - 1
+
+def encode_ip(ip: Any) -> Optional[int]:
+    """
+    128-битное целое для строки IPv4/IPv6; None - если значение не является адресом в каноническом виде
+    (декодирование decode_ip() должно возвращать исходную строку)
+    """
+    if not isinstance(ip, str):
+        return None
+    try:
+        if ":" not in ip:
+            packed = socket.inet_pton(socket.AF_INET, ip)
+            if socket.inet_ntop(socket.AF_INET, packed) != ip:
+                return None
+            return _IPV4_MAPPED | int.from_bytes(packed, "big")
+        packed = socket.inet_pton(socket.AF_INET6, ip)
+    except (OSError, ValueError):
+        return None
+    # ::ffff:a.b.c.d записывается так же, как IPv4 - такие адреса хранятся исходной строкой
+    if packed[:12] == b"\0" * 10 + b"\xff\xff" or socket.inet_ntop(socket.AF_INET6, packed) != ip:
+        return None
+    return int.from_bytes(packed, "big")
+
+def decode_ip(code: int) -> str:
+    """Строка адреса по 128-битному целому"""
+    if code >> 32 == 0xFFFF:
+        return socket.inet_ntop(socket.AF_INET, (code & 0xFFFFFFFF).to_bytes(4, "big"))
+    return socket.inet_ntop(socket.AF_INET6, code.to_bytes(16, "big"))
+
+class IPRecord(Mapping):
+    """
+    Строка IPTable: доступ к значениям колонок по имени, как к словарю {колонка: значение}.
+    Значения возвращаются объектами Python (int, float, bool); запись record[колонка] = значение
+    изменяет колонку таблицы на месте
+    """
+    __slots__ = ("table", "row")
+
+    def __init__(self, table: "IPTable", row: int):
+        self.table = table
+        self.row = row
+
+    def __getitem__(self, name: str) -> Any:
+        return self.table.columns[name][self.row].item()
+
+    def __setitem__(self, name: str, value: Any):
+        self.table.columns[name][self.row] = value
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.table.columns)
+
+    def __len__(self) -> int:
+        return len(self.table.columns)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+class IPTable(Mapping):
+    """
+    Колоночная таблица IP для передачи данных между этапами: адреса хранятся 128-битными целыми в двух колонках
+    uint64 (IPv4 - как ::ffff:a.b.c.d), значения - в колонках numpy по строкам таблицы (счетчики, флаги, частоты).
+    Поиск строки по адресу - двоичный поиск по отсортированному индексу, без словаря строк.
+    Значения, не являющиеся адресами в каноническом виде, хранятся исходными объектами в небольшом словаре raw.
+
+    Таблица совместима со словарем {ip: {колонка: значение}}: ip in table, table[ip] (IPRecord), items(), len(),
+    сравнение со словарем. Этапы, которым нужны все строки, читают колонки напрямую: column(), ips()
+    """
+
+    def __init__(self, ips: Iterable[Any] = (), columns: Dict[str, Any] = None):
+        hi, lo = [], []
+        self.raw = {}                   # значение -> строка таблицы для значений, не являющихся адресами
+        self.raw_rows = {}              # строка таблицы -> значение
+        for row, ip in enumerate(ips):
+            code = encode_ip(ip)
+            if code is None:
+                if ip in self.raw:
+                    raise ValueError(f"Повторяющийся IP в таблице: {ip}")
+                self.raw[ip] = row
+                self.raw_rows[row] = ip
+                code = 0
+            hi.append(code >> 64)
+            lo.append(code & _LOW_MASK)
+        self.hi = np.array(hi, dtype=np.uint64)
+        self.lo = np.array(lo, dtype=np.uint64)
+
+        # Индекс строк с адресами, отсортированный по (hi, lo)
+        rows = np.arange(len(self.hi), dtype=np.int64)
+        if self.raw_rows:
+            rows = np.setdiff1d(rows, np.fromiter(self.raw_rows, dtype=np.int64, count=len(self.raw_rows)))
+        self.order = rows[np.lexsort((self.lo[rows], self.hi[rows]))]
+        self.sorted_hi = self.hi[self.order]
+        self.sorted_lo = self.lo[self.order]
+        duplicated = (self.sorted_hi[1:] == self.sorted_hi[:-1]) & (self.sorted_lo[1:] == self.sorted_lo[:-1])
+        if duplicated.any():
+            raise ValueError(f"Повторяющийся IP в таблице: {self.ip(int(self.order[np.argmax(duplicated)]))}")
+
+        self.columns = {}
+        for name, values in (columns or {}).items():
+            self.set_column(name, values)
+
+    @classmethod
+    def from_dict(cls, data: Dict[Any, Dict[str, Any]]) -> "IPTable":
+        """Таблица из словаря {ip: {колонка: значение}} (колонки - по ключам первой записи)"""
+        names = list(next(iter(data.values()), {}))
+        return cls(data, {name: [record[name] for record in data.values()] for name in names})
+
+    def set_column(self, name: str, values: Any):
+        """Добавление или замена колонки (значения по строкам таблицы)"""
+        values = np.asarray(values)
+        if values.shape != (len(self),):
+            raise ValueError(f"Размер колонки {name} ({len(values)}) не совпадает с кол-вом строк таблицы ({len(self)})")
+        self.columns[name] = values
+
+    def column(self, name: str) -> np.ndarray:
+        """Колонка значений по строкам таблицы (изменения вносятся в таблицу на месте)"""
+        return self.columns[name]
+
+    def ip(self, row: int) -> Any:
+        """Адрес по номеру строки"""
+        if row in self.raw_rows:
+            return self.raw_rows[row]
+        return decode_ip((int(self.hi[row]) << 64) | int(self.lo[row]))
+
+    def ips(self, rows: Iterable[int] = None) -> List[Any]:
+        """Адреса строк rows (по умолчанию - всех строк) в порядке строк"""
+        rows = range(len(self)) if rows is None else rows
+        return [self.ip(row) for row in rows]
+
+    def row(self, ip: Any) -> int:
+        """Номер строки по адресу; -1, если адреса нет в таблице"""
+        row = self.raw.get(ip)
+        if row is not None:
+            return row
+        code = encode_ip(ip)
+        if code is None:
+            return -1
+        hi, lo = np.uint64(code >> 64), np.uint64(code & _LOW_MASK)
+        start = np.searchsorted(self.sorted_hi, hi, side="left")
+        end = np.searchsorted(self.sorted_hi, hi, side="right")
+        index = start + np.searchsorted(self.sorted_lo[start:end], lo, side="left")
+        if index < end and self.sorted_lo[index] == lo:
+            return int(self.order[index])
+        return -1
+
+    def items(self) -> Iterator[Tuple[Any, IPRecord]]:
+        return ((self.ip(row), IPRecord(self, row)) for row in range(len(self)))
+
+    def to_dict(self) -> Dict[Any, Dict[str, Any]]:
+        """Таблица в виде словаря {ip: {колонка: значение}}"""
+        columns = {name: values.tolist() for name, values in self.columns.items()}
+        return {ip: {name: values[row] for name, values in columns.items()} for row, ip in enumerate(self.ips())}
+
+    def nbytes(self) -> int:
+        """Память колонок и индекса таблицы, байт"""
+        return (self.hi.nbytes + self.lo.nbytes + self.order.nbytes + self.sorted_hi.nbytes + self.sorted_lo.nbytes
+                + sum(values.nbytes for values in self.columns.values()))
+
+    def __getitem__(self, ip: Any) -> IPRecord:
+        row = self.row(ip)
+        if row < 0:
+            raise KeyError(ip)
+        return IPRecord(self, row)
+
+    def __contains__(self, ip: Any) -> bool:
+        return self.row(ip) >= 0
+
+    def __iter__(self) -> Iterator[Any]:
+        return (self.ip(row) for row in range(len(self)))
+
+    def __len__(self) -> int:
+        return len(self.hi)
+
+    def __repr__(self) -> str:
+        head = ", ".join(f"{self.ip(row)!r}: {IPRecord(self, row)!r}" for row in range(min(len(self), 10)))
+        return f"IPTable({{{head}{', ...' if len(self) > 10 else ''}}}, строк: {len(self)})"
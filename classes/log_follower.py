@@ -0,0 +1,127 @@
+import os
+import hashlib
+from typing import Iterator, Optional
+from classes.suricata_event_reader import parse_line
+from classes.event_parser import EventParser
+
+class LogFollower:
+    """
+    Класс инкрементального чтения (tail/follow) построчного лога Suricata (eve.json).
+    Запоминает inode и смещение в байтах и при каждом вызове read_new() возвращает только события, дописанные с прошлого чтения.
+    Корректно обрабатывает ротацию логов logrotate:
+     - переименование (rename) - дочитывается остаток старого файла, затем новый файл читается с начала
+     - усечение (copytruncate) - файл читается с начала
+    При передаче parser (EventParser) из событий извлекаются только его поля
+    """
+
+    # Размер начального фрагмента файла, по которому определяется, что это тот же самый файл
+    HEAD_SIZE = 256
+
+    def __init__(self, filename: str, chunk_size: int = 1 << 20, parser: EventParser = None):
+        self.filename = filename
+        self.chunk_size = chunk_size
+        self.parse = parser.parse if parser is not None else parse_line
+        self.inode = None
+        self.dev = None
+        self.offset = 0
+        self.head = None
+        self.head_len = 0
+
+    def state(self) -> dict:
+        """Состояние для сохранения в контрольной точке"""
+        return {"inode": self.inode, "dev": self.dev, "offset": self.offset,
+                "head": self.head, "head_len": self.head_len}
+
+    def restore(self, state: dict):
+        """Восстановление состояния из контрольной точки"""
+        self.inode = state.get("inode")
+        self.dev = state.get("dev")
+        self.offset = state.get("offset", 0)
+        self.head = state.get("head")
+        self.head_len = state.get("head_len", 0)
+
+    def read_new(self) -> Iterator[dict]:
+        """Возвращает события, дописанные в лог с момента последнего чтения"""
+        try:
+            st = os.stat(self.filename)
+        except FileNotFoundError:
+            st = None
+
+        if self.inode is not None and (st is None or (st.st_ino, st.st_dev) != (self.inode, self.dev)):
+            # Файл был переименован при ротации - дочитываем остаток старого файла, если он еще доступен
+            rotated = self._find_rotated()
+            if rotated is not None:
+                yield from self._read_file(rotated, final=True)
+            self._reset()
+
+        if st is None:
+            return
+
+        if self.inode is not None and (st.st_size < self.offset or self._hash_head(self.filename, self.head_len) != self.head):
+            # Файл был усечен (copytruncate) или на месте старого inode создан другой файл
+            self._reset()
+
+        self.inode, self.dev = st.st_ino, st.st_dev
+        yield from self._read_file(self.filename, final=False)
+
+    def _reset(self):
+        """Сброс позиции - следующий файл читается с начала"""
+        self.inode = None
+        self.dev = None
+        self.offset = 0
+        self.head = None
+        self.head_len = 0
+
+    def _find_rotated(self) -> Optional[str]:
+        """Поиск переименованного при ротации файла по сохраненному inode"""
+        dirname = os.path.dirname(os.path.abspath(self.filename))
+        basename = os.path.basename(self.filename)
+
+        for name in os.listdir(dirname):
+            if name == basename or not name.startswith(basename):
+                continue
+            path = os.path.join(dirname, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if (st.st_ino, st.st_dev) == (self.inode, self.dev):
+                return path
+        return None
+
+    def _hash_head(self, path: str, size: int) -> str:
+        """Хэш начального фрагмента файла размером size байт"""
+        with open(path, 'rb') as f:
+            return hashlib.sha1(f.read(size)).hexdigest()
+
+    def _read_file(self, path: str, final: bool) -> Iterator[dict]:
+        """
+        Чтение полных строк файла начиная с сохраненного смещения.
+        Неполная последняя строка оставляется до следующего чтения, если файл еще дописывается (final=False)
+        """
+        with open(path, 'rb') as f:
+            f.seek(self.offset)
+            tail = b''
+
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                lines = (tail + chunk).split(b'\n')
+                tail = lines.pop()
+                for line in lines:
+                    self.offset += len(line) + 1
+                    event = self.parse(line)
+                    if event is not None:
+                        yield event
+
+            if final and tail:
+                self.offset += len(tail)
+                event = self.parse(tail)
+                if event is not None:
+                    yield event
+
+        # Запоминаем начальный фрагмент файла, пока он не набрал полный размер
+        if not final and self.head_len < min(self.offset, self.HEAD_SIZE):
+            self.head_len = min(self.offset, self.HEAD_SIZE)
+            self.head = self._hash_head(path, self.head_len)
@@ -0,0 +1,96 @@
+import sys
+import json
+import logging
+from datetime import datetime
+from typing import Any
+from collections.abc import Mapping
+
+# Журналы pipeline: модули classes и скрипт запуска
+PIPELINE_LOGGERS = ("classes", "pipeline")
+
+# Ключи, которые есть у любой записи журнала - остальные атрибуты записи считаются структурированными полями (extra)
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+def configure_logging(level: str = "INFO", json_format: bool = False, stream: Any = None):
+    """
+    Настройка журнала pipeline: уровень (DEBUG - подробный вывод по каждому IP и данные этапов, INFO - ход выполнения,
+    WARNING - только предупреждения и ошибки) и формат - текст (как прежний консольный вывод) или JSON по строке на запись.
+    Уровень задается для журналов pipeline, сторонние библиотеки выводят только предупреждения и ошибки
+    """
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JsonFormatter() if json_format else logging.Formatter("%(message)s"))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(logging.WARNING)
+    for name in PIPELINE_LOGGERS:
+        logging.getLogger(name).setLevel(level.upper() if isinstance(level, str) else level)
+
+class JsonFormatter(logging.Formatter):
+    """Запись журнала в виде JSON-объекта в одну строку, поля из extra добавляются в объект"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class Summary:
+    """
+    Сокращенное представление большой коллекции для журнала: первые limit элементов и кол-во остальных.
+    Строка формируется только при выводе записи, поэтому на отключенных уровнях журнала затрат на форматирование нет
+    """
+    __slots__ = ('value', 'limit')
+
+    def __init__(self, value: Any, limit: int = 10):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        return _summarize(self.value, self.limit, top=True)
+
+    __repr__ = __str__
+
+def summarize(value: Any, limit: int = 10) -> Summary:
+    """Отложенное сокращенное представление коллекции для аргумента записи журнала"""
+    return Summary(value, limit)
+
+def log_rows(logger: logging.Logger, title: str, rows, total: int, limit: int = 50, level: int = logging.DEBUG):
+    """
+    Вывод в журнал заголовка и первых limit строк из итератора rows (всего строк - total) одной записью.
+    Итератор не перебирается, если уровень журнала отключен
+    """
+    if not logger.isEnabledFor(level):
+        return
+    lines = [title, *_head(rows, limit)]
+    if total > limit:
+        lines.append(f"... и еще {total - limit}")
+    logger.log(level, "\n".join(lines))
+
+def _summarize(value: Any, limit: int, top: bool = False) -> str:
+    if isinstance(value, Mapping):
+        # Словарь данных pipeline (и таблицы IPTable) выводятся по ключам, каждое значение сокращается отдельно
+        items = list(value.items()) if top else list(_head(value.items(), limit))
+        text = ", ".join(f"{key!r}: {_summarize(item, limit) if top else repr(item)}" for key, item in items)
+        rest = len(value) - len(items)
+        return "{" + text + (f", ... (+{rest})" if rest > 0 else "") + "}"
+
+    if isinstance(value, (list, tuple, set)) and len(value) > limit:
+        text = ", ".join(repr(item) for item in _head(value, limit))
+        return f"[{text}, ... (+{len(value) - limit})]"
+
+    return repr(value)
+
+def _head(iterable, limit: int):
+    for index, item in enumerate(iterable):
+        if index >= limit:
+            return
+        yield item
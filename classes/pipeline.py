@@ -1,10 +1,21 @@
-from typing import Any, List
+import logging
+from typing import Any, List, Optional, Tuple
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from classes.stage_metrics import PipelineMetrics
+
+logger = logging.getLogger(__name__)
 
 class Stage(ABC):
     """
-    Абстрактный класс этапа (Stage) для pipeline
+    Абстрактный класс этапа (Stage) для pipeline.
+    Этап может объявить ключи данных, которые он читает (reads) и записывает (writes) - по ним DAGPipeline
+    определяет зависимости между этапами. Если ключи не объявлены (None), этап выполняется после всех
+    предыдущих и перед всеми последующими
     """
+    reads: Optional[Tuple[str, ...]] = None
+    writes: Optional[Tuple[str, ...]] = None
+
     @abstractmethod
     def process(self, data: Any) -> Any:
         """Принимает данные, возвращает результат обработки"""
@@ -12,14 +23,130 @@ class Stage(ABC):
 
 class Pipeline:
     """
-    Класс реализует паттерн Pipline для последовательной обработки и обогащения данных несколькими этапами (Stage)
+    Класс реализует паттерн Pipline для последовательной обработки и обогащения данных несколькими этапами (Stage).
+    При передаче metrics (PipelineMetrics) для каждого этапа замеряются время, память, кол-во записей
+    и обращения к внешним сервисам
     """
-    def __init__(self, stages: List[Stage]):
+    def __init__(self, stages: List[Stage], metrics: PipelineMetrics = None):
         self.stages = stages
+        self.metrics = metrics
+        self.stage_names = self._stage_names()
+
+    def _stage_names(self) -> List[str]:
+        """Имена этапов для метрик; повторяющиеся классы нумеруются (FirewallBanStage, FirewallBanStage#2)"""
+        names, seen = [], {}
+        for stage in self.stages:
+            name = type(stage).__name__
+            seen[name] = seen.get(name, 0) + 1
+            names.append(name if seen[name] == 1 else f"{name}#{seen[name]}")
+        return names
 
     def execute(self, initial_data: Any = None) -> Any:
         """Запускает pipeline"""
+        run = self.metrics.start_run() if self.metrics is not None else None
         data = initial_data
+        try:
+            for index in range(len(self.stages)):
+                data = self._run_stage(index, data, run)
+        finally:
+            # Метрики сохраняются и для запуска, прерванного ошибкой этапа
+            if run is not None:
+                self.metrics.finish_run(run)
+        return data
+
+    def close(self):
+        """Закрытие ресурсов этапов (соединения, кэши, фоновые задачи)"""
+        for stage in self.stages:
+            close = getattr(stage, 'close', None)
+            if callable(close):
+                try:
+                    close()
+                except Exception as e:
+                    logger.error("ОШИБКА при закрытии этапа %s: %s", type(stage).__name__, e)
+
+    def _run_stage(self, index: int, data: Any, run: Optional[dict]) -> Any:
+        """Выполнение этапа (с замером метрик, если они включены)"""
+        stage = self.stages[index]
+        if run is None:
+            return stage.process(data)
+        return self.metrics.measure(self.stage_names[index], stage, data, run)
+
+class DAGPipeline(Pipeline):
+    """
+    Pipeline с параллельным выполнением независимых этапов.
+    Этап запускается, как только завершены все предыдущие этапы, записывающие читаемые им ключи,
+    записывающие те же ключи или читающие записываемые им ключи. Каждый этап получает свою копию словаря данных
+    (значения общие, без копирования), а из результата в общие данные переносятся только объявленные ключи writes -
+    поэтому итоговый словарь совпадает с последовательным запуском. Значение можно изменять на месте, только если
+    его ключ объявлен в writes: тогда этап не выполняется одновременно с этапами, читающими или записывающими этот ключ
+    """
+    def __init__(self, stages: List[Stage], max_workers: int = None, metrics: PipelineMetrics = None):
+        super().__init__(stages, metrics)
+        self.max_workers = max_workers or len(stages) or 1
+        self.dependencies = [self._dependencies(i) for i in range(len(stages))]
+
+    def _dependencies(self, index: int) -> set:
+        """Индексы предыдущих этапов, от которых зависит этап index"""
+        stage = self.stages[index]
+        result = set()
+
+        for prev_index in range(index):
+            prev = self.stages[prev_index]
+
+            if stage.reads is None or stage.writes is None or prev.reads is None or prev.writes is None:
+                # Этап без объявленных ключей - барьер
+                result.add(prev_index)
+            elif set(prev.writes) & (set(stage.reads) | set(stage.writes)):
+                # Чтение после записи и повторная запись
+                result.add(prev_index)
+            elif set(stage.writes) & set(prev.reads):
+                # Запись после чтения: предыдущий этап должен прочитать значение до его изменения
+                result.add(prev_index)
+
+        return result
+
+    def execute(self, initial_data: Any = None) -> Any:
+        """Запускает pipeline, выполняя независимые этапы параллельно"""
+        run = self.metrics.start_run() if self.metrics is not None else None
+        data = dict(initial_data or {})
+        done = set()
+        running = {}
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                while len(done) < len(self.stages):
+                    # Запускаем все этапы, зависимости которых выполнены
+                    for index, stage in enumerate(self.stages):
+                        if index in done or index in running.values() or not self.dependencies[index] <= done:
+                            continue
+                        running[executor.submit(self._run_stage, index, dict(data), run)] = index
+
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        index = running.pop(future)
+                        stage = self.stages[index]
+                        result = future.result()
+
+                        if stage.writes is None:
+                            data = dict(result or {})
+                        else:
+                            data.update({key: result[key] for key in stage.writes if key in result})
+                        done.add(index)
+        finally:
+            if run is not None:
+                self.metrics.finish_run(run, order=self.stage_names)
+
+        return self._ordered(data, initial_data)
+
+    def _ordered(self, data: dict, initial_data: Any) -> dict:
+        """Упорядочивание ключей как при последовательном запуске этапов"""
+        ordered = {}
+        for key in (initial_data or {}):
+            if key in data:
+                ordered[key] = data[key]
         for stage in self.stages:
-            data = stage.process(data)
-        return data
\ No newline at end of file
+            for key in stage.writes or ():
+                if key in data:
+                    ordered[key] = data[key]
+        ordered.update(data)
+        return ordered
@@ -0,0 +1,89 @@
+import time
+import signal
+import threading
+import logging
+from typing import Any
+from classes.pipeline import Pipeline
+
+logger = logging.getLogger(__name__)
+
+class PipelineDaemon:
+    """
+    Резидентный режим работы pipeline: этапы создаются один раз и остаются "прогретыми",
+    а Pipeline.execute запускается на микро-пакетах новых событий.
+    Пакет запускается по истечении interval секунд или при накоплении event_threshold новых событий в источнике
+    (этап с методом poll(), например SuricataLogAnalyzerStage в режиме follow). Источник опрашивается один раз за такт:
+    при запуске пакета этап-источник использует уже прочитанные события и передает дальше только IP, счетчики
+    которых изменились в пакете
+    По SIGTERM/SIGINT текущий пакет (в т.ч. отправка блокировок) завершается, после чего этапы закрываются
+    """
+
+    def __init__(self, pipeline: Pipeline, interval: float = 60, event_threshold: int = None,
+                 poll_interval: float = 1, source: Any = None):
+        self.pipeline = pipeline
+        self.interval = interval
+        self.event_threshold = event_threshold
+        self.poll_interval = poll_interval
+        self.source = source if source is not None else self._find_source()
+        self.stop_event = threading.Event()
+        self.batches = 0
+
+    def _find_source(self):
+        """Источник событий по умолчанию - первый этап pipeline, поддерживающий инкрементальный опрос"""
+        for stage in self.pipeline.stages:
+            if callable(getattr(stage, 'poll', None)) and getattr(stage, 'mode', None) == 'follow':
+                return stage
+        return None
+
+    def stop(self, *args):
+        """Запрос на остановку после завершения текущего пакета"""
+        if not self.stop_event.is_set():
+            logger.warning("Получен сигнал остановки - завершаем текущий пакет")
+        self.stop_event.set()
+
+    def run(self):
+        """Основной цикл резидентного режима"""
+        previous_handlers = {sig: signal.signal(sig, self.stop) for sig in (signal.SIGTERM, signal.SIGINT)}
+        logger.info("Резидентный режим: интервал %s с, порог событий %s", self.interval, self.event_threshold)
+
+        pending = 0
+        last_run = None
+
+        try:
+            while not self.stop_event.is_set():
+                if self.source is not None:
+                    pending += self.source.poll()
+
+                now = time.monotonic()
+                interval_elapsed = last_run is None or now - last_run >= self.interval
+                threshold_reached = self.event_threshold is not None and pending >= self.event_threshold
+
+                # При наличии источника событий пустые пакеты не запускаем
+                if (interval_elapsed or threshold_reached) and (self.source is None or pending or last_run is None):
+                    self.run_batch()
+                    pending = 0
+                    last_run = time.monotonic()
+
+                self.stop_event.wait(self.poll_interval)
+
+        finally:
+            self.close()
+            for sig, handler in previous_handlers.items():
+                signal.signal(sig, handler)
+
+        logger.info("Резидентный режим остановлен, обработано пакетов: %s", self.batches)
+
+    def run_batch(self):
+        """Запуск pipeline на очередном микро-пакете"""
+        started = time.monotonic()
+        try:
+            self.pipeline.execute()
+        except Exception as e:
+            # Ошибка одного пакета не останавливает сервис
+            logger.error("ОШИБКА при выполнении пакета: %s", e)
+        self.batches += 1
+        logger.info("Пакет %s обработан за %.2f с", self.batches, time.monotonic() - started)
+
+    def close(self):
+        """Закрытие ресурсов этапов (соединения, кэши, фоновые задачи)"""
+        self.pipeline.close()
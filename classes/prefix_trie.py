@@ -0,0 +1,134 @@
+import ipaddress
+import logging
+from typing import Any, Iterable, Union
+
+logger = logging.getLogger(__name__)
+
+class _Node:
+    """Узел radix-дерева: префикс длины length (старшие биты адреса) и значение, если префикс добавлен в дерево"""
+    __slots__ = ('prefix', 'length', 'children', 'value', 'has_value')
+
+    def __init__(self, prefix: int, length: int):
+        self.prefix = prefix
+        self.length = length
+        self.children = [None, None]
+        self.value = None
+        self.has_value = False
+
+class PrefixTrie:
+    """
+    Radix-дерево (со сжатием путей) подсетей IPv4/IPv6 для поиска по самому длинному совпадающему префиксу.
+    Поиск адреса выполняется за O(длины префикса) независимо от кол-ва подсетей в дереве, поэтому подходит
+    для больших списков разрешенных адресов (allow-list из 100k+ CIDR). Для каждой версии IP - свое дерево
+    """
+
+    def __init__(self, networks: Iterable[str] = ()):
+        self.roots = {4: _Node(0, 0), 6: _Node(0, 0)}
+        self.count = 0
+        for network in networks:
+            self.add(network)
+
+    @classmethod
+    def from_file(cls, filename: str) -> "PrefixTrie":
+        """Загрузка подсетей из файла: одна подсеть (CIDR) или адрес в строке, комментарии после #"""
+        trie = cls()
+        with open(filename, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.split('#', 1)[0].strip()
+                if not line:
+                    continue
+                try:
+                    trie.add(line)
+                except ValueError as e:
+                    logger.error("ОШИБКА в строке %s файла %s: %s", line_number, filename, e)
+        return trie
+
+    def add(self, network: Union[str, ipaddress.IPv4Network, ipaddress.IPv6Network], value: Any = None):
+        """Добавление подсети. По умолчанию значением является сама подсеть в формате CIDR"""
+        network = ipaddress.ip_network(network, strict=False)
+        length = network.prefixlen
+        key = int(network.network_address) >> (network.max_prefixlen - length)
+        value = str(network) if value is None else value
+
+        node = self.roots[network.version]
+        while True:
+            if node.length == length:
+                if not node.has_value:
+                    self.count += 1
+                node.value, node.has_value = value, True
+                return
+
+            bit = (key >> (length - node.length - 1)) & 1
+            child = node.children[bit]
+            if child is None:
+                node.children[bit] = self._leaf(key, length, value)
+                return
+
+            # Длина общего префикса ключа и дочернего узла
+            m = min(child.length, length)
+            common = m - ((child.prefix >> (child.length - m)) ^ (key >> (length - m))).bit_length()
+            if common == child.length:
+                node = child
+                continue
+
+            # Расщепляем ребро: промежуточный узел с общим префиксом
+            middle = _Node(key >> (length - common), common)
+            node.children[bit] = middle
+            middle.children[(child.prefix >> (child.length - common - 1)) & 1] = child
+            if common == length:
+                middle.value, middle.has_value = value, True
+                self.count += 1
+            else:
+                middle.children[(key >> (length - common - 1)) & 1] = self._leaf(key, length, value)
+            return
+
+    def _leaf(self, key: int, length: int, value: Any) -> _Node:
+        node = _Node(key, length)
+        node.value, node.has_value = value, True
+        self.count += 1
+        return node
+
+    def lookup(self, address: Union[str, ipaddress.IPv4Address, ipaddress.IPv6Address], default: Any = None) -> Any:
+        """Значение самой длинной подсети, содержащей адрес, или default"""
+        address = ipaddress.ip_address(address)
+        bits = address.max_prefixlen
+        key = int(address)
+
+        node = self.roots[address.version]
+        result = node.value if node.has_value else default
+        while node.length < bits:
+            child = node.children[(key >> (bits - node.length - 1)) & 1]
+            if child is None or key >> (bits - child.length) != child.prefix:
+                break
+            node = child
+            if node.has_value:
+                result = node.value
+        return result
+
+    def overlaps(self, network: Union[str, ipaddress.IPv4Network, ipaddress.IPv6Network]) -> bool:
+        """Есть ли в дереве подсеть, которая содержит network или содержится в ней"""
+        network = ipaddress.ip_network(network, strict=False)
+        length = network.prefixlen
+        key = int(network.network_address) >> (network.max_prefixlen - length)
+
+        node = self.roots[network.version]
+        while True:
+            if node.has_value:
+                return True
+            if node.length >= length:
+                # Узел внутри network - в его поддереве обязательно есть подсеть (пустых листьев нет)
+                return node.length > 0 or any(node.children)
+
+            child = node.children[(key >> (length - node.length - 1)) & 1]
+            if child is None:
+                return False
+            m = min(child.length, length)
+            if child.prefix >> (child.length - m) != key >> (length - m):
+                return False
+            node = child
+
+    def __contains__(self, address) -> bool:
+        return self.lookup(address, default=None) is not None
+
+    def __len__(self) -> int:
+        return self.count
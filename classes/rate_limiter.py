@@ -0,0 +1,51 @@
+import time
+import threading
+
+class TokenBucket:
+    """
+    Потокобезопасный ограничитель частоты запросов (token bucket) по квотам API.
+    Ограничивает частоту запросов в минуту (с допустимым всплеском burst) и общее кол-во запросов в сутки
+    """
+
+    def __init__(self, requests_per_minute: float, requests_per_day: int = None, burst: int = None):
+        if requests_per_minute <= 0:
+            raise ValueError("requests_per_minute должно быть > 0")
+
+        self.rate = requests_per_minute / 60.0                  # пополнение токенов в секунду
+        self.capacity = burst or max(1, int(requests_per_minute))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+        self.requests_per_day = requests_per_day
+        self.day_started = time.monotonic()
+        self.day_count = 0
+
+        self.lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        """
+        Ожидает свободный токен и забирает его.
+        Возвращает False без ожидания, если суточная квота исчерпана
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+
+                # Суточная квота считается в скользящих сутках с первого запроса
+                if now - self.day_started >= 86400:
+                    self.day_started = now
+                    self.day_count = 0
+                if self.requests_per_day is not None and self.day_count >= self.requests_per_day:
+                    return False
+
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.day_count += 1
+                    return True
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
@@ -0,0 +1,147 @@
+import os
+import json
+import tempfile
+from collections.abc import Mapping
+from typing import Any, Iterator, Optional, Tuple
+
+class ReportWriter:
+    """
+    Потоковая запись отчета по IP с атомарной заменой файла. Записи пишутся во временный файл в каталоге отчета
+    по мере формирования и не накапливаются в памяти; после commit() временный файл переименовывается в filename,
+    поэтому читатели видят либо прежний, либо полностью записанный отчет. Форматы (fmt):
+     - "json" - JSON-объект {ip: запись}, по строке на IP
+     - "jsonl" - по JSON-объекту {"ip": ip, ...поля записи} в строке
+    Используется как контекстный менеджер: при выходе без ошибок отчет фиксируется, при ошибке - временный файл удаляется
+    """
+    FORMATS = ("json", "jsonl")
+
+    def __init__(self, filename: str, fmt: str = "json"):
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Неизвестный формат отчета: {fmt}")
+
+        self.filename = filename
+        self.fmt = fmt
+        self.count = 0
+
+        dirname = os.path.dirname(os.path.abspath(filename))
+        fd, self.tmp_name = tempfile.mkstemp(dir=dirname, prefix=".report-")
+        self.file = os.fdopen(fd, 'w', encoding='utf-8')
+        if fmt == "json":
+            self.file.write("{")
+
+    def __enter__(self) -> "ReportWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+    def write(self, ip: str, record: dict):
+        """Запись отчета по одному IP"""
+        if self.fmt == "json":
+            line = f"{_dumps(ip)}:{_dumps(record)}"
+        else:
+            line = _dumps({"ip": ip, **record})
+        self.copy(line)
+
+    def copy(self, line: str):
+        """Запись строки отчета без изменений (строка прежнего отчета того же формата)"""
+        if self.fmt == "json":
+            self.file.write("\n" if self.count == 0 else ",\n")
+        self.file.write(line)
+        if self.fmt == "jsonl":
+            self.file.write("\n")
+        self.count += 1
+
+    def commit(self):
+        """Завершение записи и замена файла отчета"""
+        if self.fmt == "json":
+            self.file.write("\n}\n" if self.count else "}\n")
+        self.file.close()
+
+        # mkstemp создает файл с правами 0600 - сохраняем права прежнего отчета или права по умолчанию
+        try:
+            mode = os.stat(self.filename).st_mode & 0o777
+        except FileNotFoundError:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        os.chmod(self.tmp_name, mode)
+        os.replace(self.tmp_name, self.filename)
+
+    def abort(self):
+        """Отмена записи - прежний отчет остается без изменений"""
+        self.file.close()
+        if os.path.exists(self.tmp_name):
+            os.remove(self.tmp_name)
+
+def read_report(filename: str, fmt: str = "json") -> Iterator[Tuple[str, Optional[str], Optional[dict]]]:
+    """
+    Построчное чтение отчета для объединения с новыми данными: (ip, строка, запись).
+    Запись по строке разбирается только при необходимости функцией parse_line(). Отчет прежнего формата
+    (json.dumps с отступами) читается целиком - тогда строка None, а запись разобрана
+    """
+    decoder = json.JSONDecoder()
+    with open(filename, 'r', encoding='utf-8') as f:
+        if fmt == "jsonl":
+            for line in f:
+                line = line.rstrip("\n")
+                if line.strip():
+                    if not (line.startswith("{") and line.endswith("}")):
+                        raise ValueError(f"Поврежденная строка отчета: {line[:80]}")
+                    yield _jsonl_ip(decoder, line), line, None
+            return
+
+        first = f.readline()
+        second = f.readline()
+        if first.strip() != "{" or not (second.startswith('"') or second.strip() == "}"):
+            f.seek(0)
+            for ip, record in json.load(f).items():
+                yield ip, None, record
+            return
+
+        line = second
+        while line.strip() != "}":
+            line = line.rstrip("\n").rstrip(",")
+            # Строки копируются без разбора - проверяем только их структуру "ip":{...}
+            ip, end = decoder.raw_decode(line) if line else (None, 0)
+            if not isinstance(ip, str) or line[end:end + 2] != ":{" or not line.endswith("}"):
+                raise ValueError(f"Поврежденная строка отчета: {line[:80]}")
+            yield ip, line, None
+            line = f.readline()
+
+def parse_line(line: str, fmt: str = "json") -> dict:
+    """Запись отчета по строке, прочитанной read_report()"""
+    if fmt == "jsonl":
+        record = json.loads(line)
+        record.pop("ip", None)
+        return record
+    return json.loads("{" + line + "}").popitem()[1]
+
+def _jsonl_ip(decoder: json.JSONDecoder, line: str) -> str:
+    # Поле ip записывается первым - разбираем только его
+    prefix = '{"ip":'
+    if line.startswith(prefix):
+        try:
+            ip, _ = decoder.raw_decode(line, len(prefix))
+            return ip
+        except ValueError:
+            pass
+    return json.loads(line)["ip"]
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=_default)
+
+def _default(value: Any) -> Any:
+    # Записи таблицы IPTable (IPRecord) - как словари, скаляры numpy (numpy.bool_, numpy.int64 из этапа анализа) -
+    # как значения Python. numpy импортируется только для значений, которые json не сериализует сам
+    if isinstance(value, Mapping):
+        return dict(value)
+
+    import numpy as np
+
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,26 @@
+import os
+import threading
+
+_loaded = False
+_lock = threading.Lock()
+
+def load_settings(dotenv_path: str = None):
+    """
+    Загрузка параметров окружения из .env - один раз за процесс, повторные вызовы ничего не делают.
+    Переменные, уже заданные в окружении процесса, не переопределяются
+    """
+    global _loaded
+    with _lock:
+        if _loaded:
+            return
+        try:
+            from dotenv import load_dotenv
+        except ImportError:
+            raise ImportError("Для загрузки настроек из .env требуется python-dotenv: pip install python-dotenv")
+        load_dotenv(dotenv_path)
+        _loaded = True
+
+def get_setting(name: str, default: str = None) -> str:
+    """Значение параметра окружения (с загрузкой .env при первом обращении)"""
+    load_settings()
+    return os.getenv(name, default)
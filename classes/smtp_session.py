@@ -0,0 +1,103 @@
+import time
+import logging
+import smtplib
+import threading
+from email.message import Message
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, после которых соединение считается разорванным и письмо отправляется повторно через новое соединение
+_DISCONNECT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+class SMTPSession:
+    """
+    Постоянное SMTP-соединение: подключение, STARTTLS и авторизация выполняются один раз и переиспользуются
+    для всех писем. Соединение, простаивавшее дольше keepalive секунд, перед отправкой проверяется командой NOOP.
+    При разрыве соединения (в т.ч. по тайм-ауту простоя на стороне сервера, код 421) письмо отправляется
+    повторно через новое соединение. Потокобезопасен
+    """
+
+    def __init__(self, server: str, port: int = 587, user: str = None, password: str = None,
+                 starttls: bool = True, timeout: float = 30, keepalive: float = 60):
+        self.server = server
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.keepalive = keepalive
+
+        self.connection = None
+        self.last_used = 0.0
+        self.connects = 0
+        self.lock = threading.Lock()
+
+    def send(self, msg: Message):
+        """
+        Отправка письма; исключение - если письмо не отправлено и после переподключения.
+        Ошибка установки соединения не повторяется: переподключение - только после разрыва открытого соединения
+        """
+        with self.lock:
+            connection = self._connection()
+            try:
+                connection.send_message(msg)
+            except smtplib.SMTPResponseException as e:
+                if e.smtp_code != 421:
+                    raise
+                self._reconnect(e)
+                self._connection().send_message(msg)
+            except _DISCONNECT_ERRORS as e:
+                self._reconnect(e)
+                self._connection().send_message(msg)
+            self.last_used = time.monotonic()
+
+    def close(self):
+        """Завершение сессии (QUIT)"""
+        with self.lock:
+            self._drop(quit=True)
+
+    def _connection(self) -> smtplib.SMTP:
+        """Текущее соединение; новое - если соединения нет или оно не отвечает после простоя"""
+        if self.connection is not None and time.monotonic() - self.last_used >= self.keepalive:
+            try:
+                alive = self.connection.noop()[0] == 250
+            except (smtplib.SMTPException, OSError):
+                alive = False
+            if not alive:
+                logger.debug("SMTP-соединение с %s закрыто сервером после простоя", self.server)
+                self._drop()
+
+        if self.connection is None:
+            self.connection = self._connect()
+            self.connects += 1
+            self.last_used = time.monotonic()
+        return self.connection
+
+    def _connect(self) -> smtplib.SMTP:
+        connection = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                connection.starttls()
+            if self.password:
+                connection.login(self.user, self.password)
+        except Exception:
+            connection.close()
+            raise
+        logger.debug("Установлено SMTP-соединение с %s:%s", self.server, self.port)
+        return connection
+
+    def _reconnect(self, error: Exception):
+        logger.warning("SMTP-соединение с %s разорвано (%s) - переподключение", self.server, error)
+        self._drop()
+
+    def _drop(self, quit: bool = False):
+        connection, self.connection = self.connection, None
+        if connection is None:
+            return
+        try:
+            if quit:
+                connection.quit()
+            else:
+                connection.close()
+        except (smtplib.SMTPException, OSError):
+            connection.close()
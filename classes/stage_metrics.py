@@ -0,0 +1,257 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import logging
+import threading
+from contextlib import contextmanager
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Any, Optional
+from classes.logging_utils import log_rows
+
+try:
+    import resource
+except ImportError:     # нет на Windows - пиковая память не измеряется
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+class CallStats:
+    """
+    Потокобезопасные счетчики обращений этапа к внешним сервисам (VirusTotal, API Firewall, SMTP):
+    кол-во обращений, ошибок, суммарная и максимальная длительность по каждому сервису
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.services = {}          # сервис -> [обращений, ошибок, суммарная длительность, максимальная длительность]
+
+    @contextmanager
+    def track(self, service: str):
+        """Учет обращения к сервису; исключение внутри блока считается ошибкой обращения"""
+        started = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.record(service, time.perf_counter() - started, ok)
+
+    def record(self, service: str, seconds: float, ok: bool = True):
+        with self.lock:
+            stats = self.services.get(service)
+            if stats is None:
+                stats = self.services[service] = [0, 0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += 0 if ok else 1
+            stats[2] += seconds
+            stats[3] = max(stats[3], seconds)
+
+    def count(self, service: str = None) -> int:
+        """Кол-во обращений к сервису (или ко всем сервисам)"""
+        with self.lock:
+            if service is not None:
+                return self.services.get(service, [0])[0]
+            return sum(stats[0] for stats in self.services.values())
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {service: list(stats) for service, stats in self.services.items()}
+
+class PipelineMetrics:
+    """
+    Метрики выполнения pipeline по этапам: время (wall и CPU), прирост пиковой памяти процесса (RSS),
+    кол-во записей на входе и выходе этапа (по ключам reads/writes), обращения к внешним сервисам (CallStats этапа).
+    Метрики накапливаются между запусками (резидентный режим) и выгружаются в текстовом формате Prometheus
+    (prometheus_file, например для textfile collector node_exporter) и JSON-сводкой последнего запуска (json_file).
+    Замеры - несколько системных вызовов на этап, поэтому метрики можно не отключать в промышленной эксплуатации
+    """
+
+    def __init__(self, prometheus_file: str = None, json_file: str = None, prefix: str = "suricata_pipeline"):
+        self.prometheus_file = prometheus_file
+        self.json_file = json_file
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.runs = 0
+        self.totals = {}            # этап -> накопленные метрики
+        self.last_run = None
+
+    def start_run(self) -> dict:
+        return {"started": time.time(), "wall": time.perf_counter(), "stages": []}
+
+    def measure(self, name: str, stage: Any, data: Any, run: dict) -> Any:
+        """Выполнение этапа с замером метрик"""
+        calls = getattr(stage, 'calls', None)
+        calls_before = calls.snapshot() if calls is not None else {}
+        records_in = _count_records(data, stage.reads)
+        rss_before = _peak_rss()
+        cpu_before = time.process_time()
+        wall_before = time.perf_counter()
+
+        result, error = None, None
+        try:
+            result = stage.process(data)
+            return result
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            wall = time.perf_counter() - wall_before
+            cpu = time.process_time() - cpu_before
+            rss_after = _peak_rss()
+
+            calls_after = calls.snapshot() if calls is not None else {}
+            services = {}
+            for service, (count, errors, seconds, max_seconds) in calls_after.items():
+                before = calls_before.get(service, [0, 0, 0.0, 0.0])
+                if count > before[0]:
+                    services[service] = {
+                        "count": count - before[0],
+                        "errors": errors - before[1],
+                        "seconds": seconds - before[2],
+                        "max_seconds": max_seconds,
+                    }
+
+            metrics = {
+                "stage": name,
+                "wall_seconds": wall,
+                "cpu_seconds": cpu,
+                "rss_peak_delta_bytes": rss_after - rss_before if rss_before is not None else None,
+                "input_records": records_in,
+                "output_records": _count_records(result, stage.writes) if error is None else None,
+                "error": error,
+                "calls": services,
+            }
+            with self.lock:
+                run["stages"].append(metrics)
+
+    def finish_run(self, run: dict, order: list = None):
+        """Завершение запуска: накопление метрик и выгрузка в файлы"""
+        if order is not None:
+            # В DAGPipeline этапы завершаются не по порядку - сортируем как в pipeline
+            run["stages"].sort(key=lambda metrics: order.index(metrics["stage"]))
+
+        with self.lock:
+            self.runs += 1
+            for metrics in run["stages"]:
+                total = self.totals.setdefault(metrics["stage"], {
+                    "runs": 0, "errors": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "calls": {}})
+                total["runs"] += 1
+                total["errors"] += metrics["error"] is not None
+                total["wall_seconds"] += metrics["wall_seconds"]
+                total["cpu_seconds"] += metrics["cpu_seconds"]
+                total["last"] = metrics
+                for service, stats in metrics["calls"].items():
+                    call_total = total["calls"].setdefault(service, {"count": 0, "errors": 0, "seconds": 0.0})
+                    call_total["count"] += stats["count"]
+                    call_total["errors"] += stats["errors"]
+                    call_total["seconds"] += stats["seconds"]
+
+            self.last_run = {
+                "started": datetime.fromtimestamp(run["started"]).isoformat(timespec='seconds'),
+                "duration_seconds": time.perf_counter() - run["wall"],
+                "stages": run["stages"],
+            }
+
+        if self.prometheus_file:
+            _write_atomic(self.prometheus_file, self.to_prometheus())
+        if self.json_file:
+            _write_atomic(self.json_file, json.dumps(self.to_json(), indent=2, ensure_ascii=False))
+
+    def to_json(self) -> dict:
+        """Сводка последнего запуска"""
+        with self.lock:
+            return {"runs": self.runs, "last_run": self.last_run}
+
+    def to_prometheus(self) -> str:
+        """Метрики в текстовом формате Prometheus"""
+        p = self.prefix
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} {kind}")
+            for suffix, labels, value in samples:
+                if value is None:
+                    continue
+                label_str = ",".join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+                lines.append(f"{p}_{name}{suffix}{{{label_str}}} {value}" if label_str else f"{p}_{name}{suffix} {value}")
+
+        with self.lock:
+            totals = list(self.totals.items())
+            metric("runs_total", "counter", "Кол-во запусков pipeline", [("", {}, self.runs)])
+            metric("stage_duration_seconds", "summary", "Время выполнения этапа",
+                   [s for stage, t in totals for s in (("_sum", {"stage": stage}, t["wall_seconds"]),
+                                                       ("_count", {"stage": stage}, t["runs"]))])
+            metric("stage_cpu_seconds_total", "counter", "Процессорное время этапа (все потоки процесса)",
+                   [("", {"stage": stage}, t["cpu_seconds"]) for stage, t in totals])
+            metric("stage_errors_total", "counter", "Кол-во завершений этапа с ошибкой",
+                   [("", {"stage": stage}, t["errors"]) for stage, t in totals])
+            metric("stage_rss_peak_delta_bytes", "gauge", "Прирост пиковой памяти процесса за последний запуск этапа",
+                   [("", {"stage": stage}, t["last"]["rss_peak_delta_bytes"]) for stage, t in totals])
+            metric("stage_input_records", "gauge", "Кол-во записей на входе этапа в последнем запуске",
+                   [("", {"stage": stage}, t["last"]["input_records"]) for stage, t in totals])
+            metric("stage_output_records", "gauge", "Кол-во записей на выходе этапа в последнем запуске",
+                   [("", {"stage": stage}, t["last"]["output_records"]) for stage, t in totals])
+            metric("external_call_duration_seconds", "summary", "Длительность обращений к внешним сервисам",
+                   [s for stage, t in totals for service, c in t["calls"].items()
+                    for s in (("_sum", {"stage": stage, "service": service}, c["seconds"]),
+                              ("_count", {"stage": stage, "service": service}, c["count"]))])
+            metric("external_call_errors_total", "counter", "Кол-во ошибок обращений к внешним сервисам",
+                   [("", {"stage": stage, "service": service}, c["errors"])
+                    for stage, t in totals for service, c in t["calls"].items()])
+
+        return "\n".join(lines) + "\n"
+
+    def print_summary(self):
+        """Вывод метрик последнего запуска в читаемом виде"""
+        if self.last_run is None:
+            logger.info("Метрики pipeline: запусков не было")
+            return
+
+        title = (f"МЕТРИКИ PIPELINE (запуск {self.last_run['started']}, {self.last_run['duration_seconds']:.3f} с):\n"
+                 f"{'Этап':<32} {'Время, с':>9} {'CPU, с':>9} {'RSS, МБ':>8} {'Вход':>7} {'Выход':>7}  Обращения\n" + "-" * 100)
+        log_rows(logger, title, (self._summary_row(m) for m in self.last_run["stages"]), len(self.last_run["stages"]),
+                 limit=len(self.last_run["stages"]), level=logging.INFO)
+
+    @staticmethod
+    def _summary_row(m: dict) -> str:
+        rss = f"{m['rss_peak_delta_bytes'] / 2**20:.1f}" if m['rss_peak_delta_bytes'] is not None else "-"
+        calls = ", ".join(f"{service}: {c['count']} за {c['seconds']:.2f} с" + (f" ({c['errors']} ошибок)" if c['errors'] else "")
+                          for service, c in m["calls"].items())
+        return (f"{m['stage']:<32} {m['wall_seconds']:>9.3f} {m['cpu_seconds']:>9.3f} {rss:>8} "
+                f"{m['input_records']:>7} {m['output_records'] if m['output_records'] is not None else '-':>7}  {calls}")
+
+def _count_records(data: Any, keys: Optional[tuple]) -> int:
+    """Кол-во записей в коллекциях данных по ключам (все ключи, если ключи не объявлены)"""
+    if not isinstance(data, dict):
+        return 0
+    values = data.values() if keys is None else (data.get(key) for key in keys)
+    return sum(len(value) for value in values if isinstance(value, (Mapping, list, set, tuple)))
+
+def _peak_rss() -> Optional[int]:
+    """Пиковый объем памяти процесса (RSS) в байтах"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss в Linux - в килобайтах, в macOS - в байтах
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def _escape(value: Any) -> str:
+    """Экранирование значения метки Prometheus"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _write_atomic(filename: str, text: str):
+    """Атомарная запись файла - через временный файл и переименование"""
+    dirname = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_name = tempfile.mkstemp(dir=dirname, prefix=".metrics-")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_name, filename)
+    except Exception as e:
+        logger.error("ОШИБКА при записи метрик в файл %s: %s", filename, e)
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
@@ -0,0 +1,45 @@
+import importlib
+
+# Этапы pipeline и их компоненты: имя класса -> модуль, в котором он определен.
+# Модуль (и его зависимости: pandas, requests, matplotlib...) импортируется при первом обращении к классу
+STAGES = {
+    "SuricataLogAnalyzerStage": "classes.suricata_log_analyzer_stage",
+    "VirusTotalStage": "classes.virus_total_stage",
+    "VirusTotalConcurrentStage": "classes.virus_total_stage",
+    "VirusTotalMockStage": "classes.virus_total_stage",
+    "CheckBlockConditionStage": "classes.check_block_condition_stage",
+    "FirewallBanStage": "classes.firewall_ban_stage",
+    "FirewallBanMockStage": "classes.firewall_ban_stage",
+    "EmailNotifierStage": "classes.email_notifier_stage",
+    "EmailNotifierMockStage": "classes.email_notifier_stage",
+    "EmailDigestNotifierStage": "classes.email_notifier_stage",
+    "EmailDigestNotifierMockStage": "classes.email_notifier_stage",
+    "IPReportStage": "classes.ip_report_stage",
+    "VisualizerStage": "classes.visualizer_stage",
+    # Компоненты этапов
+    "SlidingWindowScorer": "classes.window_scorer",
+    "HeavyHitterCounter": "classes.heavy_hitters",
+    "VerdictCache": "classes.verdict_cache",
+    "BanRegistry": "classes.ban_registry",
+}
+
+def register_stage(name: str, module: str):
+    """Регистрация этапа из другого модуля (например, собственного этапа проекта)"""
+    STAGES[name] = module
+
+def get_stage(name: str) -> type:
+    """Класс этапа по имени; модуль этапа импортируется при первом обращении"""
+    module = STAGES.get(name)
+    if module is None:
+        raise KeyError(f"Неизвестный этап: {name}")
+    return getattr(importlib.import_module(module), name)
+
+def create_stage(name: str, *args, **kwargs):
+    """Создание этапа по имени"""
+    return get_stage(name)(*args, **kwargs)
+
+def __getattr__(name: str) -> type:
+    # Доступ к этапам как к атрибутам модуля: stages.IPReportStage('ip_report.json')
+    if name in STAGES:
+        return get_stage(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,124 @@
+import re
+import json
+from datetime import datetime
+from typing import Any, Iterator, List
+from classes.event_parser import EventParser
+
+# Предельный размер одного события JSON-массива (символов) - ограничивает буфер потокового чтения
+MAX_EVENT_SIZE = 1 << 22
+_SEPARATORS = re.compile(r'[ \t\r\n,]*')
+
+def iter_events(filename: str, chunk_size: int = 1 << 20, parser: EventParser = None) -> Iterator[dict]:
+    """
+    Потоковое чтение событий Suricata из файла.
+    Поддерживаются построчный формат NDJSON (eve.json) и JSON-массив (events.json).
+    Файл читается блоками по chunk_size символов, поэтому расход памяти не зависит от размера файла
+    (буфер JSON-массива не превышает chunk_size + MAX_EVENT_SIZE символов).
+    При передаче parser (EventParser) из событий извлекаются только его поля, строки NDJSON разбираются
+    библиотекой парсера; элементы JSON-массива разбираются стандартной библиотекой
+    """
+    with open(filename, 'r', encoding='utf-8') as f:
+        # Определяем формат файла по первому значащему символу
+        head = f.read(chunk_size)
+        first = head.lstrip()[:1]
+
+        if first == '[':
+            events = _iter_array(f, head, chunk_size)
+            yield from events if parser is None else map(parser.project, events)
+        else:
+            yield from _iter_lines(f, head, chunk_size, parser.parse if parser is not None else parse_line)
+
+def load_events(filename: str, parser: EventParser) -> List[dict]:
+    """
+    Загрузка всех событий файла (NDJSON или JSON-массив) с извлечением полей парсера.
+    JSON-массив разбирается целиком библиотекой парсера
+    """
+    with open(filename, 'rb') as f:
+        data = f.read()
+
+    if data.lstrip()[:1] == b'[':
+        return parser.parse_array(data)
+    return [event for event in map(parser.parse, data.split(b'\n')) if event is not None]
+
+def _iter_lines(f, head: str, chunk_size: int, parse) -> Iterator[dict]:
+    """Чтение событий в формате NDJSON - одно событие на строку, строка разбирается функцией parse"""
+    tail = head
+    while True:
+        lines = tail.split('\n')
+        # Последняя строка может быть прочитана не полностью - оставляем ее до следующего блока
+        tail = lines.pop()
+        for line in lines:
+            event = parse(line)
+            if event is not None:
+                yield event
+
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        tail += chunk
+
+    event = parse(tail)
+    if event is not None:
+        yield event
+
+def parse_line(line: str) -> Any:
+    """Разбор одной строки NDJSON. Пустые и поврежденные строки пропускаются"""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+def parse_timestamp(timestamp: Any):
+    """Перевод времени события Suricata (2025-02-23T10:15:19.130726+0300) в секунды Unix. Возвращает None, если время не распознано"""
+    if timestamp is None:
+        return None
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp)
+    if hasattr(timestamp, 'timestamp'):
+        return timestamp.timestamp()
+    try:
+        return datetime.fromisoformat(timestamp).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+def _iter_array(f, head: str, chunk_size: int, max_event_size: int = MAX_EVENT_SIZE) -> Iterator[dict]:
+    """
+    Чтение событий из JSON-массива без загрузки всего массива в память.
+    Элементы разбираются по смещению в буфере (без копирования остатка буфера после каждого элемента),
+    буфер сокращается только при дочитывании блока. Если элемент не разобран, а неразобранная часть буфера
+    превысила max_event_size (поврежденный или слишком большой элемент), чтение прерывается с ValueError
+    """
+    decoder = json.JSONDecoder()
+    buf = head.lstrip()[1:]     # пропускаем открывающую скобку массива
+    pos = 0
+    eof = False
+
+    while True:
+        # Пропускаем разделители между элементами массива
+        pos = _SEPARATORS.match(buf, pos).end()
+
+        if pos < len(buf):
+            if buf[pos] == ']':
+                return
+            try:
+                event, pos = decoder.raw_decode(buf, pos)
+            except ValueError:
+                # Элемент прочитан не полностью (или поврежден) - дочитываем следующий блок
+                if eof:
+                    raise
+                if len(buf) - pos > max_event_size:
+                    raise ValueError(f"Элемент JSON-массива не разобран в пределах {max_event_size} символов "
+                                     f"(поврежденный или слишком большой элемент)")
+            else:
+                yield event
+                continue
+        elif eof:
+            return
+
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buf = buf[pos:] + chunk
+        pos = 0
@@ -1,46 +1,176 @@
 import os
+import glob
+import json
+import time
+import tempfile
+import numpy as np
 import pandas as pd
 import gc
-from typing import Any
+import logging
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, List, Union
 from classes.pipeline import Stage
+from classes.suricata_event_reader import iter_events, load_events, parse_timestamp
+from classes.event_parser import get_parser
+from classes.log_follower import LogFollower
+from classes.flow_deduplicator import FlowDeduplicator, WindowedFlowDeduplicator, BloomFlowDeduplicator
+from classes.ip_aggregate import IPAggregate, aggregate_file
+from classes.event_store import read_events
+from classes.window_scorer import SlidingWindowScorer
+from classes.heavy_hitters import HeavyHitterCounter
+from classes.ip_table import IPTable
+from classes.logging_utils import summarize, log_rows
+
+logger = logging.getLogger(__name__)
 
 class SuricataLogAnalyzerStage(Stage):
     """
     Класс этапа (stage) для pipeline, производящий загрузку и анализ логов Suricata в формате JSON.
     Позволяет загружать данные, анализировать активность IP-адресов и выявлять подозрительные IP.
+    Режимы загрузки (mode):
+     - "memory" - весь файл загружается в DataFrame
+     - "stream" - файл читается потоково блоками по chunk_size, счетчики по IP обновляются инкрементально
+     - "follow" - читаются только события, дописанные с прошлого запуска. Позиция в файле и накопленные
+       счетчики по IP сохраняются в контрольной точке checkpoint после опроса с новыми событиями, но не чаще
+       checkpoint_interval секунд (и при close()). На следующие этапы передаются только IP, счетчики которых
+       изменились с прошлого запуска этапа (порог активности по-прежнему считается по всем IP). Если новые события
+       уже прочитаны вызовом poll() (например, PipelineDaemon), этап повторно лог не опрашивает
+     - "parquet" - filename указывает на колоночное хранилище (см. classes/event_store.py), из него загружаются
+       только нужные для анализа колонки; секции можно отобрать условиями filters
+    В режимах stream и follow дедупликация по flow_id выполняется компонентом dedup. По умолчанию -
+    WindowedFlowDeduplicator(dedup_window): точная в окне dedup_window секунд по времени событий, память ограничена
+    кол-вом потоков в окне и не растет с размером лога; контрольная точка follow не растет с историей потоков.
+    Для точной дедупликации по всему файлу (как drop_duplicates в режиме memory) - ExactFlowDeduplicator,
+    для фиксированной памяти - BloomFlowDeduplicator (по умолчанию при заданном counter).
+    В filename можно передать список файлов или шаблон glob (например, логи нескольких сенсоров) - тогда файлы
+    анализируются параллельно в пуле из workers процессов с дедупликацией потоков в окне dedup_window, а частичные
+    агрегаты объединяются с дедупликацией потоков на границах файлов.
+    При передаче scorer (SlidingWindowScorer) высокая активность IP определяется не порогом от среднего по всему файлу,
+    а по пиковой частоте запросов в скользящих окнах времени; в результат добавляются поля peak_rate_<окно>.
+    При передаче counter (HeavyHitterCounter) в режимах stream и follow запросы по IP считаются приближенно в
+    фиксированной памяти (Count-Min Sketch + Space-Saving): анализируются только самые активные IP и IP с alert-событиями,
+    а среднее кол-во запросов считается по оценке кол-ва уникальных IP (HyperLogLog). Дедупликация по умолчанию
+    в этом режиме - BloomFlowDeduplicator(BLOOM_DEDUP_CAPACITY): при подмене адресов каждое событие - новый поток,
+    и память дедупликации в окне времени росла бы вместе с потоком событий. Поток помнится, пока после него не встретилось
+    от BLOOM_DEDUP_CAPACITY до 2 * BLOOM_DEDUP_CAPACITY новых потоков; события более давних потоков учитываются повторно.
+    События разбираются библиотекой parser (см. classes/event_parser.py): auto - самая быстрая из установленных
+    (simdjson, orjson), json - стандартная библиотека. Из событий извлекаются только поля, нужные для анализа,
+    результат не зависит от библиотеки
     """
+
+    reads = ()
+    writes = ('suspicious_ips',)
+
+    # Емкость фильтра Блума дедупликации по умолчанию в режиме приближенного подсчета (около 3.6 МБ на два поколения).
+    # Дубликаты распознаются в пределах последних 1-2 млн потоков, более давние потоки учитываются повторно
+    BLOOM_DEDUP_CAPACITY = 1_000_000
     
-    def __init__(self,filename:str = "logs.json"):
+    def __init__(self,filename:Union[str, List[str]] = "logs.json", mode:str = "memory", chunk_size:int = 1 << 20,
+                 checkpoint:str = None, dedup:FlowDeduplicator = None, workers:int = None,
+                 filters:list = None, activity_multiplier:float = 2, scorer:SlidingWindowScorer = None,
+                 counter:HeavyHitterCounter = None, parser:str = "auto", checkpoint_interval:float = 0,
+                 dedup_window:float = 3600):
+        if mode not in ("memory", "stream", "follow", "parquet"):
+            raise ValueError(f"Неизвестный режим загрузки: {mode}")
+
+        # Несколько файлов задаются списком или шаблоном glob
+        if isinstance(filename, str) and glob.has_magic(filename):
+            filename = sorted(glob.glob(filename))
+        if not isinstance(filename, str) and mode == "follow":
+            raise ValueError("Режим follow поддерживает только один файл")
+        if not isinstance(filename, str) and mode == "parquet":
+            raise ValueError("Режим parquet поддерживает только один файл")
+        if not isinstance(filename, str) and dedup is not None:
+            raise ValueError("Для нескольких файлов потоки дедуплицируются в окне dedup_window, параметр dedup не поддерживается")
+        if not isinstance(filename, str) and scorer is not None:
+            raise ValueError("Оценка по скользящим окнам не поддерживается для нескольких файлов")
+        if counter is not None and (not isinstance(filename, str) or mode not in ("stream", "follow")):
+            raise ValueError("Приближенный подсчет поддерживается только в режимах stream и follow для одного файла")
+        if counter is not None and scorer is not None:
+            raise ValueError("Приближенный подсчет не совместим с оценкой по скользящим окнам (ее память растет с кол-вом IP)")
+
         self.df = None
         self.filename = filename
+        self.workers = workers
+        self.filters = filters
+        self.activity_multiplier = activity_multiplier
+        self.mode = mode
+        self.chunk_size = chunk_size
+        self.parser = get_parser(parser)
+
+        # Счетчики потокового режима
+        self.ip_counts = None
+        self.alert_counts = None
+        self.event_types = None
+        # Память дедупликации по умолчанию ограничена потоками в окне времени, а не всеми потоками лога;
+        # при приближенном подсчете - фиксирована, как и память счетчиков
+        if dedup is None:
+            dedup = (BloomFlowDeduplicator(self.BLOOM_DEDUP_CAPACITY) if counter is not None
+                     else WindowedFlowDeduplicator(dedup_window))
+        self.dedup = dedup
+        self.scorer = scorer
+        self.counter = counter
+        self.records_loaded = 0
+
+        # Состояние режима follow
+        self.checkpoint = checkpoint or f"{filename}.checkpoint"
+        self.follower = None
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_saved = None        # время записи контрольной точки (time.monotonic)
+        self.checkpoint_dirty = False       # есть события, не сохраненные в контрольной точке
+        self.batch_ips = set() if mode == "follow" else None   # IP, счетчики которых изменились с прошлого запуска
+        self.polled = False                 # новые события прочитаны poll() и еще не переданы на следующие этапы
 
     def process(self, data:Any):
         """Операции для загрузки, нормализации и анализу логов, выполняемые в рамках этапа pipeline"""
-        print("\n" + "="*70)
-        print("НАЧАЛО ЭТАПА")
-        print("Загрузка данных из файла логов Suricata")
-        print("="*70)
+        logger.info("НАЧАЛО ЭТАПА: Загрузка данных из файла логов Suricata")
         
-        # Загружаем логи из файла
-        self.load_data()
+        if not isinstance(self.filename, str):
+            # Параллельно анализируем несколько файлов
+            self.load_files()
+        elif self.mode == "stream":
+            # Потоково читаем логи с нормализацией и подсчетом на лету
+            self.load_stream()
+        elif self.mode == "follow":
+            # Дочитываем новые события с прошлой контрольной точки, если они еще не прочитаны источником пакетов
+            if not self.polled:
+                self.poll()
+        elif self.mode == "parquet":
+            # Загружаем из колоночного хранилища только нужные колонки; при ошибке загрузки нормализовать нечего
+            if self.load_parquet() is not None:
+                self.normalize_data()
+                self.feed_scorer()
+        else:
+            # Загружаем логи из файла; при ошибке загрузки нормализовать нечего
+            if self.load_data() is not None:
+                # Нормализуем загруженные логи
+                self.normalize_data()
 
-        # Нормализуем загруженные логи
-        self.normalize_data()
+                # Учитываем события в скользящих окнах
+                self.feed_scorer()
 
         # Вывод результаты загруки и нормализации
         self.print_info()
 
-        # Анализ подозрительных IP
-        data = {"suspicious_ips": self.get_suspicious_ips()}
+        # Анализ подозрительных IP (в режиме follow - только IP с новыми событиями)
+        data = {"suspicious_ips": self.get_suspicious_ips(self.activity_multiplier, self.batch_ips)}
+        if self.mode == "follow":
+            # Переданные IP убираем и из контрольной точки - после перезапуска они не передаются повторно
+            if self.batch_ips:
+                self.checkpoint_dirty = True
+            self.batch_ips = set()
+            self.polled = False
+            self.maybe_save_checkpoint()
 
-        # Поскольку логи м.б. большие - освободим память перед переходом к следующим этапам
-        self.clear_data()
+        # Поскольку логи м.б. большие - освободим память перед переходом к следующим этапам.
+        # В режиме follow накопленные счетчики нужны для следующего опроса
+        if self.mode != "follow":
+            self.clear_data()
 
-        print("\n" + "="*70)
-        print("КОНЕЦ ЭТАПА")
-        print("Загрузка данных из файла логов Suricata")
-        print(f"Данные на конец этапа: {data}")
-        print("="*70)
+        logger.info("КОНЕЦ ЭТАПА: Загрузка данных из файла логов Suricata")
+        logger.debug("Данные на конец этапа: %s", summarize(data))
 
         return data
 
@@ -50,115 +180,447 @@ class SuricataLogAnalyzerStage(Stage):
         try:
             # Проверяем существование файла
             if not os.path.exists(self.filename):
-                print(f"Файл {self.filename} не найден!")
+                logger.warning("Файл %s не найден!", self.filename)
                 return None
             
-            print("Загружаем данные...")
+            logger.info("Загружаем данные...")
             
-            # Загружаем JSON в DataFrame
-            with open(self.filename, 'r', encoding='utf-8') as f:
-                self.df = pd.read_json(self.filename)
+            # Загружаем в DataFrame только поля событий, нужные для анализа
+            self.df = pd.DataFrame(load_events(self.filename, self.parser))
             
-            print(f"Загружено {len(self.df)} записей")
+            logger.info("Загружено %s записей", len(self.df))
 
             # Проверяем наличие колонки src_ip
             if 'src_ip' not in self.df.columns:
-                print("В файле нет колонки 'src_ip'!")
+                logger.warning("В файле нет колонки 'src_ip'!")
+                self.df = None
                 return None
             
             return self.df
             
         except Exception as e:
-            print(f"ОШИБКА при загрузке данных: {e}")
+            logger.error("ОШИБКА при загрузке данных: %s", e)
             return None
     
+    def load_parquet(self):
+        """Загрузка событий из колоночного хранилища Parquet (только колонки, используемые в анализе)"""
+        if not os.path.exists(self.filename):
+            logger.warning("Хранилище %s не найдено!", self.filename)
+            return None
+
+        logger.info("Загружаем данные из колоночного хранилища...")
+
+        try:
+            columns = ['flow_id', 'src_ip', 'event_type'] + (['timestamp'] if self.scorer is not None else [])
+            self.df = read_events(self.filename, columns=columns, filters=self.filters)
+        except Exception as e:
+            logger.error("ОШИБКА при загрузке данных: %s", e)
+            return None
+
+        logger.info("Загружено %s записей", len(self.df))
+        return self.df
+
+    def load_stream(self):
+        """Потоковая загрузка лог-файла Suricata с дедупликацией по flow_id и подсчетом запросов по IP"""
+        if not os.path.exists(self.filename):
+            logger.warning("Файл %s не найден!", self.filename)
+            return None
+
+        self.reset_counters()
+
+        logger.info("Загружаем данные в потоковом режиме...")
+
+        try:
+            for event in iter_events(self.filename, self.chunk_size, self.parser):
+                self.count_event(event)
+
+        except Exception as e:
+            logger.error("ОШИБКА при загрузке данных: %s", e)
+            self.ip_counts = None
+            return None
+
+        logger.info("Загружено %s записей", self.records_loaded)
+        logger.info("Записей после нормализации: %s", sum(self.event_types.values()))
+        return self.ip_counts
+
+    def load_files(self):
+        """
+        Параллельный анализ нескольких файлов логов в пуле процессов.
+        Каждый процесс строит частичный агрегат по своему файлу с дедупликацией потоков в окне dedup_window,
+        агрегаты объединяются в порядке списка файлов; между файлами сравниваются только потоки на их границах
+        """
+        filenames = [name for name in self.filename if os.path.exists(name)]
+        for name in set(self.filename) - set(filenames):
+            logger.warning("Файл %s не найден!", name)
+
+        if not filenames:
+            logger.warning("Нет файлов для загрузки")
+            return None
+
+        logger.info("Загружаем данные из %s файлов...", len(filenames))
+        total = IPAggregate(self.dedup.window_seconds)
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                for aggregate in executor.map(partial(aggregate_file, chunk_size=self.chunk_size, parser=self.parser.name,
+                                                      window=self.dedup.window_seconds), filenames):
+                    total.merge(aggregate)
+
+        except Exception as e:
+            logger.error("ОШИБКА при загрузке данных: %s", e)
+            self.ip_counts = None
+            return None
+
+        self.ip_counts = total.ip_counts
+        self.alert_counts = total.alert_counts
+        self.event_types = total.event_types
+        self.records_loaded = total.records_loaded
+
+        logger.info("Загружено %s записей", self.records_loaded)
+        logger.info("Записей после нормализации: %s", sum(self.event_types.values()))
+        return self.ip_counts
+
+    def poll(self) -> int:
+        """
+        Инкрементальное чтение лога в режиме follow - обрабатываются только события, дописанные с прошлого опроса.
+        Возвращает кол-во новых событий
+        """
+        if self.follower is None:
+            self.follower = LogFollower(self.filename, self.chunk_size, self.parser)
+            self.load_checkpoint()
+
+        records_before = self.records_loaded
+
+        try:
+            for event in self.follower.read_new():
+                self.count_event(event)
+        except Exception as e:
+            logger.error("ОШИБКА при чтении новых событий: %s", e)
+
+        # Сохраняем позицию и счетчики, даже если чтение было прервано - учтенные события не будут прочитаны повторно.
+        # Опрос без новых событий контрольную точку не перезаписывает
+        new_records = self.records_loaded - records_before
+        self.polled = True
+        self.checkpoint_dirty = self.checkpoint_dirty or new_records > 0
+        self.maybe_save_checkpoint()
+
+        logger.info("Новых записей: %s, всего записей: %s", new_records, self.records_loaded)
+        return new_records
+
+    def load_checkpoint(self):
+        """Загрузка позиции в файле и накопленных счетчиков из контрольной точки"""
+        self.reset_counters()
+
+        if not os.path.exists(self.checkpoint):
+            return
+
+        try:
+            with open(self.checkpoint, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except Exception as e:
+            logger.error("ОШИБКА при чтении контрольной точки %s: %s. Лог будет прочитан с начала", self.checkpoint, e)
+            return
+
+        self.follower.restore(state['file'])
+        self.ip_counts = Counter(dict(state['ip_counts']))
+        self.alert_counts = Counter(dict(state['alert_counts']))
+        self.event_types = Counter(dict(state['event_types']))
+
+        # Состояние дедупликации восстанавливаем, только если компонент того же типа
+        dedup_state = state.get('dedup') or {}
+        if dedup_state.get('type') == type(self.dedup).__name__:
+            self.dedup.restore(dedup_state['state'])
+        else:
+            logger.warning("Состояние дедупликации в контрольной точке не подходит к текущему компоненту dedup - оно будет создано заново")
+
+        if self.scorer is not None and state.get('scorer'):
+            self.scorer.restore(state['scorer'])
+        if self.counter is not None and state.get('counter'):
+            self.counter.restore(state['counter'])
+        self.records_loaded = state['records_loaded']
+        # IP, учтенные до остановки, но не переданные на следующие этапы
+        self.batch_ips = set(state.get('batch_ips') or ())
+
+    def maybe_save_checkpoint(self):
+        """Запись контрольной точки, если есть несохраненные изменения и с прошлой записи прошло checkpoint_interval секунд"""
+        if self.follower is not None and self.checkpoint_dirty and (
+                self.checkpoint_saved is None or time.monotonic() - self.checkpoint_saved >= self.checkpoint_interval):
+            self.save_checkpoint()
+
+    def save_checkpoint(self):
+        """
+        Атомарная запись контрольной точки - через временный файл и переименование.
+        Размер контрольной точки определяется кол-вом IP и состоянием dedup (при WindowedFlowDeduplicator - потоками
+        в окне), а не кол-вом прочитанных событий
+        """
+        state = {
+            "file": self.follower.state(),
+            "ip_counts": list(self.ip_counts.items()),
+            "alert_counts": list(self.alert_counts.items()),
+            "event_types": list(self.event_types.items()),
+            "dedup": {"type": type(self.dedup).__name__, "state": self.dedup.state()},
+            "scorer": self.scorer.state() if self.scorer is not None else None,
+            "counter": self.counter.state() if self.counter is not None else None,
+            "records_loaded": self.records_loaded,
+            "batch_ips": list(self.batch_ips),
+        }
+
+        dirname = os.path.dirname(os.path.abspath(self.checkpoint))
+        fd, tmp_name = tempfile.mkstemp(dir=dirname, prefix=".checkpoint-")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp_name, self.checkpoint)
+            self.checkpoint_saved = time.monotonic()
+            self.checkpoint_dirty = False
+        except Exception as e:
+            logger.error("ОШИБКА при записи контрольной точки %s: %s", self.checkpoint, e)
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
+
+    def close(self):
+        """Сохранение контрольной точки с событиями, учтенными после последней записи"""
+        if self.follower is not None and self.checkpoint_dirty:
+            self.save_checkpoint()
+
+    def reset_counters(self):
+        """Сброс счетчиков потокового режима"""
+        self.ip_counts = Counter()
+        self.alert_counts = Counter()
+        self.event_types = Counter()
+        self.dedup.clear()
+        if self.scorer is not None:
+            self.scorer.clear()
+        if self.counter is not None:
+            self.counter.clear()
+        self.records_loaded = 0
+
+    def count_event(self, event: dict):
+        """Учет одного события в счетчиках потокового режима"""
+        self.records_loaded += 1
+
+        # Удаляем дубликаты по полю flow_id (оставляем первое событие потока)
+        if self.dedup.is_duplicate(event.get('flow_id'), event.get('timestamp')):
+            return
+
+        event_type = event.get('event_type')
+        self.event_types[event_type] += 1
+
+        src_ip = event.get('src_ip')
+        if src_ip is None:
+            return
+
+        if self.batch_ips is not None:
+            self.batch_ips.add(src_ip)
+
+        if self.counter is not None:
+            self.counter.add(src_ip, event_type == 'alert')
+            return
+
+        self.ip_counts[src_ip] += 1
+        if event_type == 'alert':
+            self.alert_counts[src_ip] += 1
+
+        if self.scorer is not None:
+            timestamp = parse_timestamp(event.get('timestamp'))
+            if timestamp is not None:
+                self.scorer.add(src_ip, timestamp)
+
+    def feed_scorer(self):
+        """Учет загруженных в DataFrame событий в скользящих окнах"""
+        if self.scorer is None or self.df is None:
+            return
+
+        self.scorer.clear()
+        timestamps = pd.to_datetime(self.df['timestamp'], utc=True, format='ISO8601', errors='coerce')
+        seconds = ((timestamps - pd.Timestamp(0, tz='UTC')) / pd.Timedelta(seconds=1)).to_numpy(dtype=float, na_value=np.nan)
+
+        for src_ip, timestamp in zip(self.df['src_ip'].tolist(), seconds.tolist()):
+            if isinstance(src_ip, str) and timestamp == timestamp:
+                self.scorer.add(src_ip, timestamp)
+
+    def is_loaded(self):
+        """Проверка, что данные загружены в одном из режимов"""
+        return self.df is not None or self.ip_counts is not None
+
     def normalize_data(self):
         """Нормализацая загруженных данных"""
-        print(f"Записей до нормализации: {len(self.df)}")
+        logger.debug("Записей до нормализации: %s", len(self.df))
         
         # Удаляем дубликаты по полю flow_id
         self.df = self.df.drop_duplicates(subset=['flow_id'], keep='first')
 
-        print(f"Записей после нормализации: {len(self.df)}")
+        logger.info("Записей после нормализации: %s", len(self.df))
         return self.df
 
     def clear_data(self):
         """Очистка памяти и запуск garbage collector"""
         self.df = None
+        self.ip_counts = None
+        self.alert_counts = None
+        self.event_types = None
+        self.dedup.clear()
+        if self.scorer is not None:
+            self.scorer.clear()
+        if self.counter is not None:
+            self.counter.clear()
         gc.collect()
-        print("Очистка памяти завершена")
+        logger.debug("Очистка памяти завершена")
 
     def get_ip_statistics(self):
         """Возвращает кол-во запросов для каждого IP-адреса"""
-        if self.df is None:
-            print("Данные не загружены. Сначала вызовите load_data()")
+        if not self.is_loaded():
+            logger.warning("Данные не загружены. Сначала вызовите load_data()")
             return None
+
+        if self.counter is not None:
+            # В приближенном режиме - только отслеживаемые IP с оценками
+            return self.get_ip_counters()['total'].sort_values(ascending=False, kind='stable')
+
+        if self.df is None:
+            # Порядок как у value_counts: по убыванию, при равенстве - в порядке появления
+            return pd.Series(self.ip_counts, dtype='int64').sort_values(ascending=False, kind='stable')
             
         return self.df['src_ip'].value_counts()
     
     def get_alert_ips(self):
         """Получение IP-адресов, связанных с событиями типа alert"""
-        if self.df is None:
-            print("Данные не загружены. Сначала вызовите load_data()")
+        if not self.is_loaded():
+            logger.warning("Данные не загружены. Сначала вызовите load_data()")
             return {}
+
+        if self.counter is not None:
+            alerts = self.get_ip_counters()['alerts']
+            return alerts[alerts > 0].to_dict()
+
+        if self.df is None:
+            return dict(self.alert_counts)
         
         return self.df[self.df['event_type'] == 'alert']['src_ip'].value_counts().to_dict()
     
-    def get_suspicious_ips(self, activity_multiplier=2):
-        """Поиск подозрительных IP на основе активности выше среднего и\или наличия alert-событий"""
-        if self.df is None:
-            print("Данные не загружены. Сначала вызовите load_data()")
+    def get_ip_counters(self):
+        """
+        Возвращает DataFrame с кол-вом запросов (total) и alert-событий (alerts) для каждого IP-адреса
+        в порядке появления IP (в приближенном режиме - для отслеживаемых IP по убыванию оценки запросов)
+        """
+        if not self.is_loaded():
+            logger.warning("Данные не загружены. Сначала вызовите load_data()")
+            return None
+
+        if self.counter is not None:
+            # Оценки сверху (total, alerts) и гарантированные нижние границы (total_min, alerts_min)
+            # для самых активных IP и IP с alert-событиями
+            hitters = self.counter.heavy_hitters()
+            counters = pd.DataFrame(
+                [item[1:] for item in hitters], index=[item[0] for item in hitters],
+                columns=['total', 'alerts', 'total_min', 'alerts_min'], dtype='int64')
+        elif self.df is None:
+            total = pd.Series(self.ip_counts, dtype='int64')
+            alerts = pd.Series(self.alert_counts, dtype='int64').reindex(total.index, fill_value=0)
+            counters = pd.DataFrame({'total': total, 'alerts': alerts})
+        else:
+            # Один проход factorize по src_ip (коды в порядке появления IP), подсчет через bincount
+            codes, ips = pd.factorize(self.df['src_ip'])
+            valid = codes >= 0
+            is_alert = self.df['event_type'].eq('alert').to_numpy(dtype=bool, na_value=False) & valid
+            counters = pd.DataFrame({
+                'total': np.bincount(codes[valid], minlength=len(ips)),
+                'alerts': np.bincount(codes[is_alert], minlength=len(ips)),
+            }, index=ips)
+
+        return counters
+
+    def get_suspicious_ips(self, activity_multiplier=2, ips=None):
+        """
+        Поиск подозрительных IP на основе активности выше среднего и\или наличия alert-событий.
+        При заданном ips в результат попадают только подозрительные IP из этого множества
+        """
+        if not self.is_loaded():
+            logger.warning("Данные не загружены. Сначала вызовите load_data()")
             return {}
         
-        ip_stats = self.get_ip_statistics()                 # кол-во запросов для каждого ip
-        alert_ips = self.get_alert_ips()                    # ip с алертами
-        mean_requests = ip_stats.mean()                     # среднее кол-во запросов для ip
-        threshold = mean_requests * activity_multiplier     # считаем порог по кол-ву запросов для ip (в activity_multiplier раз выше среднего)
-        
-        suspicious_ips = {}
-        
-        print("\nАНАЛИЗ ПОДОЗРИТЕЛЬНЫХ IP-АДРЕСОВ:")
-        # Обходим все ip, получаем для каждого общее кол-во запросов и кол-во алертов
-        for ip, total_count in ip_stats.items():
-            alert_count = alert_ips.get(ip, 0)
-            
-            # если общее кол-во запросов превышает порог или есть алерты, то ip подозрительный
-            if total_count > threshold or alert_count > 0:
-                suspicious_ips[ip] = {
-                    'total_requests': total_count,
-                    'alert_requests': alert_count,
-                    'activity_threshold': total_count > threshold,
-                    'has_alerts': alert_count > 0
-                }
-        
-        # Вывод результата поиска
-        if suspicious_ips:
-            print("\nIP адрес             Всего  Alerts  Порог")
-            print("-" * 50)
-                
-            for ip, info in suspicious_ips.items():
-                print(f"{ip:<20} {info['total_requests']:<8} "
-                    f"{info['alert_requests']:<8} "
-                    f"{'Да' if info['activity_threshold'] else 'Нет':<8} "
-                    )
+        counters = self.get_ip_counters()                   # кол-во запросов и алертов для каждого ip
+        total = counters['total'].to_numpy()
+        alerts = counters['alerts'].to_numpy()
+        threshold = total.mean() * activity_multiplier if len(total) else 0    # порог по кол-ву запросов для ip (в activity_multiplier раз выше среднего)
+        if self.counter is not None:
+            # В приближенном режиме среднее - по всем событиям и оценке кол-ва уникальных IP
+            unique_ips = self.counter.unique_ips()
+            threshold = self.counter.total() / unique_ips * activity_multiplier if unique_ips else 0
 
+        # если общее кол-во запросов превышает порог (или частота запросов аномальна в одном из окон) или есть алерты,
+        # то ip подозрительный
+        if self.scorer is not None:
+            scores = self.scorer.score(counters.index)
+            activity = scores['anomalous'].to_numpy()
+        elif self.counter is not None:
+            # В приближенном режиме решение принимается по нижней границе, чтобы не было ложных срабатываний
+            activity = counters['total_min'].to_numpy() > threshold
         else:
-            print("\nПодозрительных IP не найдено")
+            activity = total > threshold
+        has_alerts = (counters['alerts_min'] if self.counter is not None else counters['alerts']).to_numpy() > 0
+        # Подозрительные ip упорядочиваем как value_counts: по убыванию запросов, при равенстве - в порядке появления
+        mask = np.flatnonzero(activity | has_alerts)
+        if ips is not None:
+            mask = mask[counters.index[mask].isin(list(ips))]
+        mask = mask[np.argsort(-total[mask], kind='stable')]
+
+        # Колоночная таблица только для подозрительных ip (доступ по ip - как к словарю {ip: {поле: значение}})
+        suspicious_ips = IPTable(counters.index[mask].tolist(), {
+            'total_requests': total[mask].astype(np.int64),
+            'alert_requests': alerts[mask].astype(np.int64),
+            'activity_threshold': activity[mask].astype(bool),
+            'has_alerts': has_alerts[mask].astype(bool),
+        })
+
+        # Добавляем пиковые частоты запросов по окнам
+        if self.scorer is not None:
+            rates = scores.iloc[mask]
+            for label in self.scorer.labels():
+                suspicious_ips.set_column(label, rates[label].to_numpy(dtype=float))
+        
+        logger.info("АНАЛИЗ ПОДОЗРИТЕЛЬНЫХ IP-АДРЕСОВ: найдено %s IP", len(suspicious_ips))
+
+        # Таблица результата поиска - только в подробном журнале и только для первых (самых активных) IP
+        if suspicious_ips:
+            log_rows(logger, "IP адрес             Всего    Alerts   Порог\n" + "-" * 50,
+                     (f"{ip:<20} {info['total_requests']:<8} {info['alert_requests']:<8} "
+                      f"{'Да' if info['activity_threshold'] else 'Нет':<8}" for ip, info in suspicious_ips.items()),
+                     len(suspicious_ips))
         
         return suspicious_ips
     
     def print_info(self):
         """Вывод общей информации о загруженных данных"""
+        if not logger.isEnabledFor(logging.INFO):
+            # Подсчет статистики для вывода не выполняем, если он не попадет в журнал
+            return
+
+        if not self.is_loaded():
+            logger.warning("Данные не загружены")
+            return
+
         if self.df is None:
-            print("Данные не загружены")
+            logger.info("ИНФОРМАЦИЯ О ЗАГРУЖЕННЫХ ДАННЫХ:")
+            logger.info("Файл: %s", self.filename)
+            logger.info("Всего записей: %s", sum(self.event_types.values()))
+            if self.counter is not None:
+                logger.info("Уникальных IP (оценка): %s", self.counter.unique_ips())
+                logger.info("Память приближенного подсчета: %.1f КБ", self.counter.memory_bytes() / 1024)
+            else:
+                logger.info("Уникальных IP: %s", len(self.ip_counts))
+            logger.info("Распределение типов событий (event_type): %s", dict(self.event_types.most_common()))
+            logger.info("Память дедупликации flow_id (%s): %.1f КБ", type(self.dedup).__name__, self.dedup.memory_bytes() / 1024)
+            if self.event_types['alert']:
+                logger.info("Всего alert-событий: %s", self.event_types['alert'])
             return
         
-        print("\nИНФОРМАЦИЯ О ЗАГРУЖЕННЫХ ДАННЫХ:")
-        print(f"Файл: {self.filename}")
-        print(f"Всего записей: {len(self.df)}")
-        print(f"Уникальных IP: {self.df['src_ip'].nunique()}")
-        print(f"Распределение типов событий (event_type): {self.df['event_type'].value_counts().to_dict()}")
-        print(f"Колонки в данных: {list(self.df.columns)}")
+        logger.info("ИНФОРМАЦИЯ О ЗАГРУЖЕННЫХ ДАННЫХ:")
+        logger.info("Файл: %s", self.filename)
+        logger.info("Всего записей: %s", len(self.df))
+        logger.info("Уникальных IP: %s", self.df['src_ip'].nunique())
+        logger.info("Распределение типов событий (event_type): %s", self.df['event_type'].value_counts().to_dict())
+        logger.debug("Колонки в данных: %s", list(self.df.columns))
 
         if 'alert' in self.df['event_type'].values:
-            print(f"Всего alert-событий: {len(self.df[self.df['event_type'] == 'alert'])}")
\ No newline at end of file
+            logger.info("Всего alert-событий: %s", len(self.df[self.df['event_type'] == 'alert']))
\ No newline at end of file
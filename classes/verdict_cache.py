@@ -0,0 +1,131 @@
+import time
+import sqlite3
+import threading
+from typing import Optional, Tuple
+
+class VerdictCache:
+    """
+    Персистентный кэш результатов проверки IP в VirusTotal на SQLite.
+    Для вредоносных, безопасных и ошибочных (None) результатов задаются отдельные сроки жизни (TTL, в секундах).
+    При превышении max_entries вытесняются записи, к которым дольше всего не обращались (LRU).
+    Ведет счетчики попаданий (hits) и промахов (misses).
+    Время обращения к записям накапливается в памяти и вместе с новыми результатами фиксируется одной транзакцией -
+    после flush_size изменений или через flush_interval секунд (и при close()), а не при каждом обращении.
+    Кол-во записей ведется в памяти, просроченные записи удаляются при фиксации
+    """
+
+    def __init__(self, filename: str = "virustotal_cache.sqlite", ttl_malicious: float = 7 * 86400,
+                 ttl_clean: float = 86400, ttl_error: float = 900, max_entries: int = 100_000,
+                 flush_size: int = 1000, flush_interval: float = 5):
+        self.filename = filename
+        self.ttl_malicious = ttl_malicious
+        self.ttl_clean = ttl_clean
+        self.ttl_error = ttl_error
+        self.max_entries = max_entries
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.hits = 0
+        self.misses = 0
+
+        self.accessed = {}              # ip -> время обращения, еще не записанное в базу
+        self.pending = 0                # кол-во изменений в незафиксированной транзакции
+        self.last_flush = time.monotonic()
+
+        # Кэш используется и из пула потоков параллельной проверки
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS verdicts (
+                ip TEXT PRIMARY KEY,
+                verdict INTEGER,
+                expires REAL NOT NULL,
+                accessed REAL NOT NULL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS verdicts_accessed ON verdicts (accessed)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS verdicts_expires ON verdicts (expires)")
+        self.conn.commit()
+        self.count = self.conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+
+    def get(self, ip: str) -> Tuple[bool, Optional[bool]]:
+        """Возвращает пару (найдено в кэше, результат проверки)"""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT verdict, expires FROM verdicts WHERE ip = ?", (ip,)).fetchone()
+
+            if row is None or row[1] <= now:
+                self.misses += 1
+                return False, None
+
+            # Время обращения записывается в базу при следующей фиксации
+            self.accessed[ip] = now
+            self.pending += 1
+            self.hits += 1
+            self._maybe_flush(now)
+
+        return True, None if row[0] is None else bool(row[0])
+
+    def put(self, ip: str, verdict: Optional[bool]):
+        """Сохраняет результат проверки со сроком жизни, зависящим от результата"""
+        if verdict is None:
+            ttl = self.ttl_error
+        elif verdict:
+            ttl = self.ttl_malicious
+        else:
+            ttl = self.ttl_clean
+
+        now = time.time()
+        values = (None if verdict is None else int(verdict), now + ttl, now, ip)
+        with self.lock:
+            updated = self.conn.execute(
+                "UPDATE verdicts SET verdict = ?, expires = ?, accessed = ? WHERE ip = ?", values).rowcount
+            if not updated:
+                self.conn.execute("INSERT INTO verdicts (verdict, expires, accessed, ip) VALUES (?, ?, ?, ?)", values)
+                self.count += 1
+            self.accessed.pop(ip, None)
+            self.pending += 1
+
+            if self.count > self.max_entries:
+                self._evict(now)
+            self._maybe_flush(now)
+
+    def flush(self):
+        """Запись накопленных изменений в базу"""
+        with self.lock:
+            self._flush(time.time())
+
+    def _maybe_flush(self, now: float):
+        if self.pending >= self.flush_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self._flush(now)
+
+    def _flush(self, now: float):
+        """Запись времени обращений, удаление просроченных записей и фиксация транзакции"""
+        self._write_accessed()
+        self.count -= self.conn.execute("DELETE FROM verdicts WHERE expires <= ?", (now,)).rowcount
+        self.conn.commit()
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+    def _write_accessed(self):
+        if self.accessed:
+            self.conn.executemany("UPDATE verdicts SET accessed = ? WHERE ip = ?",
+                                  [(accessed, ip) for ip, accessed in self.accessed.items()])
+            self.accessed = {}
+
+    def _evict(self, now: float):
+        """Удаление просроченных записей и вытеснение давно не используемых сверх max_entries"""
+        # Порядок LRU - с учетом времени обращений, еще не записанного в базу
+        self._write_accessed()
+        self.count -= self.conn.execute("DELETE FROM verdicts WHERE expires <= ?", (now,)).rowcount
+        if self.count > self.max_entries:
+            self.count -= self.conn.execute(
+                "DELETE FROM verdicts WHERE ip IN (SELECT ip FROM verdicts ORDER BY accessed LIMIT ?)",
+                (self.count - self.max_entries,)).rowcount
+
+    def stats(self) -> dict:
+        """Счетчики обращений к кэшу"""
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self.lock:
+            self._flush(time.time())
+            self.conn.close()
@@ -1,22 +1,30 @@
-import os
-import requests
+import logging
 import time
 import random
-from dotenv import load_dotenv
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 from classes.pipeline import Stage
+from classes.settings import get_setting
+from classes.rate_limiter import TokenBucket
+from classes.verdict_cache import VerdictCache
+from classes.stage_metrics import CallStats
+from classes.logging_utils import summarize, log_rows
+
+logger = logging.getLogger(__name__)
 
 class VirusTotalStage(Stage):
     """
-    Класс этапа (stage) для pipeline, производящий проверку подозрительных ip в сервисе VirusTotal
+    Класс этапа (stage) для pipeline, производящий проверку подозрительных ip в сервисе VirusTotal.
+    При передаче кэша cache повторные проверки недавно проверенных IP берутся из кэша без обращения к API
     """
 
-    def __init__(self):
-        # Загружаем .env файл
-        load_dotenv()
+    reads = ('suspicious_ips',)
+    writes = ('virustotal_ips',)
 
-        # Получаем из него ключ для virustotal
-        api_key = os.getenv("API_KEY_VIRUSTOTAL")
+    def __init__(self, cache: VerdictCache = None):
+        # Получаем ключ для virustotal из параметров окружения (.env)
+        api_key = get_setting("API_KEY_VIRUSTOTAL")
 
         if not api_key:
             raise ValueError("API_KEY не установлен в env!")
@@ -26,13 +34,12 @@ class VirusTotalStage(Stage):
         self.headers = {"x-apikey": api_key}
         self.results = None
         self.sleep = 16
+        self.cache = cache
+        self.calls = CallStats()
 
     def process(self, data:Any):
         """Операции по проверке ip в virustotal, выполняемые в рамках этапа pipeline"""
-        print("\n" + "="*70)
-        print("НАЧАЛО ЭТАПА")
-        print("Обогащение данными из Virustotal")
-        print("="*70)
+        logger.info("НАЧАЛО ЭТАПА: Обогащение данными из Virustotal")
 
         # Обогащаем данные по подозрительным ip из suricata данными из virustotal
         data["virustotal_ips"] = self.check_ips(set(data["suspicious_ips"]))
@@ -40,20 +47,20 @@ class VirusTotalStage(Stage):
         # Вывод результата обогащения
         self.print_results()
 
-        print("\n" + "="*70)
-        print("КОНЕЦ ЭТАПА")
-        print("Обогащение данными из Virustotal")
-        print(f"Данные на конец этапа: {data}")
-        print("="*70)
+        logger.info("КОНЕЦ ЭТАПА: Обогащение данными из Virustotal")
+        logger.debug("Данные на конец этапа: %s", summarize(data))
 
         return data
 
     def check_ip(self, ip):
         """Проверяет один IP, возвращает True если подозрительный"""
+        import requests
+
         url = f"{self.base_url}/ip_addresses/{ip}"
         
         try:
-            response = requests.get(url, headers=self.headers)
+            with self.calls.track("virustotal"):
+                response = requests.get(url, headers=self.headers)
             response.raise_for_status()
             
             data = response.json()
@@ -63,30 +70,51 @@ class VirusTotalStage(Stage):
             return stats.get('malicious', 0) > 0 or stats.get('suspicious', 0) > 0
             
         except Exception as e:
-            print(f"Ошибка при проверке {ip}: {e}")
+            logger.warning("Ошибка при проверке %s: %s", ip, e)
             return None
+
+    def check_ip_cached(self, ip):
+        """Проверяет один IP с использованием кэша. Возвращает пару (результат, было ли обращение к API)"""
+        if self.cache is not None:
+            found, result = self.cache.get(ip)
+            if found:
+                return result, False
+
+        result = self.check_ip(ip)
+
+        if self.cache is not None:
+            self.cache.put(ip, result)
+        return result, True
     
     def check_ips(self, ip_list):
         """Проверяет список IP, возвращает словарь с результатами"""
         self.results = {}
         
         for i, ip in enumerate(ip_list):
-            print(f"Проверка {i+1}/{len(ip_list)}: {ip}")
-            self.results[ip] = self.check_ip(ip)
+            logger.debug("Проверка %s/%s: %s", i+1, len(ip_list), ip)
+            self.results[ip], requested = self.check_ip_cached(ip)
             
-            # Задержка для соблюдения лимитов API
-            if i < len(ip_list) - 1:
+            # Задержка для соблюдения лимитов API (ответы из кэша не расходуют лимит)
+            if requested and i < len(ip_list) - 1:
                 time.sleep(self.sleep)
         
         return self.results
     
     def print_results(self):
         """Выводит результаты Virtustotal в читаемом виде"""
-        print("\nРЕЗУЛЬТАТЫ ПРОВЕРКИ IP В VIRUSTOTAL:")
-        
-        for ip, is_suspicious in self.results.items():
-            status = "ПОДОЗРИТЕЛЬНЫЙ" if is_suspicious else "БЕЗОПАСНЫЙ"
-            print(f"{ip}: {status}")
+        logger.info("Проверено IP в VirusTotal: %s, подозрительных: %s",
+                    len(self.results), sum(1 for value in self.results.values() if value))
+        log_rows(logger, "РЕЗУЛЬТАТЫ ПРОВЕРКИ IP В VIRUSTOTAL:",
+                 (f"{ip}: {'ПОДОЗРИТЕЛЬНЫЙ' if is_suspicious else 'БЕЗОПАСНЫЙ'}" for ip, is_suspicious in self.results.items()),
+                 len(self.results))
+
+        if self.cache is not None:
+            logger.info("Кэш VirusTotal: попаданий %s, промахов %s", self.cache.hits, self.cache.misses)
+
+    def close(self):
+        """Закрытие кэша результатов проверки"""
+        if self.cache is not None:
+            self.cache.close()
 
     def get_suspicious_results(self):
         ips = [k for k, v in self.results.items() if v]
@@ -97,12 +125,123 @@ class VirusTotalMockStage(VirusTotalStage):
     """
     Класс mock обращений к Virustotal, возвращая случайный результат проверки
     """
-    def __init__(self, suspicious_probability=0.6):
+    def __init__(self, suspicious_probability=0.6, cache: VerdictCache = None):
         self.probability = suspicious_probability   # вероятность возврата подозрительного IP (по умолчанию 60%)
         self.results = None
         self.sleep = 1
+        self.cache = cache
+        self.calls = CallStats()
 
     def check_ip(self, ip):
         """Возвращаем случайное значение результата проверки"""
+        self.calls.record("virustotal", 0.0)
         return random.random() < self.probability
-  
\ No newline at end of file
+
+
+class VirusTotalConcurrentStage(VirusTotalStage):
+    """
+    Класс параллельной проверки ip в VirusTotal.
+    Запросы выполняются пулом потоков через одну HTTP-сессию с пулом keep-alive соединений.
+    Частота запросов ограничивается token bucket по квотам API (в минуту с допустимым всплеском burst и в сутки),
+    при ответах 429 и 5xx запрос повторяется с экспоненциальной задержкой
+    """
+    def __init__(self, requests_per_minute: float = 4, requests_per_day: int = 500, workers: int = 4,
+                 max_retries: int = 3, backoff: float = 2.0, base_url: str = None, cache: VerdictCache = None,
+                 burst: int = None):
+        super().__init__(cache)
+
+        if base_url:
+            self.base_url = base_url.rstrip('/')
+
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.limiter = TokenBucket(requests_per_minute, requests_per_day, burst)
+
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        # Одна сессия на все потоки - соединения переиспользуются из пула
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(self.headers)
+
+        self.print_lock = threading.Lock()
+
+    def check_ip(self, ip):
+        """Проверяет один IP с учетом квот API, возвращает True если подозрительный"""
+        import requests
+
+        url = f"{self.base_url}/ip_addresses/{ip}"
+
+        for attempt in range(self.max_retries + 1):
+            if not self.limiter.acquire():
+                logger.warning("Ошибка при проверке %s: исчерпана суточная квота API", ip)
+                return None
+
+            try:
+                with self.calls.track("virustotal"):
+                    response = self.session.get(url, timeout=30)
+            except requests.RequestException as e:
+                # Сетевые ошибки повторяем так же, как и ответы сервера о перегрузке
+                if attempt == self.max_retries:
+                    logger.warning("Ошибка при проверке %s: %s", ip, e)
+                    return None
+                time.sleep(self._retry_delay(attempt))
+                continue
+
+            if response.status_code == 429 or response.status_code >= 500:
+                if attempt == self.max_retries:
+                    logger.warning("Ошибка при проверке %s: HTTP %s", ip, response.status_code)
+                    return None
+                time.sleep(self._retry_delay(attempt, response.headers.get("Retry-After")))
+                continue
+
+            try:
+                response.raise_for_status()
+                stats = response.json()['data']['attributes']['last_analysis_stats']
+
+                # Возвращаем True если есть вредоносные или подозрительные обнаружения
+                return stats.get('malicious', 0) > 0 or stats.get('suspicious', 0) > 0
+
+            except Exception as e:
+                logger.warning("Ошибка при проверке %s: %s", ip, e)
+                return None
+
+        return None
+
+    def _retry_delay(self, attempt: int, retry_after: str = None) -> float:
+        """Задержка перед повтором: Retry-After от сервера или экспоненциальная задержка со случайной добавкой"""
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return self.backoff * (2 ** attempt) * (1 + random.random() * 0.1)
+
+    def close(self):
+        """Закрытие пула соединений и кэша"""
+        self.session.close()
+        super().close()
+
+    def check_ips(self, ip_list):
+        """Параллельно проверяет список IP, возвращает словарь с результатами"""
+        ip_list = list(ip_list)
+        self.results = {}
+        done = 0
+
+        def check(ip):
+            nonlocal done
+            result, _ = self.check_ip_cached(ip)
+            with self.print_lock:
+                done += 1
+                logger.debug("Проверка %s/%s: %s", done, len(ip_list), ip)
+            return result
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for ip, result in zip(ip_list, executor.map(check, ip_list)):
+                self.results[ip] = result
+
+        return self.results
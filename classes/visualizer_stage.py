@@ -1,57 +1,132 @@
-import matplotlib.pyplot as plt
+import os
+import heapq
+import logging
+import tempfile
+import threading
 from typing import Any
 from classes.pipeline import Stage
+from classes.logging_utils import summarize
+
+logger = logging.getLogger(__name__)
 
 class VisualizerStage(Stage):
     """
-    Класс этапа (stage) для pipeline, визуализирующий статистику запросов в разере ip-адресов
+    Класс этапа (stage) для pipeline, визуализирующий статистику запросов в разере ip-адресов.
+    График строится через Figure и неинтерактивный холст Agg без pyplot: matplotlib импортируется при первой
+    отрисовке, фигура создается один раз и переиспользуется, поэтому память не растет от запуска к запуску.
+    При background=True отрисовка и сохранение PNG выполняются в фоновом потоке и не задерживают pipeline:
+    visualize_file_save - данные приняты к отрисовке, а если предыдущий график еще не отрисован,
+    отрисовывается только последний. Файл заменяется атомарно. close() дожидается отрисовки
     """
-    def __init__(self,filename: str = 'report.png'):
+
+    reads = ('suspicious_ips',)
+    writes = ('visualize_file_save',)
+
+    def __init__(self,filename: str = 'report.png', top_n: int = 5, background: bool = False):
         self.top_ips = []
         self.filename = filename
+        self.top_n = top_n
+        self.background = background
+
+        self.figure = None
+        self.pending = None             # данные для отрисовки в фоновом потоке
+        self.condition = threading.Condition()
+        self.worker = None
+        self.closed = False
 
     def process(self, data:Any):
         """Операции по формированию визуализации и сохранению в файл, выполняемые в рамках этапа pipeline"""
-        print("\n" + "="*70)
-        print("НАЧАЛО ЭТАПА")
-        print("Формирование графиков и визуализации")
-        print("="*70)
+        logger.info("НАЧАЛО ЭТАПА: Формирование графиков и визуализации")
 
         # Формируем данные для графиков
         self.init_data(data["suspicious_ips"])
 
         # Запускаем визуализацию и сохранение в файл
-        data['visualize_file_save']=self.plot()
+        data['visualize_file_save']=self.submit() if self.background else self.plot()
 
-        print("\n" + "="*70)
-        print("КОНЕЦ ЭТАПА")
-        print("Формирование графиков и визуализации")
-        print(f"Данные на конец этапа: {data}")
-        print("="*70)
+        logger.info("КОНЕЦ ЭТАПА: Формирование графиков и визуализации")
+        logger.debug("Данные на конец этапа: %s", summarize(data))
         return data
 
     def init_data(self,data):
-        """Формирование сортированного списка ТОР5 ip для графика"""
-        # Сортируем IP по total_requests и берем TOP-5
-        self.top_ips = sorted(
-            [(ip, 
-              info['total_requests'], 
-              info['alert_requests']) 
-             for ip, info in data.items()], 
-            key=lambda x: x[1], reverse=True)[:5]
-
-    def plot(self):
-        """Отрисовывает график и сохраняет в файл"""
+        """Формирование списка ТОР-N ip по total_requests для графика"""
+        # ip_table (и numpy) импортируется только при выполнении этапа, а не при сборке pipeline
+        from classes.ip_table import IPTable
+
+        if isinstance(data, IPTable) and 'total_requests' in data.columns:
+            self.top_ips = self._top_rows(data)
+            return
+
+        # Частичная выборка через кучу - весь словарь не сортируется
+        self.top_ips = heapq.nlargest(
+            self.top_n,
+            ((ip, info['total_requests'], info['alert_requests']) for ip, info in data.items()),
+            key=lambda x: x[1])
+
+    def _top_rows(self, table) -> list:
+        """
+        TOP-N строк таблицы IPTable по колонке total_requests частичной выборкой (np.partition) - порядок как
+        у heapq.nlargest: по убыванию запросов, при равенстве - в порядке строк
+        """
+        import numpy as np
+
+        total = table.column('total_requests')
+        if len(total) > self.top_n > 0:
+            kth = np.partition(total, len(total) - self.top_n)[len(total) - self.top_n]
+            above = np.flatnonzero(total > kth)
+            rows = np.concatenate([above, np.flatnonzero(total == kth)[:self.top_n - len(above)]])
+            rows.sort()
+        else:
+            rows = np.arange(len(total) if self.top_n > 0 else 0)
+        rows = rows[np.argsort(-total[rows], kind='stable')]
+        alerts = table.column('alert_requests')
+        return list(zip(table.ips(rows.tolist()), total[rows].tolist(), alerts[rows].tolist()))
+
+    def submit(self):
+        """Передача данных на отрисовку в фоновом потоке"""
         if not self.top_ips:
-            print("Нет данных для формирования графиков")
+            logger.warning("Нет данных для формирования графиков")
             return None
-        
-        fig, ax = plt.subplots(figsize=(14, 5))
+
+        with self.condition:
+            if self.closed:
+                logger.error("Визуализация не поставлена в очередь: этап закрыт")
+                return False
+            if self.pending is not None:
+                logger.debug("Предыдущий график не отрисован - будет отрисован только последний")
+            self.pending = self.top_ips
+
+            if self.worker is None:
+                self.worker = threading.Thread(target=self._run, name="visualizer", daemon=True)
+                self.worker.start()
+            self.condition.notify()
+        return True
+
+    def _run(self):
+        """Фоновая отрисовка"""
+        while True:
+            with self.condition:
+                while self.pending is None:
+                    if self.closed:
+                        return
+                    self.condition.wait()
+                top_ips, self.pending = self.pending, None
+            self.plot(top_ips)
+
+    def plot(self, top_ips: list = None):
+        """Отрисовывает график и сохраняет в файл"""
+        top_ips = self.top_ips if top_ips is None else top_ips
+        if not top_ips:
+            logger.warning("Нет данных для формирования графиков")
+            return None
+
+        fig = self._figure()
+        ax = fig.add_subplot()
 
         # Объявляем данные для визуализации
-        ips = [x[0] for x in self.top_ips]
-        total = [x[1] for x in self.top_ips]
-        alerts = [x[2] for x in self.top_ips]
+        ips = [x[0] for x in top_ips]
+        total = [x[1] for x in top_ips]
+        alerts = [x[2] for x in top_ips]
 
         # Настраиваем визуализацию
         x = range(len(ips))
@@ -59,17 +134,47 @@ class VisualizerStage(Stage):
         ax.bar(x, alerts, label='Alerts', bottom=total)
         ax.set_xlabel('IP адреса')
         ax.set_ylabel('Количество запросов')
-        ax.set_title('TOP-5 IP адресов')
+        ax.set_title(f'TOP-{self.top_n} IP адресов')
         ax.set_xticks(x, ips)
         ax.legend()
-        
-        # Сохраняем визуализацию в файл
+
+        # Сохраняем визуализацию во временный файл и заменяем им прежний
+        tmp_name = None
         try:
-            plt.tight_layout()
-            plt.savefig(self.filename)
-            print(f"Визуализация успешно сохранена в файл {self.filename}")
+            fig.tight_layout()
+            dirname = os.path.dirname(os.path.abspath(self.filename))
+            fd, tmp_name = tempfile.mkstemp(dir=dirname, prefix=".visualize-", suffix=".png")
+            with os.fdopen(fd, 'wb') as f:
+                fig.savefig(f, format='png')
+            # mkstemp создает файл с правами 0600 - сохраняем права прежнего файла
+            os.chmod(tmp_name, os.stat(self.filename).st_mode & 0o777 if os.path.exists(self.filename) else 0o644)
+            os.replace(tmp_name, self.filename)
+            logger.info("Визуализация успешно сохранена в файл %s", self.filename)
             return True
         except Exception as e:
-            print(f"ОШИБКА при формировании и записи визуализации в файл: {e}")
+            logger.error("ОШИБКА при формировании и записи визуализации в файл: %s", e)
+            if tmp_name is not None and os.path.exists(tmp_name):
+                os.remove(tmp_name)
             return False
+        finally:
+            # Фигура переиспользуется в следующем запуске - освобождаем оси и данные графика
+            fig.clear()
+
+    def _figure(self):
+        """Фигура с холстом Agg (без pyplot, фигура не регистрируется в глобальном менеджере фигур)"""
+        if self.figure is None:
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+            self.figure = Figure(figsize=(14, 5))
+            FigureCanvasAgg(self.figure)
+        return self.figure
 
+    def close(self):
+        """Ожидание отрисовки последнего графика и остановка фонового потока"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+            worker = self.worker
+        if worker is not None:
+            worker.join()
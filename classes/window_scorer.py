@@ -0,0 +1,130 @@
+import logging
+import numpy as np
+import pandas as pd
+from typing import Iterable, Sequence
+
+logger = logging.getLogger(__name__)
+
+class _IPWindows:
+    """Кольцевые буферы счетчиков одного IP для всех окон"""
+    __slots__ = ('last', 'rings', 'sums', 'peaks')
+
+    def __init__(self, windows_count: int, buckets: int):
+        self.last = [None] * windows_count              # номер последней заполненной корзины
+        self.rings = [[0] * buckets for _ in range(windows_count)]
+        self.sums = [0] * windows_count                 # кол-во событий в текущем окне
+        self.peaks = [0] * windows_count                # максимум событий в окне за все время
+
+class SlidingWindowScorer:
+    """
+    Оценка активности IP по скользящим окнам времени (например 10 с, 1 мин, 10 мин).
+    Для каждого IP и окна ведется кольцевой буфер из buckets корзин, поэтому учет события стоит O(1).
+    Для каждого окна запоминается пиковая частота запросов IP (событий в секунду). Аномальными считаются IP,
+    пиковая частота которых хотя бы в одном окне превышает робастную базовую линию по всем IP:
+    медиана + mad_threshold * MAD (масштабированное медианное абсолютное отклонение).
+    В отличие от порога от среднего по всему файлу короткий всплеск не "размывается" длинным логом
+    """
+
+    def __init__(self, windows: Sequence[float] = (10, 60, 600), buckets: int = 10, mad_threshold: float = 3.5):
+        self.windows = tuple(windows)
+        self.buckets = buckets
+        self.widths = [w / buckets for w in self.windows]
+        self.mad_threshold = mad_threshold
+        self.ips = {}
+
+    def add(self, src_ip: str, timestamp: float):
+        """Учет одного события IP в момент timestamp (секунды)"""
+        state = self.ips.get(src_ip)
+        if state is None:
+            state = self.ips[src_ip] = _IPWindows(len(self.windows), self.buckets)
+
+        nb = self.buckets
+        for k, width in enumerate(self.widths):
+            bucket = int(timestamp // width)
+            last = state.last[k]
+            ring = state.rings[k]
+
+            if last is None:
+                state.last[k] = bucket
+            elif bucket > last:
+                # Сдвигаем окно: обнуляем корзины, вышедшие за его пределы (не более buckets корзин)
+                if bucket - last >= nb:
+                    ring[:] = [0] * nb
+                    state.sums[k] = 0
+                else:
+                    for b in range(last + 1, bucket + 1):
+                        state.sums[k] -= ring[b % nb]
+                        ring[b % nb] = 0
+                state.last[k] = bucket
+            elif last - bucket >= nb:
+                # Запоздавшее событие старше окна - в текущее окно не попадает
+                continue
+
+            ring[bucket % nb] += 1
+            state.sums[k] += 1
+            if state.sums[k] > state.peaks[k]:
+                state.peaks[k] = state.sums[k]
+
+    def labels(self):
+        """Имена полей пиковой частоты для окон: peak_rate_10s, peak_rate_1m, ..."""
+        return [f"peak_rate_{_window_label(w)}" for w in self.windows]
+
+    def score(self, ips: Iterable[str] = None) -> pd.DataFrame:
+        """
+        Пиковые частоты запросов (событий в секунду) по окнам и признак аномальности (anomalous) для каждого IP
+        """
+        ips = list(self.ips) if ips is None else list(ips)
+        labels = self.labels()
+
+        peaks = np.zeros((len(ips), len(self.windows)))
+        for row, ip in enumerate(ips):
+            state = self.ips.get(ip)
+            if state is not None:
+                peaks[row] = state.peaks
+        rates = peaks / np.array(self.windows)
+
+        anomalous = np.zeros(len(ips), dtype=bool)
+        if len(self.ips):
+            # Базовая линия считается по всем IP, а не только по запрошенным
+            all_rates = np.array([state.peaks for state in self.ips.values()]) / np.array(self.windows)
+            median = np.median(all_rates, axis=0)
+            mad = np.median(np.abs(all_rates - median), axis=0) * 1.4826
+
+            # Нижняя граница MAD - одно событие в окне, иначе при однородном фоне порогом становится сама медиана
+            mad = np.maximum(mad, 1 / np.array(self.windows))
+            anomalous = (rates > median + self.mad_threshold * mad).any(axis=1)
+
+        result = pd.DataFrame(rates, index=ips, columns=labels)
+        result['anomalous'] = anomalous
+        return result
+
+    def clear(self):
+        self.ips = {}
+
+    def state(self) -> dict:
+        """Состояние для сохранения в контрольной точке"""
+        return {
+            "windows": list(self.windows),
+            "buckets": self.buckets,
+            "ips": {ip: [s.last, s.rings, s.sums, s.peaks] for ip, s in self.ips.items()},
+        }
+
+    def restore(self, state: dict):
+        """Восстановление состояния из контрольной точки"""
+        self.clear()
+        if tuple(state["windows"]) != self.windows or state["buckets"] != self.buckets:
+            logger.warning("Параметры окон в контрольной точке отличаются от текущих - счетчики окон будут созданы заново")
+            return
+        for ip, (last, rings, sums, peaks) in state["ips"].items():
+            windows = _IPWindows(len(self.windows), self.buckets)
+            windows.last, windows.rings, windows.sums, windows.peaks = last, rings, sums, peaks
+            self.ips[ip] = windows
+
+def _window_label(seconds: float) -> str:
+    """Короткая запись длительности окна: 10s, 1m, 1h"""
+    seconds = int(seconds) if float(seconds).is_integer() else seconds
+    if isinstance(seconds, int) and seconds % 3600 == 0:
+        return f"{seconds // 3600}h"
+    if isinstance(seconds, int) and seconds % 60 == 0:
+        return f"{seconds // 60}m"
+    return f"{seconds}s"
@@ -1,32 +1,76 @@
-from classes.pipeline import Pipeline
-from classes.suricata_log_analyzer_stage import SuricataLogAnalyzerStage
-from classes.virus_total_stage import VirusTotalMockStage,VirusTotalStage
-from classes.check_block_condition_stage import CheckBlockConditionStage
-from classes.firewall_ban_stage import FirewallBanMockStage,FirewallBanStage
-from classes.email_notifier_stage import EmailNotifierStage
-from classes.ip_report_stage import IPReportStage
-from classes.visualizer_stage import VisualizerStage
+import logging
+import argparse
+from classes.pipeline import Pipeline,DAGPipeline
+from classes.pipeline_daemon import PipelineDaemon
+from classes.stage_metrics import PipelineMetrics
+from classes.logging_utils import configure_logging, summarize
+from classes import stage_registry as stages
 
-def main():
+logger = logging.getLogger("pipeline")
+
+def build_pipeline(log_file: str = "events.json", log_mode: str = "memory", metrics: PipelineMetrics = None) -> Pipeline:
     """
     Используется паттерн pipline для последовательного вызова этапов.
     В рамках этапов происходит получение, обогащение, обработка данных и передача их на следующий этап.
-    """    
-    pipeline = Pipeline([
-        SuricataLogAnalyzerStage('events.json'),            # Чтение и анализ лога Suricata events.json
-        VirusTotalMockStage(),                              # Обогащение логов из Virustotal (мок)
-        #VirusTotalStage()                                  # Обогащение логов из Virustotal (реальное обращение)
-        CheckBlockConditionStage(score_threshold=2),        # Проверка условий для блокировки подозрительных ip
-        FirewallBanMockStage(),                             # Блокировка подозрительных ip на firewall (мок)
-        #FirewallBanStage(),                                # Блокировка подозрительных ip на firewall (реальное обращение)
-        EmailNotifierStage('admin_report@example.com'),     # Отправка почтовых оповещений на admin_report@example.local
-        IPReportStage('ip_report.json'),                    # Формирование отчета и запись его в файл ip_report.json
-        VisualizerStage('ip_report.png')                    # Формирование визуализации и запись в файл ip_report.png
-    ])
-
-    print("Pipeline стартует")
-    result = pipeline.execute()
-    print(f"Pipeline завершен с результатом: {result}")
+    Для параллельного выполнения независимых этапов вместо Pipeline можно использовать DAGPipeline.
+    Метрики этапов (время, память, обращения к внешним сервисам) собираются в metrics.
+    Этапы берутся из реестра stages: модуль этапа и его зависимости импортируются только для используемых этапов.
+    """
+    return Pipeline([
+        stages.SuricataLogAnalyzerStage(log_file, mode=log_mode), # Чтение и анализ лога Suricata events.json
+        #stages.SuricataLogAnalyzerStage(log_file, mode=log_mode, scorer=stages.SlidingWindowScorer()), # Анализ с порогом по скользящим окнам времени
+        #stages.SuricataLogAnalyzerStage(log_file, mode=log_mode, parser="json"), # Разбор событий стандартной библиотекой json
+        stages.VirusTotalMockStage(),                           # Обогащение логов из Virustotal (мок)
+        #stages.VirusTotalStage()                               # Обогащение логов из Virustotal (реальное обращение)
+        #stages.VirusTotalConcurrentStage(requests_per_minute=4, requests_per_day=500), # Параллельное обогащение из Virustotal с учетом квот API
+        stages.CheckBlockConditionStage(),                      # Проверка условий для блокировки подозрительных ip
+        #stages.CheckBlockConditionStage(allow_list="allow_list.txt", subnet_threshold=8), # Проверка с учетом разрешенных адресов и объединением в подсети
+        stages.FirewallBanMockStage(),                          # Блокировка подозрительных ip на firewall (мок)
+        #stages.FirewallBanStage(),                             # Блокировка подозрительных ip на firewall (реальное обращение)
+        #stages.FirewallBanStage(batch_size=100, workers=4),    # Пакетная блокировка подозрительных ip на firewall
+        stages.EmailNotifierStage('admin_report@example.com'),  # Отправка почтовых оповещений на admin_report@example.local
+        #stages.EmailNotifierMockStage('admin_report@example.com'), # Формирование почтовых оповещений без отправки (мок)
+        #stages.EmailDigestNotifierStage('admin_report@example.com', digest_interval=300, digest_size=100), # Фоновая отправка сводок оповещений
+        stages.IPReportStage('ip_report.json'),                 # Формирование отчета и запись его в файл ip_report.json
+        #stages.IPReportStage('ip_report.jsonl', fmt='jsonl', merge=True), # Накопительный отчет: обновление записей IP из прежних запусков
+        stages.VisualizerStage('ip_report.png')                 # Формирование визуализации и запись в файл ip_report.png
+        #stages.VisualizerStage('ip_report.png', background=True), # Отрисовка визуализации в фоновом потоке
+    ], metrics=metrics)
+
+def main():
+    parser = argparse.ArgumentParser(description="Анализ логов Suricata и реагирование на угрозы")
+    parser.add_argument('--log', default="events.json", help="файл лога Suricata")
+    parser.add_argument('--daemon', action='store_true',
+                        help="резидентный режим: лог (NDJSON) читается инкрементально, pipeline запускается на микро-пакетах")
+    parser.add_argument('--interval', type=float, default=60, help="интервал запуска пакетов в резидентном режиме, с")
+    parser.add_argument('--event-threshold', type=int, default=None,
+                        help="запуск пакета при накоплении указанного кол-ва новых событий")
+    parser.add_argument('--metrics-prom', default=None, help="файл метрик этапов в текстовом формате Prometheus")
+    parser.add_argument('--metrics-json', default=None, help="файл JSON-сводки метрик последнего запуска")
+    parser.add_argument('--log-level', default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="уровень журнала: DEBUG - подробный вывод по каждому IP, WARNING - только предупреждения и ошибки")
+    parser.add_argument('--log-json', action='store_true', help="журнал в формате JSON (одна запись в строке)")
+    args = parser.parse_args()
+
+    configure_logging(args.log_level, json_format=args.log_json)
+    metrics = PipelineMetrics(prometheus_file=args.metrics_prom, json_file=args.metrics_json)
+
+    if args.daemon:
+        # Этапы создаются один раз и переиспользуются во всех пакетах
+        pipeline = build_pipeline(args.log, log_mode="follow", metrics=metrics)
+        PipelineDaemon(pipeline, interval=args.interval, event_threshold=args.event_threshold).run()
+        return
+
+    pipeline = build_pipeline(args.log, metrics=metrics)
+
+    logger.info("Pipeline стартует")
+    try:
+        result = pipeline.execute()
+    finally:
+        # Закрываем соединения и дожидаемся фоновых задач этапов (например, отправки сводки оповещений)
+        pipeline.close()
+    logger.info("Pipeline завершен с результатом: %s", summarize(result))
+    metrics.print_summary()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
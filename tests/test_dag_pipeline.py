@@ -0,0 +1,43 @@
+import time
+from classes.pipeline import DAGPipeline, Stage
+
+class RecordingStage(Stage):
+    """Этап, записывающий в журнал начало и конец выполнения"""
+
+    def __init__(self, name, reads, writes, log, delay=0.0):
+        self.name = name
+        self.reads = reads
+        self.writes = writes
+        self.log = log
+        self.delay = delay
+
+    def process(self, data):
+        self.log.append(("start", self.name))
+        time.sleep(self.delay)
+        seen = list(data.get("items", []))
+        for key in self.writes:
+            data.setdefault(key, []).append(self.name)
+        data[f"seen_{self.name}"] = seen
+        self.log.append(("end", self.name))
+        return data
+
+def test_write_after_read_waits_for_reader():
+    """Этап, изменяющий ключ на месте, не запускается, пока предыдущий этап читает этот ключ"""
+    log = []
+    reader = RecordingStage("reader", ("items",), ("seen_reader",), log, delay=0.2)
+    writer = RecordingStage("writer", (), ("items",), log)
+
+    data = DAGPipeline([reader, writer], max_workers=2).execute({"items": ["initial"]})
+
+    assert log == [("start", "reader"), ("end", "reader"), ("start", "writer"), ("end", "writer")]
+    assert data["seen_reader"] == ["initial"]
+    assert data["items"] == ["initial", "writer"]
+
+def test_independent_stages_run_in_parallel():
+    log = []
+    first = RecordingStage("first", ("items",), ("a",), log, delay=0.2)
+    second = RecordingStage("second", ("items",), ("b",), log, delay=0.2)
+
+    DAGPipeline([first, second], max_workers=2).execute({"items": []})
+
+    assert [event for event, _ in log[:2]] == ["start", "start"]
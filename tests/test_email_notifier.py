@@ -0,0 +1,207 @@
+import email
+import email.policy
+import socket
+import socketserver
+import threading
+import time
+from email.message import EmailMessage
+
+import pytest
+
+from classes.smtp_session import SMTPSession
+from classes.email_notifier_stage import EmailDigestNotifierStage
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    """
+    Отладочный SMTP-сервер: принимает письма без доставки. Сбои задаются атрибутами сервера:
+    reject_421 - кол-во команд MAIL, на которые сервер отвечает 421 и закрывает соединение,
+    drop_after_message - закрывать соединение после каждого принятого письма
+    """
+
+    def reply(self, line):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply("220 stub ESMTP")
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250-stub")
+                self.reply("250 AUTH PLAIN LOGIN")
+            elif command.startswith("AUTH"):
+                with server.lock:
+                    server.logins += 1
+                self.reply("235 Authentication successful")
+            elif command.startswith("MAIL"):
+                with server.lock:
+                    rejected = server.reject_421 > 0
+                    server.reject_421 -= rejected
+                if rejected:
+                    self.reply("421 Idle timeout, closing connection")
+                    return
+                self.reply("250 OK")
+            elif command.startswith("DATA"):
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data = self.rfile.readline()
+                    if data.rstrip(b"\r\n") == b".":
+                        break
+                    lines.append(data)
+                with server.lock:
+                    server.messages.append(email.message_from_bytes(b"".join(lines), policy=email.policy.default))
+                self.reply("250 Queued")
+                if server.drop_after_message:
+                    return
+            elif command.startswith("QUIT"):
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubSMTPHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.logins = 0
+        self.messages = []
+        self.reject_421 = 0
+        self.drop_after_message = False
+
+@pytest.fixture
+def server(monkeypatch):
+    smtp = StubSMTPServer()
+    thread = threading.Thread(target=smtp.serve_forever, daemon=True)
+    thread.start()
+
+    monkeypatch.setenv("EMAIL_MAIL", "pipeline@example.local")
+    monkeypatch.setenv("EMAIL_PASSWORD", "secret")
+    monkeypatch.setenv("EMAIL_SMTP_SERVER", "127.0.0.1")
+    monkeypatch.setenv("EMAIL_SMTP_PORT", str(smtp.server_address[1]))
+    monkeypatch.setenv("EMAIL_SMTP_STARTTLS", "0")
+
+    yield smtp
+    smtp.shutdown()
+    smtp.server_close()
+
+def make_message(subject):
+    msg = EmailMessage()
+    msg["From"] = "pipeline@example.local"
+    msg["To"] = "admin@example.com"
+    msg["Subject"] = subject
+    msg.set_content("test")
+    return msg
+
+def make_session(server):
+    return SMTPSession("127.0.0.1", server.server_address[1], "pipeline@example.local", "secret", starttls=False)
+
+def body(message):
+    return message.get_body(("plain",)).get_content()
+
+def test_session_reuses_connection(server):
+    """Несколько писем - одно соединение и одна авторизация"""
+    session = make_session(server)
+    try:
+        for i in range(3):
+            session.send(make_message(f"message {i}"))
+    finally:
+        session.close()
+
+    assert [m["Subject"] for m in server.messages] == ["message 0", "message 1", "message 2"]
+    assert server.connections == 1
+    assert server.logins == 1
+
+def test_reconnect_after_421(server):
+    """Ответ 421 (сервер закрыл соединение после простоя) - письмо отправляется через новое соединение"""
+    session = make_session(server)
+    try:
+        session.send(make_message("first"))
+        server.reject_421 = 1
+        session.send(make_message("second"))
+    finally:
+        session.close()
+
+    assert [m["Subject"] for m in server.messages] == ["first", "second"]
+    assert server.connections == 2
+    assert session.connects == 2
+
+def test_reconnect_after_dropped_connection(server):
+    """Соединение, закрытое сервером без ответа, восстанавливается при следующей отправке"""
+    server.drop_after_message = True
+    session = make_session(server)
+    try:
+        for i in range(3):
+            session.send(make_message(f"message {i}"))
+    finally:
+        session.close()
+
+    assert len(server.messages) == 3
+    assert server.connections == 3
+
+def test_refused_connection_is_not_retried():
+    """Сервер недоступен при первом подключении - исходная ошибка без повторного подключения"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    session = SMTPSession("127.0.0.1", port, starttls=False, timeout=5)
+    attempts = []
+    connect = session._connect
+    session._connect = lambda: attempts.append(1) or connect()
+
+    with pytest.raises(ConnectionRefusedError):
+        session.send(make_message("lost"))
+    assert len(attempts) == 1
+    assert session.connection is None
+
+def test_digest_one_message_per_window(server):
+    """Результаты, поставленные в очередь в пределах окна, отправляются одним письмом; повторные IP заменяются"""
+    stage = EmailDigestNotifierStage(digest_interval=0.5, digest_size=100)
+    try:
+        assert stage.process({"block_result": {"10.0.0.1": False, "10.0.0.2": True}})["email_send_result"]
+        stage.process({"block_result": {"10.0.0.1": True, "10.0.0.3": True}})
+        stage.process({"block_result": {}})
+        assert server.messages == []
+
+        deadline = time.monotonic() + 5
+        while not server.messages and time.monotonic() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.2)
+        assert len(server.messages) == 1
+        assert "3 IP" in server.messages[0]["Subject"]
+        text = body(server.messages[0])
+        assert "10.0.0.1 заблокирован" in text and "10.0.0.3 заблокирован" in text
+        assert "Не заблокирован" not in text
+
+        # Следующее окно - следующее письмо
+        stage.process({"block_result": {"10.0.0.4": True}})
+    finally:
+        stage.close()
+
+    assert len(server.messages) == 2
+    assert "10.0.0.4" in body(server.messages[1])
+    assert server.connections == 1
+
+def test_digest_sent_on_size(server):
+    """При накоплении digest_size IP сводка отправляется, не дожидаясь окончания окна"""
+    stage = EmailDigestNotifierStage(digest_interval=60, digest_size=2)
+    try:
+        stage.process({"block_result": {"10.0.0.1": True, "10.0.0.2": True}})
+        deadline = time.monotonic() + 5
+        while not server.messages and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert len(server.messages) == 1
+    finally:
+        stage.close()
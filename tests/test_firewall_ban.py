@@ -0,0 +1,122 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from classes.firewall_ban_stage import FirewallBanStage
+
+# IP, блокировка которых на заглушке firewall завершается ошибкой
+REJECTED = {"10.0.0.3", "10.0.0.7"}
+# Пакет с этим IP отклоняется целиком (HTTP 503)
+BATCH_FAILURE = "10.0.0.9"
+
+class StubFirewall(BaseHTTPRequestHandler):
+    """
+    Заглушка API Firewall: POST /block и /block/batch. Соединения keep-alive (HTTP/1.1),
+    сервер запоминает адреса клиентских соединений, чтобы проверить их переиспользование
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        with server.lock:
+            server.connections.add(self.client_address)
+            server.requests.append((self.path, body))
+            server.api_keys.add(self.headers.get("API-Key"))
+
+        if self.path.endswith("/block/batch"):
+            if BATCH_FAILURE in body["ips"]:
+                self.reply(503, {"error": "unavailable"})
+            else:
+                self.reply(200, {"results": {ip: ip not in REJECTED for ip in body["ips"]}})
+        elif self.path.endswith("/block"):
+            self.reply(500 if body["ip"] in REJECTED else 200, {})
+        else:
+            self.reply(404, {})
+
+    def reply(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StubFirewall)
+    httpd.daemon_threads = True
+    httpd.lock = threading.Lock()
+    httpd.connections = set()
+    httpd.requests = []
+    httpd.api_keys = set()
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+@pytest.fixture(autouse=True)
+def api_key(monkeypatch):
+    monkeypatch.setenv("API_KEY_FIREWALL", "test-key")
+
+def run_stage(server, ips, **kwargs):
+    stage = FirewallBanStage(base_url=f"http://127.0.0.1:{server.server_port}", **kwargs)
+    try:
+        return stage.process({"ips_for_block": dict.fromkeys(ips, "block_by_score")})["block_result"]
+    finally:
+        stage.close()
+
+def expected(ips, failed_batch=()):
+    return {ip: ip not in REJECTED and ip not in failed_batch for ip in ips}
+
+def test_batch_mode(server):
+    """Пакетный режим: результат по каждому IP, отказ по отдельным IP и отказ всего пакета не влияют на другие пакеты"""
+    ips = [f"10.0.0.{i}" for i in range(1, 13)]
+    result = run_stage(server, ips, batch_size=3, workers=2)
+
+    # Пакет 10.0.0.7-10.0.0.9 отклонен целиком
+    assert result == expected(ips, failed_batch={"10.0.0.8", "10.0.0.9"})
+    assert list(result) == ips
+    assert [path for path, _ in server.requests] == ["/block/batch"] * 4
+    assert sorted(ip for _, body in server.requests for ip in body["ips"]) == sorted(ips)
+    assert server.api_keys == {"test-key"}
+    assert len(server.connections) <= 2
+
+def test_parallel_mode(server):
+    """Параллельные одиночные запросы: частичные отказы и переиспользование не более workers соединений"""
+    ips = [f"10.0.0.{i}" for i in range(1, 21)]
+    result = run_stage(server, ips, workers=3)
+
+    assert result == expected(ips)
+    assert list(result) == ips
+    assert len(server.requests) == len(ips)
+    assert len(server.connections) <= 3
+
+def test_sequential_mode_reuses_connection(server):
+    """Последовательные запросы выполняются через одно keep-alive соединение"""
+    ips = [f"10.0.0.{i}" for i in range(1, 9)]
+    result = run_stage(server, ips)
+
+    assert result == expected(ips)
+    assert len(server.requests) == len(ips)
+    assert len(server.connections) == 1
+
+def test_fast_path_results_not_resent(server):
+    """IP, заблокированные на быстром пути, повторно не отправляются и считаются заблокированными"""
+    stage = FirewallBanStage(base_url=f"http://127.0.0.1:{server.server_port}")
+    try:
+        data = stage.process({
+            "ips_for_block": {"10.0.0.1": "block_by_score", "10.0.0.2": "block_by_virustotal", "10.0.0.3": "block_by_score"},
+            "fast_block_result": {"10.0.0.1": True, "10.0.0.3": False},
+        })
+    finally:
+        stage.close()
+
+    assert data["block_result"] == {"10.0.0.1": True, "10.0.0.2": True, "10.0.0.3": False}
+    assert [body["ip"] for _, body in server.requests] == ["10.0.0.2", "10.0.0.3"]
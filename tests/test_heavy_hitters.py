@@ -0,0 +1,25 @@
+from benchmarks.bench_heavy_hitters import make_events, evaluate, check
+from classes.flow_deduplicator import BloomFlowDeduplicator
+from classes.heavy_hitters import HeavyHitterCounter
+from classes.suricata_log_analyzer_stage import SuricataLogAnalyzerStage
+
+def test_counter_mode_matches_exact_path():
+    """Приближенный подсчет на DDoS с подменой адресов: без занижений, полнота по тяжелым IP и точность - 100%"""
+    result = evaluate(lambda: make_events(100_000, 50_000, 100, 0.3, 0.2), top_k=500, epsilon=0.0001)
+
+    assert result["underestimated"] == 0
+    assert result["heavy"] > 0
+    assert result["heavy_recall"] == 1.0
+    assert result["precision"] == 1.0
+    assert check(result, dedup_limit=10 * 2**20) == []
+
+def test_counter_mode_uses_fixed_memory_dedup():
+    """При приближенном подсчете дедупликация по умолчанию - фильтр Блума фиксированного размера"""
+    stage = SuricataLogAnalyzerStage(mode="stream", counter=HeavyHitterCounter(top_k=100))
+    assert isinstance(stage.dedup, BloomFlowDeduplicator)
+
+    memory = stage.dedup.memory_bytes()
+    stage.reset_counters()
+    for event in make_events(50_000, 50_000, 10, 0.1, 0.0):
+        stage.count_event(event)
+    assert stage.dedup.memory_bytes() == memory
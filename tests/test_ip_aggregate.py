@@ -0,0 +1,52 @@
+import json
+import pytest
+from classes.flow_deduplicator import ExactFlowDeduplicator
+from classes.ip_aggregate import IPAggregate, aggregate_file
+from classes.suricata_log_analyzer_stage import SuricataLogAnalyzerStage
+
+def make_event(flow_id, second, src_ip="10.0.0.1", event_type="http"):
+    return {"flow_id": flow_id, "src_ip": src_ip, "event_type": event_type,
+            "timestamp": f"2025-02-23T10:{second // 60:02d}:{second % 60:02d}.000000+0300"}
+
+def write_log(path, events):
+    path.write_text("".join(json.dumps(event) + "\n" for event in events))
+    return str(path)
+
+def test_rotated_files_match_sequential_reading(tmp_path):
+    """Поток на границе ротации учитывается один раз, как при последовательном чтении"""
+    first = [make_event(flow_id, second) for second, flow_id in enumerate(range(100))]
+    second = [make_event(99, 100, event_type="flow")] + [make_event(flow_id, flow_id + 1) for flow_id in range(100, 200)]
+    files = [write_log(tmp_path / "eve.1.json", first), write_log(tmp_path / "eve.2.json", second)]
+
+    stage = SuricataLogAnalyzerStage(files, workers=2, dedup_window=60)
+    stage.load_files()
+
+    assert stage.records_loaded == 201
+    assert stage.ip_counts["10.0.0.1"] == 200
+    assert stage.event_types == {"http": 200}
+
+def test_only_boundary_flows_are_kept(tmp_path):
+    """Для дедупликации между файлами агрегат хранит только потоки в окне на границах файла"""
+    events = [make_event(flow_id, flow_id) for flow_id in range(1000)]
+    aggregate = aggregate_file(write_log(tmp_path / "eve.json", events), window=60)
+
+    assert aggregate.dedup is None
+    assert sorted(aggregate.head) == list(range(60))
+    assert sorted(aggregate.tail) == list(range(939, 1000))
+    assert sum(aggregate.ip_counts.values()) == 1000
+
+def test_merge_forgets_flows_outside_window():
+    """Потоки из конца давних файлов не считаются дубликатами и не хранятся при объединении"""
+    total = IPAggregate(window=60)
+    for second_offset in (0, 600):
+        aggregate = IPAggregate(window=60)
+        aggregate.add(make_event(1, second_offset))
+        total.merge(aggregate.finish())
+
+    assert total.ip_counts["10.0.0.1"] == 2
+    assert list(total.recent) == [1]
+
+@pytest.mark.parametrize("kwargs", [{"mode": "parquet"}, {"mode": "follow"}, {"dedup": ExactFlowDeduplicator()}])
+def test_unsupported_multi_file_options(kwargs):
+    with pytest.raises(ValueError):
+        SuricataLogAnalyzerStage(["a.json", "b.json"], **kwargs)
@@ -0,0 +1,14 @@
+import json
+import numpy as np
+import pytest
+from classes.report_writer import _dumps
+
+def test_numpy_scalars_keep_their_values():
+    """Скаляры numpy записываются значениями Python, а не приводятся к bool"""
+    value = {"total_requests": np.int64(0), "alert_requests": np.int64(7), "activity_threshold": np.bool_(True),
+             "rate": np.float64(0.5)}
+    assert json.loads(_dumps(value)) == {"total_requests": 0, "alert_requests": 7, "activity_threshold": True, "rate": 0.5}
+
+def test_unsupported_value_is_rejected():
+    with pytest.raises(TypeError):
+        _dumps({"ips": {"10.0.0.1"}})
@@ -0,0 +1,24 @@
+import json
+import pytest
+from classes.suricata_log_analyzer_stage import SuricataLogAnalyzerStage
+
+@pytest.mark.parametrize("mode", ["memory", "parquet"])
+def test_load_failure_returns_empty_result(tmp_path, mode):
+    """Ошибка загрузки не прерывает pipeline: нормализация пропускается, подозрительных IP нет"""
+    broken = tmp_path / ("events.parquet" if mode == "parquet" else "events.json")
+    broken.write_text("junk")
+
+    assert SuricataLogAnalyzerStage(str(broken), mode=mode).process({}) == {"suspicious_ips": {}}
+
+def test_follow_does_not_resend_batch_after_restart(tmp_path):
+    """IP, переданные на следующие этапы, после перезапуска с той же контрольной точкой повторно не передаются"""
+    log = tmp_path / "eve.json"
+    log.write_text("".join(
+        json.dumps({"timestamp": f"2025-02-23T10:00:{i:02d}.000000+0300", "flow_id": i, "src_ip": "10.0.0.1",
+                    "event_type": "alert"}) + "\n" for i in range(10)))
+
+    stage = SuricataLogAnalyzerStage(str(log), mode="follow")
+    assert list(stage.process({})["suspicious_ips"]) == ["10.0.0.1"]
+
+    restarted = SuricataLogAnalyzerStage(str(log), mode="follow")
+    assert restarted.process({}) == {"suspicious_ips": {}}
@@ -0,0 +1,133 @@
+import json
+import time
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from classes.virus_total_stage import VirusTotalConcurrentStage
+
+# Ответы заглушки VirusTotal по IP: последовательность (код, тело); последний ответ повторяется.
+# Остальные IP - безопасные
+RESPONSES = {
+    "1.1.1.1": [(200, {"malicious": 2, "suspicious": 0})],
+    "2.2.2.2": [(200, {"malicious": 0, "suspicious": 0})],
+    "3.3.3.3": [(429, None), (200, {"malicious": 0, "suspicious": 1})],
+    "4.4.4.4": [(503, None), (502, None), (200, {"malicious": 0, "suspicious": 0})],
+    "5.5.5.5": [(500, None)],
+    "6.6.6.6": [(200, "not json")],
+}
+
+class StubVirusTotal(BaseHTTPRequestHandler):
+    """Заглушка API VirusTotal: GET /ip_addresses/<ip> с ответами из RESPONSES"""
+
+    def do_GET(self):
+        ip = self.path.rsplit("/", 1)[-1]
+        server = self.server
+        with server.lock:
+            server.requests[ip].append(time.monotonic())
+            server.api_keys.add(self.headers.get("x-apikey"))
+            answers = RESPONSES.get(ip, [(200, {"malicious": 0, "suspicious": 0})])
+            status, body = answers[min(len(server.requests[ip]), len(answers)) - 1]
+
+        if isinstance(body, dict):
+            payload = json.dumps({"data": {"attributes": {"last_analysis_stats": body}}}).encode()
+        else:
+            payload = (body or "error").encode()
+        self.send_response(status)
+        if status == 429:
+            self.send_header("Retry-After", "0.05")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StubVirusTotal)
+    httpd.lock = threading.Lock()
+    httpd.requests = defaultdict(list)
+    httpd.api_keys = set()
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+@pytest.fixture(autouse=True)
+def api_key(monkeypatch):
+    monkeypatch.setenv("API_KEY_VIRUSTOTAL", "test-key")
+
+def make_stage(server, **kwargs):
+    params = {"requests_per_minute": 6000, "workers": 4, "max_retries": 2, "backoff": 0.05}
+    params.update(kwargs)
+    return VirusTotalConcurrentStage(base_url=f"http://127.0.0.1:{server.server_port}", **params)
+
+def test_results_contract(server):
+    """Результат - {ip: True | False | None}: None - если IP не удалось проверить"""
+    stage = make_stage(server)
+    try:
+        results = stage.check_ips(RESPONSES)
+    finally:
+        stage.close()
+
+    assert results == {
+        "1.1.1.1": True,
+        "2.2.2.2": False,
+        "3.3.3.3": True,
+        "4.4.4.4": False,
+        "5.5.5.5": None,
+        "6.6.6.6": None,
+    }
+    assert server.api_keys == {"test-key"}
+
+def test_retry_with_backoff(server):
+    """Ответы 429 и 5xx повторяются: 429 - через Retry-After, 5xx - с экспоненциальной задержкой, не более max_retries раз"""
+    stage = make_stage(server)
+    try:
+        stage.check_ips(["3.3.3.3", "4.4.4.4", "5.5.5.5"])
+    finally:
+        stage.close()
+
+    assert len(server.requests["3.3.3.3"]) == 2
+    assert server.requests["3.3.3.3"][1] - server.requests["3.3.3.3"][0] >= 0.05
+
+    # Задержки перед повторами: backoff * 2 ** attempt
+    retries = server.requests["4.4.4.4"]
+    assert len(retries) == 3
+    assert retries[1] - retries[0] >= 0.05
+    assert retries[2] - retries[1] >= 0.1
+
+    assert len(server.requests["5.5.5.5"]) == 3
+
+def test_token_bucket_pacing(server):
+    """Запросы всех потоков выполняются не чаще requests_per_minute после исчерпания всплеска burst"""
+    ips = [f"10.0.0.{i}" for i in range(6)]
+    stage = make_stage(server, requests_per_minute=600, burst=1, workers=4)
+    try:
+        results = stage.check_ips(ips)
+    finally:
+        stage.close()
+
+    assert results == dict.fromkeys(ips, False)
+
+    # 10 запросов в секунду: интервал между запросами - не меньше 0.1 с (с допуском на точность таймера)
+    times = sorted(server.requests[ip][0] for ip in ips)
+    gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+    assert min(gaps) >= 0.08
+    assert times[-1] - times[0] >= (len(ips) - 1) * 0.1 * 0.9
+
+def test_daily_quota(server):
+    """После исчерпания суточной квоты IP не проверяются и в результате - None"""
+    stage = make_stage(server, requests_per_day=2, workers=1)
+    try:
+        results = stage.check_ips(["1.1.1.1", "2.2.2.2", "6.6.6.6"])
+    finally:
+        stage.close()
+
+    assert results == {"1.1.1.1": True, "2.2.2.2": False, "6.6.6.6": None}
+    assert "6.6.6.6" not in server.requests